@@ -1,32 +1,54 @@
+import asyncio
 import os
+import secrets
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, and_, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 
-from app.utils.db_utils import get_db
+from app.core.revoked_token import is_token_revoked, is_token_revoked_async
+from app.utils.cache_utils import user_cache
+from app.utils.rate_limit_utils import segundos_para_retry_after, senha_por_ip_limiter, senha_por_usuario_limiter
+from app.utils.db_utils import USUARIO_ID_INFO_KEY, get_async_db, get_db, open_read_session
 
-from app.database.user_orm import User
+from app.database.user_orm import Motorista, User
+from app.database.veiculo_orm import MotoristaVeiculo
 
 from app.models.user_oop import UserCreate, UserUpdate
-from app.models.token_oop import TokenData
+from app.models.token_oop import TokenData, TokenIdentity
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Pool limitado para o bcrypt do login: o hash é CPU puro (~100ms+) e, rodando no event loop, travaria todas as outras
+# requisições do worker. O bcrypt libera o GIL, então threads bastam; o limite evita que uma rajada de logins ocupe
+# todos os núcleos (os logins excedentes esperam na fila do executor, sem bloquear o event loop)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max((os.cpu_count() or 2) // 2, 1)))
+password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
 load_dotenv(dotenv_path="credentials.env")
 
 SECRET_KEY = os.environ.get("HASH_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 1
+# Por quanto tempo os claims de identidade do token (id, active, motorista) são aceitos sem consultar o banco. Depois
+# disso o token continua válido, mas get_current_identity volta a resolver o usuário pelo e-mail. Limita por quanto tempo
+# uma desativação de usuário pode passar despercebida pelas rotas que só usam os claims.
+IDENTITY_CLAIMS_EXPIRE_MINUTES = int(os.environ.get("IDENTITY_CLAIMS_EXPIRE_MINUTES", 15))
 
 
 def add_user_to_db(db: Session, user_to_add: UserCreate) -> User:
@@ -70,6 +92,129 @@ def get_user_by_email(email: str, db: Session) -> User | None:
     return user_db
 
         
+@dataclass
+class UserContext:
+    '''
+    Identidade do usuário autenticado na requisição: o User, o Motorista associado (user.motorista) e os veículos ativos
+    do motorista, carregados juntos. É resolvida uma vez por requisição por get_current_user_context (o FastAPI reaproveita
+    o resultado de uma dependência para todas as outras que a usam) e as dependências de usuário, motorista e veículo do
+    motorista só leem dela.
+    '''
+    user: User
+    veiculos_ativos: list[MotoristaVeiculo] = field(default_factory=list)
+    
+    @property
+    def motorista(self) -> Motorista | None:
+        return self.user.motorista
+
+
+def get_user_context_query(email: str):
+    # o Motorista vem no mesmo SELECT pelo joinedload de User.motorista (lazy=False); os veículos ativos, pelo outer join
+    return (
+        select(User, MotoristaVeiculo)
+        .outerjoin(MotoristaVeiculo, and_(MotoristaVeiculo.fk_motorista == User.id, MotoristaVeiculo.active == True))
+        .filter(User.email == email)
+        .order_by(MotoristaVeiculo.id)
+    )
+
+
+def get_user_context_from_rows(rows) -> UserContext | None:
+    if not rows:
+        return None
+    return UserContext(
+        user=rows[0][0],
+        veiculos_ativos=[motorista_veiculo for _, motorista_veiculo in rows if motorista_veiculo is not None]
+    )
+
+
+# Colunas de User que não vão para o user_cache, que pode ser um Redis compartilhado (USER_CACHE_BACKEND_URL). No
+# usuário reconstruído do cache elas ficam sem valor carregado; quem precisa delas (troca de senha) as lê do banco
+COLUNAS_FORA_DO_USER_CACHE = {"hashed_password"}
+
+
+def get_user_cache_snapshot(context: UserContext) -> dict:
+    '''Colunas de User (menos as secretas), do Motorista associado e dos veículos ativos, no formato guardado em user_cache.'''
+    motorista = context.motorista
+    return {
+        "user": {
+            atributo.key: getattr(context.user, atributo.key)
+            for atributo in inspect(User).column_attrs
+            if atributo.key not in COLUNAS_FORA_DO_USER_CACHE
+        },
+        "motorista": None if motorista is None else {
+            atributo.key: getattr(motorista, atributo.key) for atributo in inspect(Motorista).column_attrs
+        },
+        "veiculos_ativos": [
+            {atributo.key: getattr(motorista_veiculo, atributo.key) for atributo in inspect(MotoristaVeiculo).column_attrs}
+            for motorista_veiculo in context.veiculos_ativos
+        ]
+    }
+
+
+def get_colunas_do_snapshot(classe: type, colunas: dict) -> dict:
+    # backends compartilhados (ex: Redis) devolvem os datetimes como strings ISO 8601
+    colunas_convertidas = {}
+    for atributo in inspect(classe).column_attrs:
+        if atributo.key in COLUNAS_FORA_DO_USER_CACHE:
+            continue
+        valor = colunas[atributo.key]
+        if isinstance(valor, str) and isinstance(atributo.columns[0].type, DateTime):
+            valor = datetime.fromisoformat(valor)
+        colunas_convertidas[atributo.key] = valor
+    return colunas_convertidas
+
+
+def get_user_context_from_cache_snapshot(snapshot: dict) -> UserContext:
+    '''
+    Reconstrói o contexto de um snapshot de user_cache com objetos detached, como se tivessem sido lidos do banco.
+    db.merge(objeto, load=False) os associa à sessão sem nenhuma query; os demais relacionamentos continuam lazy.
+    '''
+    user = User(**get_colunas_do_snapshot(User, snapshot["user"]))
+    motorista = None
+    if snapshot["motorista"] is not None:
+        motorista = Motorista(**get_colunas_do_snapshot(Motorista, snapshot["motorista"]))
+        set_committed_value(motorista, "user", user)
+        make_transient_to_detached(motorista)
+    set_committed_value(user, "motorista", motorista)
+    make_transient_to_detached(user)
+    
+    veiculos_ativos = []
+    for colunas in snapshot["veiculos_ativos"]:
+        motorista_veiculo = MotoristaVeiculo(**get_colunas_do_snapshot(MotoristaVeiculo, colunas))
+        make_transient_to_detached(motorista_veiculo)
+        veiculos_ativos.append(motorista_veiculo)
+    return UserContext(user=user, veiculos_ativos=veiculos_ativos)
+
+
+def get_cached_user_context_snapshot(email: str) -> dict | None:
+    snapshot = user_cache.get(email)
+    # snapshots gravados antes de o contexto incluir os veículos (backend compartilhado) contam como miss
+    if snapshot is None or "veiculos_ativos" not in snapshot:
+        return None
+    return snapshot
+
+
+def invalidate_cached_user(email: str) -> None:
+    user_cache.delete(email)
+
+
+def get_user_context_cached(email: str, db: Session) -> UserContext | None:
+    '''Contexto do usuário de e-mail _email_: do user_cache, sem query, ou de uma única query no banco.'''
+    geracao = user_cache.geracao
+    snapshot = get_cached_user_context_snapshot(email)
+    if snapshot is not None:
+        context = get_user_context_from_cache_snapshot(snapshot)
+        return UserContext(
+            user=db.merge(context.user, load=False),
+            veiculos_ativos=[db.merge(motorista_veiculo, load=False) for motorista_veiculo in context.veiculos_ativos]
+        )
+    
+    context = get_user_context_from_rows(db.execute(get_user_context_query(email)).all())
+    if context is not None:
+        user_cache.set(email, get_user_cache_snapshot(context), geracao=geracao)
+    return context
+
+
 def authenticate_user(username: str, password: str, db: Session) -> User | None:
     user = get_user_by_email(email=username, db=db)
     if not user:
@@ -79,6 +224,45 @@ def authenticate_user(username: str, password: str, db: Session) -> User | None:
     return user
 
 
+def get_client_ip(request: Request) -> str:
+    # atrás de um proxy reverso, rodar o uvicorn com --proxy-headers para que request.client seja o IP real
+    return request.client.host if request.client else "desconhecido"
+
+
+def check_password_rate_limit(ip: str, username: str) -> None:
+    '''
+    Admissão das rotas que verificam ou geram hash de senha: responde 429, antes de qualquer bcrypt, quando o IP ou o
+    usuário excedem o limite de tentativas (token bucket, ver rate_limit_utils).
+    '''
+    espera = senha_por_ip_limiter.consumir(ip)
+    if not espera:
+        espera = senha_por_usuario_limiter.consumir(username.strip().lower())
+    if espera:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts. Try again later.",
+            headers={"Retry-After": segundos_para_retry_after(espera)}
+        )
+
+
+async def verify_password_in_executor(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hash_executor, verify_password, plain_password, hashed_password)
+
+
+async def authenticate_user_without_blocking(username: str, password: str, db: Session) -> User | None:
+    '''
+    Versão de authenticate_user para handlers async com sessão síncrona: a query roda no threadpool do AnyIO e a
+    verificação do bcrypt em password_hash_executor, sem bloquear o event loop.
+    '''
+    user = await run_in_threadpool(get_user_by_email, email=username, db=db)
+    if not user:
+        return None
+    if not await verify_password_in_executor(plain_password=password, hashed_password=user.hashed_password):
+        return None
+    return user
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -91,31 +275,66 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)]
-) -> User:
-    
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def get_access_token_claims(user: User) -> dict:
+    claims_expire = datetime.now(timezone.utc) + timedelta(minutes=IDENTITY_CLAIMS_EXPIRE_MINUTES)
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "active": user.active,
+        "motorista": user.motorista is not None,
+        "claims_exp": int(claims_expire.timestamp()),
+        "jti": secrets.token_hex(16),  # identifica o token para revogação (logout)
+    }
+
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def get_token_data(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        return TokenData(
+            username=username,
+            user_id=payload.get("uid"),
+            active=payload.get("active"),
+            is_motorista=payload.get("motorista"),
+            claims_exp=payload.get("claims_exp"),
+            jti=payload.get("jti"),
+            exp=payload.get("exp")
+        )
     except JWTError:
         raise credentials_exception
+
+
+def get_current_user_context(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[Session, Depends(get_db)]
+) -> UserContext:
+    token_data = get_token_data(token)
+    if is_token_revoked(jti=token_data.jti, db=db):
+        raise credentials_exception
     
-    user_db = get_user_by_email(db=db, email=token_data.username) 
+    context = get_user_context_cached(db=db, email=token_data.username)
      
-    if user_db is None:
+    if context is None:
         raise credentials_exception
     
-    return user_db
+    # as escritas desta sessão passam a ser atribuídas ao usuário (read-your-writes de get_read_db)
+    db.info[USUARIO_ID_INFO_KEY] = context.user.id
+    return context
+
+
+def get_current_user(
+    context: Annotated[UserContext, Depends(get_current_user_context)]
+) -> User:
+    return context.user
 
 
 def get_current_active_user(
@@ -127,6 +346,116 @@ def get_current_active_user(
     return current_user
 
 
+def get_identity_from_user(user: User) -> TokenIdentity:
+    return TokenIdentity(id=user.id, email=user.email, active=user.active, is_motorista=user.motorista is not None)
+
+
+def get_current_identity(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[Session, Depends(get_db)]
+) -> TokenIdentity:
+    '''
+    Identidade do usuário autenticado a partir dos claims verificados do token, sem consultar o banco, para rotas que só
+    precisam saber quem é o usuário. Tokens sem claims de identidade ou com claims_exp vencido são resolvidos pelo banco.
+    '''
+    token_data = get_token_data(token)
+    if is_token_revoked(jti=token_data.jti, db=db):
+        raise credentials_exception
+    
+    claims_validos = (
+        token_data.user_id is not None
+        and token_data.claims_exp is not None
+        and token_data.claims_exp > datetime.now(timezone.utc).timestamp()
+    )
+    if claims_validos:
+        return TokenIdentity(
+            id=token_data.user_id,
+            email=token_data.username,
+            active=bool(token_data.active),
+            is_motorista=bool(token_data.is_motorista)
+        )
+    
+    context = get_user_context_cached(db=db, email=token_data.username)
+    if context is None:
+        raise credentials_exception
+    return get_identity_from_user(context.user)
+
+
+def get_current_active_identity(
+    current_identity: Annotated[TokenIdentity, Depends(get_current_identity)],
+) -> TokenIdentity:
+    
+    if not current_identity.active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_identity
+
+
+def get_read_db(
+    current_identity: Annotated[TokenIdentity, Depends(get_current_identity)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    '''
+    Sessão para rotas somente leitura: usa a réplica (SQLALCHEMY_READ_DATABASE_URL) se configurada, exceto para um
+    usuário que escreveu há menos de READ_YOUR_WRITES_JANELA_SEGUNDOS, cujas leituras continuam no primário. Sem
+    réplica, reaproveita a sessão de get_db da própria requisição.
+    '''
+    read_db = open_read_session(usuario_id=current_identity.id)
+    if read_db is None:
+        yield db
+        return
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+
+# ===========================================================================
+# Versões assíncronas (DATABASE_ASYNC_MODE), usadas pelos routers *_async
+
+async def get_user_by_email_async(email: str, db: AsyncSession) -> User | None:
+    return (await db.execute(select(User).filter(User.email == email))).scalars().first()
+
+
+async def get_user_by_email_cached_async(email: str, db: AsyncSession) -> User | None:
+    # compartilha o user_cache com a versão síncrona, então também carrega os veículos ativos para o snapshot
+    geracao = user_cache.geracao
+    snapshot = get_cached_user_context_snapshot(email)
+    if snapshot is not None:
+        return await db.merge(get_user_context_from_cache_snapshot(snapshot).user, load=False)
+    
+    context = get_user_context_from_rows((await db.execute(get_user_context_query(email))).all())
+    if context is None:
+        return None
+    user_cache.set(email, get_user_cache_snapshot(context), geracao=geracao)
+    return context.user
+
+
+async def get_current_user_async(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> User:
+    token_data = get_token_data(token)
+    if await is_token_revoked_async(jti=token_data.jti, db=db):
+        raise credentials_exception
+    
+    user_db = await get_user_by_email_cached_async(db=db, email=token_data.username)
+    
+    if user_db is None:
+        raise credentials_exception
+    
+    db.info[USUARIO_ID_INFO_KEY] = user_db.id
+    return user_db
+
+
+async def get_current_active_user_async(
+    current_user: Annotated[User, Depends(get_current_user_async)],
+) -> User:
+    
+    if not current_user.active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
 def get_user(
     id: int,
     db: Annotated[Session, Depends(get_db)]
@@ -165,31 +494,38 @@ def change_user_birthdate(user: User, new_birthdate: datetime) -> User:
     return user
 
 
-def change_user_password(user: User, new_password: str, old_password: str) -> User:
+def change_user_password(user: User, new_password: str, old_password: str, db: Session) -> User:
     if new_password is not None and old_password is not None:
-        if not verify_password(plain_password=old_password, hashed_password=user.hashed_password):
+        # o hash não vai para o user_cache (de onde user pode ter vindo), então é lido do banco
+        hashed_password = db.scalar(select(User.hashed_password).filter(User.id == user.id))
+        if not verify_password(plain_password=old_password, hashed_password=hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password."
             )
-        elif not verify_password(plain_password=new_password, hashed_password=user.hashed_password):
+        elif not verify_password(plain_password=new_password, hashed_password=hashed_password):
             user.hashed_password = get_password_hash(new_password)
     return user
 
 
 def change_current_user_info(
+    request: Request,
     user_to_update: UserUpdate,
     current_user: Annotated[User, Depends(get_current_active_user)],
     db: Annotated[Session, Depends(get_db)],
 ) -> User:
     
+    if user_to_update.new_password is not None and user_to_update.old_password is not None:
+        check_password_rate_limit(ip=get_client_ip(request), username=current_user.email)
+    
     current_user = change_user_first_name(user=current_user, new_first_name=user_to_update.first_name)
     current_user = change_user_last_name(user=current_user, new_last_name=user_to_update.last_name)
     current_user = change_user_birthdate(user=current_user, new_birthdate=user_to_update.birthdate)
     current_user = change_user_password(
         user=current_user,
         new_password=user_to_update.new_password,
-        old_password=user_to_update.old_password
+        old_password=user_to_update.old_password,
+        db=db
     )
     
     try:
@@ -199,4 +535,5 @@ def change_current_user_info(
         logging.error(f"Could not update user in database: {sqlae}")
         raise sqlae
     
+    invalidate_cached_user(email=current_user.email)
     return current_user
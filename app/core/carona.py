@@ -1,20 +1,37 @@
+import csv
+import io
 import logging
 
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy import Select, delete, desc, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from typing import Annotated, Iterator
+from fastapi import BackgroundTasks, Depends, HTTPException, status
 
+from app.database.reserva_vaga_orm import ReservaVaga
 from app.database.user_carona_orm import UserCarona
-from app.utils.db_utils import get_db
+from app.utils.cache_utils import carona_search_cache
+from app.utils.carona_utils import (
+    CARONA_CSV_HEADER,
+    CaronaViewOptions,
+    ExportFormatOptions,
+    get_carona_compact_select,
+    get_carona_csv_row,
+    get_carona_extended_load_options
+)
+from app.utils.db_utils import get_async_db, get_db, open_read_session
+from database import SessionLocal
 
 from app.database.carona_orm import Carona
 from app.database.user_orm import User, Motorista
 from app.database.veiculo_orm import MotoristaVeiculo
 
-from app.models.carona_oop import CaronaBase, CaronaExtended, CaronaUpdate
+from app.models.carona_oop import BairroCount, CaronaBase, CaronaCompact, CaronaExtended, CaronaFacets, CaronaUpdate, FaixaDePrecoCount, HoraDoDiaCount
 
 from app.core.motorista import get_current_active_motorista
+from app.core.pedido_carona import offer_carona_to_open_pedidos
 from app.core.authentication import (
     get_current_active_user
 )
@@ -22,7 +39,8 @@ from app.core.authentication import (
 
 def add_carona_to_db(
     carona_to_add: CaronaBase,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    background_tasks: BackgroundTasks | None = None
 ) -> Carona:
     db_carona = Carona(**carona_to_add.model_dump())
     try:
@@ -32,6 +50,10 @@ def add_carona_to_db(
         msg = f"Não foi possível adicionar a carona ao banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    if background_tasks is not None:
+        # depois que a resposta for enviada, oferece as vagas aos pedidos de carona em aberto
+        background_tasks.add_task(offer_carona_to_open_pedidos, carona_id=db_carona.id)
     
     return db_carona
 
@@ -46,27 +68,44 @@ def get_carona_by_id(
     return carona
 
 
+vagas_menor_que_preenchidas_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Não é possível diminuir o número de vagas disponíveis para uum número menor do que o número de vagas já preenchidas."
+)
+
+
+def get_update_vagas_statement(carona_id: int, vagas: int):
+    '''
+    Altera o número de vagas num UPDATE condicional, atômico com as inscrições (get_reserve_vaga_statement): não altera
+    nenhuma linha (rowcount 0) se a carona já tem mais vagas preenchidas que _vagas_, mesmo que uma inscrição tenha
+    acontecido depois de a carona ser lida.
+    '''
+    return (
+        update(Carona)
+        .where(Carona.id == carona_id, Carona.vagas_preenchidas <= vagas)
+        .values(vagas=vagas)
+        .execution_options(synchronize_session=False)
+    )
+
+
 def update_carona_in_db(
     db_carona: Carona,
     carona_new_info: CaronaUpdate,
     db: Annotated[Session, Depends(get_db)]
 ) -> Carona:
-    vagas_preenchidas = db.query(UserCarona).filter(UserCarona.fk_carona == db_carona.id).count()
-    if vagas_preenchidas > carona_new_info.vagas:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Não é possível diminuir o número de vagas disponíveis para uum número menor do que o número de vagas já preenchidas."
-        )
-    for key, value in carona_new_info.model_dump(exclude_none=True).items():
-        setattr(db_carona, key, value)
-    
     try:
+        if carona_new_info.vagas is not None and db.execute(get_update_vagas_statement(carona_id=db_carona.id, vagas=carona_new_info.vagas)).rowcount == 0:
+            db.rollback()
+            raise vagas_menor_que_preenchidas_exception
+        for key, value in carona_new_info.model_dump(exclude_none=True, exclude={"vagas"}).items():
+            setattr(db_carona, key, value)
         db.add(db_carona)
         db.commit()
     except SQLAlchemyError as sqlae:
         msg = f"Não foi possível atualizar a carona no banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
     
     return db_carona
 
@@ -76,8 +115,7 @@ def remove_carona_from_db(
     db: Annotated[Session, Depends(get_db)],
     enforce: bool = False
 ) -> Carona:
-    vagas_preenchidas = db.query(UserCarona).filter(UserCarona.fk_carona == db_carona.id).count()
-    if vagas_preenchidas > 0 and not enforce:
+    if db_carona.vagas_preenchidas > 0 and not enforce:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Não foi possível remover a carona pois ela possui passageiros inscritos. Para removê-la, use o parâmetro 'enforce=True'."
@@ -85,11 +123,278 @@ def remove_carona_from_db(
     
     try:
         db.query(UserCarona).filter(UserCarona.fk_carona == db_carona.id).delete()
+        db.query(ReservaVaga).filter(ReservaVaga.fk_carona == db_carona.id).delete()
         db.delete(db_carona)
         db.commit()
     except SQLAlchemyError as sqlae:
         msg = f"Não foi possível deletar a carona do banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
     
     return db_carona
+
+
+def get_caronas_query(
+    view: CaronaViewOptions,
+    db: Annotated[Session, Depends(get_db)]
+) -> Query | Select:
+    '''
+    Query base das listagens de carona. Na view compact é uma projeção Core com só as colunas de CaronaCompact;
+    na full, a query da ORM com os relacionamentos de CaronaExtended carregados em lote.
+    '''
+    if view == CaronaViewOptions.compact:
+        return get_carona_compact_select()
+    return db.query(Carona).options(*get_carona_extended_load_options())
+
+
+def fetch_caronas(
+    caronas_query: Query | Select,
+    view: CaronaViewOptions,
+    db: Annotated[Session, Depends(get_db)]
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    '''Executa uma query montada a partir de get_caronas_query e serializa o resultado no modelo da view.'''
+    if view == CaronaViewOptions.compact:
+        return [CaronaCompact.model_validate(linha._mapping) for linha in db.execute(caronas_query)]
+    return TypeAdapter(list[CaronaExtended]).validate_python(caronas_query.all(), from_attributes=True)
+
+
+def get_carona_facets_query(filters: list, largura_faixa_preco: float) -> Select:
+    '''
+    Conta as caronas que satisfazem os filtros por faixa de preço, hora do dia, bairro de partida e bairro de destino
+    numa única query com GROUPING SETS. GROUPING(coluna) = 0 indica a qual agrupamento cada linha do resultado pertence,
+    e o agrupamento vazio () dá o total.
+    '''
+    caronas_filtradas = (
+        select(
+            (func.floor(Carona.valor / largura_faixa_preco) * largura_faixa_preco).label("faixa_preco"),
+            func.extract("hour", Carona.hora_partida).label("hora"),
+            Carona.bairro_partida.label("bairro_partida"),
+            Carona.bairro_destino.label("bairro_destino"),
+        )
+        .where(*filters)
+        .subquery()
+    )
+    colunas = caronas_filtradas.c
+    facets_query = (
+        select(
+            colunas.faixa_preco,
+            colunas.hora,
+            colunas.bairro_partida,
+            colunas.bairro_destino,
+            func.grouping(colunas.faixa_preco).label("por_faixa_preco"),
+            func.grouping(colunas.hora).label("por_hora"),
+            func.grouping(colunas.bairro_partida).label("por_bairro_partida"),
+            func.grouping(colunas.bairro_destino).label("por_bairro_destino"),
+            func.count().label("total"),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(colunas.faixa_preco),
+            tuple_(colunas.hora),
+            tuple_(colunas.bairro_partida),
+            tuple_(colunas.bairro_destino),
+            tuple_(),
+        ))
+    )
+    return facets_query
+
+
+def build_carona_facets(linhas: list, largura_faixa_preco: float) -> CaronaFacets:
+    facets = CaronaFacets(total=0)
+    for linha in linhas:
+        if linha.por_faixa_preco == 0:
+            facets.faixas_de_preco.append(FaixaDePrecoCount(
+                valor_minimo=linha.faixa_preco,
+                valor_maximo=linha.faixa_preco + largura_faixa_preco,
+                total=linha.total
+            ))
+        elif linha.por_hora == 0:
+            facets.horas_do_dia.append(HoraDoDiaCount(hora=int(linha.hora), total=linha.total))
+        elif linha.por_bairro_partida == 0:
+            facets.bairros_partida.append(BairroCount(bairro=linha.bairro_partida, total=linha.total))
+        elif linha.por_bairro_destino == 0:
+            facets.bairros_destino.append(BairroCount(bairro=linha.bairro_destino, total=linha.total))
+        else:
+            facets.total = linha.total
+    
+    facets.faixas_de_preco.sort(key=lambda faixa: faixa.valor_minimo)
+    facets.horas_do_dia.sort(key=lambda hora: hora.hora)
+    facets.bairros_partida.sort(key=lambda bairro: bairro.total, reverse=True)
+    facets.bairros_destino.sort(key=lambda bairro: bairro.total, reverse=True)
+    return facets
+
+
+def get_carona_facets(
+    filters: list,
+    largura_faixa_preco: float,
+    db: Annotated[Session, Depends(get_db)]
+) -> CaronaFacets:
+    linhas = db.execute(get_carona_facets_query(filters=filters, largura_faixa_preco=largura_faixa_preco)).all()
+    return build_carona_facets(linhas=linhas, largura_faixa_preco=largura_faixa_preco)
+
+
+EXPORT_YIELD_PER = 500
+
+
+def stream_caronas_export(
+    filters: list,
+    formato: ExportFormatOptions,
+    join_user_carona: bool = False,
+    usuario_id: int | None = None
+) -> Iterator[str]:
+    '''
+    Gera, linha a linha, o export em NDJSON ou CSV de todas as caronas que satisfazem os filtros, da mais recente para a mais antiga.
+    As caronas são lidas do banco com um cursor no servidor em lotes de EXPORT_YIELD_PER (os relacionamentos são carregados
+    por lote), de forma que a memória usada não depende do tamanho do histórico.
+    Abre a própria sessão porque o gerador é consumido pela StreamingResponse depois que as dependências do endpoint
+    (incluindo a sessão de get_db) já foram finalizadas. Lê da réplica, se configurada, salvo quando o usuário
+    escreveu recentemente (ver get_read_db).
+    '''
+    db = open_read_session(usuario_id=usuario_id) or SessionLocal()
+    try:
+        caronas_query = db.query(Carona).options(*get_carona_extended_load_options())
+        if join_user_carona:
+            caronas_query = caronas_query.join(UserCarona, Carona.id == UserCarona.fk_carona)
+        caronas_query = (
+            caronas_query
+            .filter(*filters)
+            .order_by(desc(Carona.hora_partida), desc(Carona.id))
+            .yield_per(EXPORT_YIELD_PER)
+        )
+        
+        if formato == ExportFormatOptions.csv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(CARONA_CSV_HEADER)
+            for db_carona in caronas_query:
+                writer.writerow(get_carona_csv_row(CaronaExtended.model_validate(db_carona, from_attributes=True)))
+                if buffer.tell() >= 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for db_carona in caronas_query:
+                yield CaronaExtended.model_validate(db_carona, from_attributes=True).model_dump_json() + "\n"
+    except SQLAlchemyError as sqlae:
+        # o status da resposta já foi enviado, então o erro só pode ser registrado e o stream interrompido
+        logging.error(f"Não foi possível exportar as caronas: {sqlae}")
+        raise
+    finally:
+        db.close()
+
+
+# ===========================================================================
+# Versões assíncronas (DATABASE_ASYNC_MODE), usadas pelos routers *_async. Como não há lazy loading em sessões
+# assíncronas, toda carona devolvida já vem com o grafo de CaronaExtended carregado.
+
+async def get_carona_by_id_async(
+    carona_id: int,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> Carona:
+    carona = (
+        await db.execute(
+            select(Carona)
+            .options(*get_carona_extended_load_options())
+            .filter(Carona.id == carona_id)
+            .execution_options(populate_existing=True)
+        )
+    ).scalars().first()
+    if not carona:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Carona id={carona_id} não encontrada.")
+    return carona
+
+
+async def add_carona_to_db_async(
+    carona_to_add: CaronaBase,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    background_tasks: BackgroundTasks | None = None
+) -> Carona:
+    db_carona = Carona(**carona_to_add.model_dump())
+    try:
+        db.add(db_carona)
+        await db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível adicionar a carona ao banco: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    if background_tasks is not None:
+        # a oferta usa a sessão síncrona; o Starlette roda a tarefa no threadpool
+        background_tasks.add_task(offer_carona_to_open_pedidos, carona_id=db_carona.id)
+    
+    return await get_carona_by_id_async(carona_id=db_carona.id, db=db)
+
+
+async def update_carona_in_db_async(
+    db_carona: Carona,
+    carona_new_info: CaronaUpdate,
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> Carona:
+    try:
+        if carona_new_info.vagas is not None and (await db.execute(get_update_vagas_statement(carona_id=db_carona.id, vagas=carona_new_info.vagas))).rowcount == 0:
+            await db.rollback()
+            raise vagas_menor_que_preenchidas_exception
+        for key, value in carona_new_info.model_dump(exclude_none=True, exclude={"vagas"}).items():
+            setattr(db_carona, key, value)
+        db.add(db_carona)
+        await db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível atualizar a carona no banco: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    
+    return await get_carona_by_id_async(carona_id=db_carona.id, db=db)
+
+
+async def remove_carona_from_db_async(
+    db_carona: Carona,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    enforce: bool = False
+) -> Carona:
+    if db_carona.vagas_preenchidas > 0 and not enforce:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Não foi possível remover a carona pois ela possui passageiros inscritos. Para removê-la, use o parâmetro 'enforce=True'."
+        )
+    
+    try:
+        await db.execute(delete(UserCarona).where(UserCarona.fk_carona == db_carona.id))
+        await db.execute(delete(ReservaVaga).where(ReservaVaga.fk_carona == db_carona.id))
+        await db.delete(db_carona)
+        await db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível deletar a carona do banco: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    
+    return db_carona
+
+
+def get_caronas_select(view: CaronaViewOptions) -> Select:
+    '''Equivalente de get_caronas_query para sessões assíncronas (select no lugar de db.query).'''
+    if view == CaronaViewOptions.compact:
+        return get_carona_compact_select()
+    return select(Carona).options(*get_carona_extended_load_options())
+
+
+async def fetch_caronas_async(
+    caronas_query: Select,
+    view: CaronaViewOptions,
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    resultado = await db.execute(caronas_query)
+    if view == CaronaViewOptions.compact:
+        return [CaronaCompact.model_validate(linha._mapping) for linha in resultado]
+    return TypeAdapter(list[CaronaExtended]).validate_python(resultado.scalars().all(), from_attributes=True)
+
+
+async def get_carona_facets_async(
+    filters: list,
+    largura_faixa_preco: float,
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> CaronaFacets:
+    linhas = (await db.execute(get_carona_facets_query(filters=filters, largura_faixa_preco=largura_faixa_preco))).all()
+    return build_carona_facets(linhas=linhas, largura_faixa_preco=largura_faixa_preco)
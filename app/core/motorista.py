@@ -1,19 +1,25 @@
 import logging
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 
-from app.utils.db_utils import get_db
+from app.utils.db_utils import get_async_db, get_db
 
 from app.database.user_orm import User, Motorista
 from app.database.veiculo_orm import MotoristaVeiculo
 
+from app.models.token_oop import TokenIdentity
 from app.models.user_oop import MotoristaBase
 
 from app.core.authentication import (
-    get_current_active_user
+    get_current_active_identity,
+    get_current_active_user,
+    get_current_active_user_async,
+    invalidate_cached_user
 )
 
 
@@ -37,6 +43,9 @@ def add_motorista_to_db(
         id_fk_user = motorista.id_fk_user,
         num_cnh = motorista.num_cnh
     )
+    # normalmente o usuário já está no identity map (usuário autenticado), sem query extra
+    db_user = db.get(User, motorista.id_fk_user)
+    email = db_user.email if db_user is not None else None
     try:
         db.add(db_motorista)
         db.commit()
@@ -44,18 +53,42 @@ def add_motorista_to_db(
         msg = f"Não foi possível adicionar o motorista ao banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    if email is not None:
+        invalidate_cached_user(email=email)
     return db_motorista
 
 
 def get_current_active_motorista(
     current_user: Annotated[User, Depends(get_current_active_user)],
+) -> Motorista | None:
+    # o motorista vem no contexto do usuário (get_current_user_context), sem query aqui
+    motorista: Motorista = current_user.motorista
+    if not motorista:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is not a driver.")
+    
+    return motorista
+
+
+def get_current_active_motorista_identity(
+    current_identity: Annotated[TokenIdentity, Depends(get_current_active_identity)],
     db: Annotated[Session, Depends(get_db)]
+) -> TokenIdentity:
+    '''
+    Versão de get_current_active_motorista para rotas que só precisam do id do motorista: confia no claim motorista do
+    token. Tokens emitidos antes de o usuário virar motorista têm motorista=false, então esse caso é conferido no banco.
+    '''
+    if not current_identity.is_motorista and db.get(Motorista, current_identity.id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is not a driver.")
+    return current_identity
+
+
+async def get_current_active_motorista_async(
+    current_user: Annotated[User, Depends(get_current_active_user_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> Motorista | None:
     motorista: Motorista = (
-        db.query(Motorista)
-        .filter(Motorista.id_fk_user == current_user.id)
-        .first()
-    )
+        await db.execute(select(Motorista).filter(Motorista.id_fk_user == current_user.id))
+    ).scalars().first()
     if not motorista:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is not a driver.")
     
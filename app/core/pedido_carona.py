@@ -1,13 +1,24 @@
 import logging
+import os
 
+import numpy as np
+from datetime import datetime
+from sqlalchemy import delete, insert, select, tuple_, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from pydantic import BaseModel
+from app.utils.cache_utils import carona_search_cache
 from app.utils.db_utils import get_db
+from app.utils.matching_utils import calcular_atribuicoes
+from app.utils.pedido_carona_utils import get_janela_contem_hora_filter
+from database import SessionLocal
 
+from app.database.carona_orm import Carona
 from app.database.pedido_carona_orm import PedidoCarona
+from app.database.reserva_vaga_orm import ReservaVaga
+from app.database.user_carona_orm import UserCarona
 from app.database.user_orm import User
 
 from app.models.pedido_carona_oop import PedidoCaronaBase, PedidoCaronaUpdate, PedidoCaronaCreate
@@ -18,6 +29,12 @@ from app.core.authentication import (
 )
 
 
+# Intervalo entre execuções de match_open_pedidos_carona (<= 0 desliga a tarefa periódica)
+PEDIDO_CARONA_MATCHER_SEGUNDOS = float(os.environ.get("PEDIDO_CARONA_MATCHER_SEGUNDOS", 60))
+# Máximo de ids por cláusula IN ao travar as linhas das atribuições
+TAMANHO_DO_LOTE_DE_IDS = 10_000
+
+
 def add_pedido_carona_to_db(
     pedido_carona_to_add: PedidoCaronaBase,
     db: Annotated[Session, Depends(get_db)]
@@ -89,3 +106,210 @@ def delete_pedido_carona_from_db(db: Session, pedido_carona_id: int) -> str:
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
     return f"Pedido de Carona id={pedido_carona_id} deletado com sucesso!"
+
+
+def get_chave_de_area(linha) -> tuple | None:
+    # a área de um pedido ou carona é o par (cidade, bairro) da partida e do destino; sem as cidades, não há como comparar
+    if not (linha.cidade_partida and linha.cidade_destino):
+        return None
+    return (linha.cidade_partida, linha.bairro_partida, linha.cidade_destino, linha.bairro_destino)
+
+
+def get_codigos_de_area(linhas: list, codigos: dict) -> np.ndarray:
+    return np.array(
+        [-1 if (chave := get_chave_de_area(linha)) is None else codigos.setdefault(chave, len(codigos)) for linha in linhas],
+        dtype=np.int64
+    )
+
+
+def get_segundos(horas: list[datetime]) -> np.ndarray:
+    return np.array(horas, dtype="datetime64[s]").astype(np.int64)
+
+
+def get_lotes(ids: list) -> list[list]:
+    return [ids[inicio:inicio + TAMANHO_DO_LOTE_DE_IDS] for inicio in range(0, len(ids), TAMANHO_DO_LOTE_DE_IDS)]
+
+
+def match_pedidos_carona_in_db(db: Session) -> int:
+    '''
+    Atende em lote os pedidos de carona em aberto (sem carona e com a janela de horário ainda por vir), inscrevendo os
+    usuários nas caronas futuras com vagas da mesma área (cidade e bairro de partida e destino), dentro da janela do
+    pedido e com valor até o sugerido. Os pedidos mais antigos têm prioridade. Retorna o número de pedidos atendidos.
+    '''
+    agora = datetime.now()
+    pedidos = db.execute(
+        select(
+            PedidoCarona.id, PedidoCarona.fk_user, PedidoCarona.hora_partida_minima, PedidoCarona.hora_partida_maxima,
+            PedidoCarona.valor, PedidoCarona.cidade_partida, PedidoCarona.bairro_partida, PedidoCarona.cidade_destino,
+            PedidoCarona.bairro_destino
+        )
+        .filter(PedidoCarona.fk_carona.is_(None), PedidoCarona.hora_partida_maxima >= agora)
+        .order_by(PedidoCarona.id)
+    ).all()
+    if not pedidos:
+        return 0
+    
+    caronas = db.execute(
+        select(
+            Carona.id, Carona.fk_motorista, Carona.hora_partida, Carona.valor, (Carona.vagas - Carona.vagas_preenchidas).label("vagas_restantes"),
+            Carona.cidade_partida, Carona.bairro_partida, Carona.cidade_destino, Carona.bairro_destino
+        )
+        .filter(
+            Carona.hora_partida >= agora,
+            Carona.hora_partida <= max(pedido.hora_partida_maxima for pedido in pedidos),
+            Carona.vagas_preenchidas < Carona.vagas  # usa o índice parcial ix_carona_com_vagas_hora_partida
+        )
+    ).all()
+    if not caronas:
+        return 0
+    
+    codigos_de_area = {}
+    atribuicoes = calcular_atribuicoes(
+        pedido_area=get_codigos_de_area(pedidos, codigos_de_area),
+        pedido_hora_minima=get_segundos([pedido.hora_partida_minima for pedido in pedidos]),
+        pedido_hora_maxima=get_segundos([pedido.hora_partida_maxima for pedido in pedidos]),
+        pedido_valor=np.array([pedido.valor for pedido in pedidos], dtype=np.float64),
+        pedido_user=np.array([pedido.fk_user for pedido in pedidos], dtype=np.int64),
+        carona_area=get_codigos_de_area(caronas, codigos_de_area),
+        carona_hora=get_segundos([carona.hora_partida for carona in caronas]),
+        carona_valor=np.array([carona.valor for carona in caronas], dtype=np.float64),
+        carona_motorista=np.array([carona.fk_motorista for carona in caronas], dtype=np.int64),
+        carona_vagas=np.array([carona.vagas_restantes for carona in caronas], dtype=np.int64),
+    )
+    
+    atendimentos = [
+        (pedidos[indice_pedido].id, pedidos[indice_pedido].fk_user, caronas[indice_carona].id)
+        for indice_pedido, indice_carona in enumerate(atribuicoes.tolist()) if indice_carona >= 0
+    ]
+    return add_pedido_carona_matches_to_db(atendimentos=atendimentos, db=db)
+
+
+def add_pedido_carona_matches_to_db(atendimentos: list[tuple[int, int, int]], db: Session) -> int:
+    '''
+    Grava os atendimentos (pedido, usuário, carona), em ordem de prioridade, com inserts e updates em lote. As caronas e
+    os pedidos envolvidos são travados (SELECT ... FOR UPDATE) e conferidos de novo, porque entre a leitura e a gravação
+    as rotas podem ter inscrito passageiros ou atendido os pedidos; atendimentos que deixaram de caber são descartados
+    e ficam para a próxima execução. Se o usuário tem uma reserva de vaga na carona, a inscrição consome a reserva
+    (cuja vaga já está contada em vagas_preenchidas) em vez de ocupar outra vaga.
+    '''
+    if not atendimentos:
+        return 0
+    
+    vagas, vagas_preenchidas, inscricoes, reservas, pedidos_abertos = {}, {}, set(), set(), set()
+    for lote in get_lotes(sorted({carona_id for _, _, carona_id in atendimentos})):
+        # reservas antes das caronas: a mesma ordem de travamento das rotas de reserva e do sweeper
+        reservas.update(db.execute(
+            select(ReservaVaga.fk_user, ReservaVaga.fk_carona)
+            .filter(ReservaVaga.fk_carona.in_(lote))
+            .order_by(ReservaVaga.id)
+            .with_for_update()
+        ).tuples())
+        for carona_id, vagas_da_carona, vagas_preenchidas_da_carona in db.execute(
+            select(Carona.id, Carona.vagas, Carona.vagas_preenchidas)
+            .filter(Carona.id.in_(lote))
+            .order_by(Carona.id)
+            .with_for_update()
+        ):
+            vagas[carona_id] = vagas_da_carona
+            vagas_preenchidas[carona_id] = vagas_preenchidas_da_carona
+        inscricoes.update(db.execute(select(UserCarona.fk_user, UserCarona.fk_carona).filter(UserCarona.fk_carona.in_(lote))).tuples())
+    for lote in get_lotes(sorted(pedido_id for pedido_id, _, _ in atendimentos)):
+        pedidos_abertos.update(db.scalars(
+            select(PedidoCarona.id)
+            .filter(PedidoCarona.id.in_(lote), PedidoCarona.fk_carona.is_(None))
+            .order_by(PedidoCarona.id)
+            .with_for_update()
+        ))
+    
+    pedidos_atendidos, reservas_consumidas, caronas_alteradas = [], [], set()
+    for pedido_id, user_id, carona_id in atendimentos:
+        if pedido_id not in pedidos_abertos or (user_id, carona_id) in inscricoes or carona_id not in vagas:
+            continue
+        if (user_id, carona_id) in reservas:
+            reservas_consumidas.append((user_id, carona_id))
+        elif vagas_preenchidas[carona_id] < vagas[carona_id]:
+            vagas_preenchidas[carona_id] += 1
+            caronas_alteradas.add(carona_id)
+        else:
+            continue
+        inscricoes.add((user_id, carona_id))
+        pedidos_atendidos.append((pedido_id, user_id, carona_id))
+    
+    if not pedidos_atendidos:
+        db.rollback()
+        return 0
+    
+    try:
+        db.execute(insert(UserCarona), [{"fk_user": user_id, "fk_carona": carona_id} for _, user_id, carona_id in pedidos_atendidos])
+        db.execute(update(PedidoCarona), [{"id": pedido_id, "fk_carona": carona_id} for pedido_id, _, carona_id in pedidos_atendidos])
+        if caronas_alteradas:
+            db.execute(update(Carona), [{"id": carona_id, "vagas_preenchidas": vagas_preenchidas[carona_id]} for carona_id in caronas_alteradas])
+        for lote in get_lotes(reservas_consumidas):
+            db.execute(
+                delete(ReservaVaga)
+                .where(tuple_(ReservaVaga.fk_user, ReservaVaga.fk_carona).in_(lote))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        db.rollback()
+        logging.error(f"Não foi possível gravar os atendimentos de pedidos de carona no banco: {sqlae}")
+        raise sqlae
+    
+    carona_search_cache.clear()
+    return len(pedidos_atendidos)
+
+
+def match_open_pedidos_carona() -> None:
+    '''Atende em lote os pedidos de carona em aberto (match_pedidos_carona_in_db). Executada periodicamente.'''
+    with SessionLocal() as db:
+        atendidos = match_pedidos_carona_in_db(db=db)
+    if atendidos:
+        logging.info(f"{atendidos} pedidos de carona atendidos automaticamente.")
+
+
+def offer_carona_to_open_pedidos_in_db(carona_id: int, db: Session) -> int:
+    '''
+    Oferece as vagas de uma carona aos pedidos em aberto que ela atende (mesma área, hora de partida dentro da janela
+    do pedido e valor até o sugerido), inscrevendo os usuários dos pedidos mais antigos. Retorna o número de pedidos
+    atendidos.
+    '''
+    carona = db.execute(
+        select(
+            Carona.id, Carona.fk_motorista, Carona.hora_partida, Carona.valor, (Carona.vagas - Carona.vagas_preenchidas).label("vagas_restantes"),
+            Carona.cidade_partida, Carona.bairro_partida, Carona.cidade_destino, Carona.bairro_destino
+        )
+        .filter(Carona.id == carona_id)
+    ).first()
+    if carona is None or carona.vagas_restantes <= 0 or get_chave_de_area(carona) is None:
+        return 0
+    
+    pedidos = db.execute(
+        select(PedidoCarona.id, PedidoCarona.fk_user)
+        .filter(
+            PedidoCarona.fk_carona.is_(None),
+            PedidoCarona.hora_partida_maxima >= datetime.now(),  # pedido expirado não é atendido, como em match_pedidos_carona_in_db
+            get_janela_contem_hora_filter(hora=carona.hora_partida, dialeto=db.get_bind().dialect.name),
+            PedidoCarona.valor >= carona.valor,
+            PedidoCarona.fk_user != carona.fk_motorista,
+            PedidoCarona.cidade_partida == carona.cidade_partida,
+            PedidoCarona.bairro_partida.is_not_distinct_from(carona.bairro_partida),
+            PedidoCarona.cidade_destino == carona.cidade_destino,
+            PedidoCarona.bairro_destino.is_not_distinct_from(carona.bairro_destino)
+        )
+        .order_by(PedidoCarona.id)
+        .limit(carona.vagas_restantes)
+    ).all()
+    return add_pedido_carona_matches_to_db(atendimentos=[(pedido.id, pedido.fk_user, carona.id) for pedido in pedidos], db=db)
+
+
+def offer_carona_to_open_pedidos(carona_id: int) -> None:
+    '''Executada em background depois que uma carona é criada (add_carona_to_db), sem atrasar a resposta da criação.'''
+    try:
+        with SessionLocal() as db:
+            atendidos = offer_carona_to_open_pedidos_in_db(carona_id=carona_id, db=db)
+    except Exception as e:
+        logging.error(f"Falha ao oferecer a carona id={carona_id} aos pedidos de carona em aberto: {e}")
+        return
+    if atendidos:
+        logging.info(f"{atendidos} pedidos de carona atendidos pela carona id={carona_id}.")
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import secrets
+
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database.refresh_token_orm import RefreshToken
+from app.database.user_orm import User
+
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+
+invalid_refresh_token_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid refresh token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def new_refresh_token(user_id: int, familia: str | None = None) -> tuple[str, RefreshToken]:
+    '''Gera um refresh token e a linha a ser salva (só com o hash). Sem família, inicia uma nova (novo login).'''
+    refresh_token = secrets.token_urlsafe(32)
+    db_refresh_token = RefreshToken(
+        fk_user=user_id,
+        token_hash=hash_refresh_token(refresh_token),
+        familia=familia or secrets.token_hex(16),
+        expires_at=datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return refresh_token, db_refresh_token
+
+
+def issue_refresh_token(user_id: int, db: Session) -> str:
+    refresh_token, db_refresh_token = new_refresh_token(user_id=user_id)
+    try:
+        db.add(db_refresh_token)
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível salvar o refresh token no banco: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    return refresh_token
+
+
+def revoke_refresh_token_family(familia: str, db: Session) -> None:
+    db.query(RefreshToken).filter(
+        RefreshToken.familia == familia,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now()}, synchronize_session=False)
+    db.commit()
+
+
+def revoke_refresh_token(refresh_token: str, user_id: int, db: Session) -> None:
+    '''Revoga o refresh token do usuário e toda a sua família (logout daquele login).'''
+    db_refresh_token: RefreshToken = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == hash_refresh_token(refresh_token), RefreshToken.fk_user == user_id)
+        .first()
+    )
+    if db_refresh_token is None:
+        raise invalid_refresh_token_exception
+    try:
+        revoke_refresh_token_family(familia=db_refresh_token.familia, db=db)
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível revogar o refresh token: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+
+
+def rotate_refresh_token(refresh_token: str, db: Session) -> tuple[User, str]:
+    '''
+    Troca um refresh token válido por um novo da mesma família, revogando o usado, e retorna o dono e o novo token.
+    Um token já revogado sendo reapresentado indica que ele vazou (quem rotacionou primeiro pode ser o atacante), então
+    a família inteira é revogada e o usuário precisa fazer login de novo.
+    '''
+    db_refresh_token: RefreshToken = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == hash_refresh_token(refresh_token))
+        .with_for_update()  # duas rotações simultâneas do mesmo token: a segunda vê o token já revogado
+        .first()
+    )
+    if db_refresh_token is None:
+        raise invalid_refresh_token_exception
+    
+    agora = datetime.now()
+    if db_refresh_token.revoked_at is not None:
+        logging.warning(f"Reuso de refresh token revogado (usuário id={db_refresh_token.fk_user}); família revogada.")
+        try:
+            revoke_refresh_token_family(familia=db_refresh_token.familia, db=db)
+        except SQLAlchemyError as sqlae:
+            logging.error(f"Não foi possível revogar a família de refresh tokens: {sqlae}")
+        raise invalid_refresh_token_exception
+    
+    user: User = db_refresh_token.user
+    if db_refresh_token.expires_at <= agora or not user.active:
+        raise invalid_refresh_token_exception
+    
+    novo_refresh_token, db_novo_refresh_token = new_refresh_token(user_id=user.id, familia=db_refresh_token.familia)
+    try:
+        db_refresh_token.revoked_at = agora
+        db.add(db_novo_refresh_token)
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível rotacionar o refresh token: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    
+    return user, novo_refresh_token
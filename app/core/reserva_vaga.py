@@ -0,0 +1,194 @@
+import logging
+import os
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Annotated
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database.carona_orm import Carona
+from app.database.reserva_vaga_orm import ReservaVaga
+from app.database.user_carona_orm import UserCarona
+from app.database.user_orm import User
+from app.core.authentication import get_current_active_user
+from app.core.user_carona import carona_lotada_exception, get_reserve_vaga_statement, get_user_carona_by_user_and_carona
+from app.utils.cache_utils import carona_search_cache
+from app.utils.db_utils import get_db
+from database import SessionLocal
+
+
+# Duração padrão e máxima (em segundos) de uma reserva de vaga feita em POST /user-carona/hold
+RESERVA_VAGA_SEGUNDOS = int(os.environ.get("RESERVA_VAGA_SEGUNDOS", 120))
+RESERVA_VAGA_SEGUNDOS_MAXIMO = int(os.environ.get("RESERVA_VAGA_SEGUNDOS_MAXIMO", 600))
+# Intervalo entre execuções de release_expired_reservas_vaga (<= 0 desliga a tarefa periódica)
+RESERVA_VAGA_SWEEPER_SEGUNDOS = float(os.environ.get("RESERVA_VAGA_SWEEPER_SEGUNDOS", 30))
+
+
+reserva_vaga_not_found_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Reserva de vaga não encontrada."
+)
+
+
+def get_reserva_vaga_of_user(
+    reserva_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[Session, Depends(get_db)]
+) -> ReservaVaga:
+    db_reserva = db.get(ReservaVaga, reserva_id)
+    if db_reserva is None or db_reserva.fk_user != current_user.id:
+        raise reserva_vaga_not_found_exception
+    return db_reserva
+
+
+def get_renew_reserva_vaga_statement(user_id: int, carona_id: int, expires_at: datetime):
+    return (
+        update(ReservaVaga)
+        .where(ReservaVaga.fk_user == user_id, ReservaVaga.fk_carona == carona_id)
+        .values(expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def hold_vaga_in_db(user_id: int, db_carona: Carona, segundos: int, db: Session) -> ReservaVaga:
+    '''
+    Reserva uma vaga da carona para o usuário por _segundos_ segundos. A vaga é ocupada já na reserva, com o mesmo
+    UPDATE condicional da inscrição (get_reserve_vaga_statement), de forma que a confirmação não disputa mais a linha
+    da carona e não pode falhar por falta de vaga. Repetir a reserva na mesma carona só renova o prazo.
+    '''
+    if db_carona.fk_motorista == user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Motorista não pode se inscrever na própria carona."
+        )
+    if get_user_carona_by_user_and_carona(db=db, user_id=user_id, carona_id=db_carona.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Usuário já está inscrito na carona."
+        )
+    
+    expires_at = datetime.now() + timedelta(seconds=segundos)
+    vaga_ocupada = False
+    renew_statement = get_renew_reserva_vaga_statement(user_id=user_id, carona_id=db_carona.id, expires_at=expires_at)
+    # duas tentativas: se outra requisição do mesmo usuário criou a reserva ao mesmo tempo, o insert desta viola a
+    # UniqueConstraint (fk_user, fk_carona), o rollback devolve a vaga ocupada e a segunda tentativa renova a outra reserva
+    for tentativa in range(2):
+        try:
+            if db.execute(renew_statement).rowcount == 0:
+                if db.execute(get_reserve_vaga_statement(carona_id=db_carona.id)).rowcount == 0:
+                    db.rollback()
+                    raise carona_lotada_exception
+                db.add(ReservaVaga(fk_user=user_id, fk_carona=db_carona.id, expires_at=expires_at))
+                vaga_ocupada = True
+            db.commit()
+            break
+        except SQLAlchemyError as sqlae:
+            db.rollback()
+            vaga_ocupada = False
+            if isinstance(sqlae, IntegrityError) and tentativa == 0:
+                continue
+            msg = f"Não foi possível reservar vaga na carona: {sqlae}"
+            logging.error(msg)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    if vaga_ocupada:
+        carona_search_cache.clear()
+    return db.scalars(
+        select(ReservaVaga)
+        .filter(ReservaVaga.fk_user == user_id, ReservaVaga.fk_carona == db_carona.id)
+        .execution_options(populate_existing=True)
+    ).one()
+
+
+def confirm_reserva_vaga_in_db(db_reserva: ReservaVaga, db: Session) -> UserCarona:
+    '''
+    Troca a reserva pela inscrição na carona. A vaga já está contada em vagas_preenchidas, então a carona não é
+    alterada. O DELETE condicional garante que uma reserva expirada (ou já liberada pelo sweeper) não é confirmada.
+    '''
+    db_user_carona = UserCarona(fk_user=db_reserva.fk_user, fk_carona=db_reserva.fk_carona)
+    try:
+        confirmadas = db.execute(
+            delete(ReservaVaga)
+            .where(ReservaVaga.id == db_reserva.id, ReservaVaga.expires_at > datetime.now())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if confirmadas == 0:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reserva de vaga expirada.")
+        db.add(db_user_carona)
+        db.commit()
+        db.refresh(db_user_carona)
+    except SQLAlchemyError as sqlae:
+        db.rollback()
+        msg = f"Não foi possível confirmar a reserva de vaga: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    return db_user_carona
+
+
+def release_reserva_vaga_in_db(db_reserva: ReservaVaga, db: Session) -> str:
+    carona_id = db_reserva.fk_carona
+    try:
+        liberadas = db.execute(
+            delete(ReservaVaga)
+            .where(ReservaVaga.id == db_reserva.id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if liberadas == 0:
+            db.rollback()
+            raise reserva_vaga_not_found_exception
+        db.execute(
+            update(Carona)
+            .where(Carona.id == carona_id)
+            .values(vagas_preenchidas=Carona.vagas_preenchidas - 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        db.rollback()
+        msg = f"Não foi possível liberar a reserva de vaga: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    return "Reserva de vaga liberada com sucesso!"
+
+
+def release_expired_reservas_vaga_in_db(db: Session) -> int:
+    '''
+    Apaga as reservas expiradas e devolve as vagas delas às caronas, com um DELETE ... RETURNING e um UPDATE em lote
+    (um conjunto de parâmetros por carona, em ordem de id). Retorna o número de reservas liberadas.
+    '''
+    try:
+        caronas = db.scalars(
+            delete(ReservaVaga)
+            .where(ReservaVaga.expires_at <= datetime.now())
+            .returning(ReservaVaga.fk_carona)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not caronas:
+            db.rollback()
+            return 0
+        db.connection().execute(
+            update(Carona.__table__)
+            .where(Carona.__table__.c.id == bindparam("carona_id"))
+            .values(vagas_preenchidas=Carona.__table__.c.vagas_preenchidas - bindparam("liberadas")),
+            [{"carona_id": carona_id, "liberadas": liberadas} for carona_id, liberadas in sorted(Counter(caronas).items())]
+        )
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        db.rollback()
+        logging.error(f"Não foi possível liberar as reservas de vaga expiradas: {sqlae}")
+        raise sqlae
+    
+    carona_search_cache.clear()
+    return len(caronas)
+
+
+def release_expired_reservas_vaga() -> None:
+    '''Libera as reservas de vaga expiradas (release_expired_reservas_vaga_in_db). Executada periodicamente.'''
+    with SessionLocal() as db:
+        liberadas = release_expired_reservas_vaga_in_db(db=db)
+    if liberadas:
+        logging.info(f"{liberadas} reservas de vaga expiradas liberadas.")
@@ -0,0 +1,108 @@
+import logging
+import os
+import time
+
+from datetime import datetime
+from threading import Lock
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.revoked_token_orm import RevokedToken
+from app.utils.bloom_utils import BloomFilter
+from app.utils.metrics_utils import registrar_metrica
+from database import SessionLocal
+
+
+# Intervalo de reconstrução do filtro a partir da tabela. Uma revogação feita em outro worker só é vista por este
+# depois da próxima reconstrução; no worker que revogou, o efeito é imediato
+REVOKED_TOKENS_REFRESH_SEGUNDOS = float(os.environ.get("REVOKED_TOKENS_REFRESH_SEGUNDOS", 30))
+
+
+class RevokedTokensFilter:
+    '''
+    Filtro de Bloom com os jti revogados e ainda não expirados. O caso comum (token não revogado) é respondido em
+    memória; só os prováveis revogados (revogados de fato ou falsos positivos, ~1%) são conferidos no banco.
+    '''
+    
+    def __init__(self):
+        self.bloom = BloomFilter(capacidade=1024)
+        self.consultas = 0
+        self.provaveis = 0
+        self.falsos_positivos = 0
+        # revogações feitas por este processo, reincluídas nas reconstruções até certamente constarem da query
+        self._revogados_localmente: dict[str, float] = {}
+        self._lock = Lock()
+        
+        registrar_metrica("revoked_tokens_filter_consultas_total", "Tokens verificados no filtro de revogação.", "counter", lambda: self.consultas)
+        registrar_metrica("revoked_tokens_filter_provaveis_total", "Tokens que o filtro apontou como prováveis revogados (conferidos no banco).", "counter", lambda: self.provaveis)
+        registrar_metrica("revoked_tokens_filter_falsos_positivos_total", "Prováveis revogados que o banco mostrou não estarem revogados.", "counter", lambda: self.falsos_positivos)
+        registrar_metrica("revoked_tokens_filter_itens", "jti no filtro de revogação.", "gauge", lambda: self.bloom.tamanho)
+    
+    def might_be_revoked(self, jti: str) -> bool:
+        self.consultas += 1
+        if jti in self.bloom:
+            self.provaveis += 1
+            return True
+        return False
+    
+    def add(self, jti: str) -> None:
+        with self._lock:
+            self._revogados_localmente[jti] = time.monotonic()
+            self.bloom.add(jti)
+    
+    def rebuild(self, jtis: list[str]) -> None:
+        with self._lock:
+            limite = time.monotonic() - 2 * REVOKED_TOKENS_REFRESH_SEGUNDOS
+            self._revogados_localmente = {jti: instante for jti, instante in self._revogados_localmente.items() if instante >= limite}
+            bloom = BloomFilter(capacidade=max(2 * (len(jtis) + len(self._revogados_localmente)), 1024))
+            for jti in jtis:
+                bloom.add(jti)
+            for jti in self._revogados_localmente:
+                bloom.add(jti)
+            self.bloom = bloom
+
+
+revoked_tokens_filter = RevokedTokensFilter()
+
+
+def is_token_revoked(jti: str | None, db: Session) -> bool:
+    # tokens emitidos antes da existência do jti não podem ser revogados individualmente
+    if jti is None or not revoked_tokens_filter.might_be_revoked(jti):
+        return False
+    revogado = db.get(RevokedToken, jti) is not None
+    if not revogado:
+        revoked_tokens_filter.falsos_positivos += 1
+    return revogado
+
+
+async def is_token_revoked_async(jti: str | None, db: AsyncSession) -> bool:
+    if jti is None or not revoked_tokens_filter.might_be_revoked(jti):
+        return False
+    revogado = await db.get(RevokedToken, jti) is not None
+    if not revogado:
+        revoked_tokens_filter.falsos_positivos += 1
+    return revogado
+
+
+def revoke_access_token(jti: str, user_id: int, expires_at: datetime, db: Session) -> None:
+    try:
+        db.add(RevokedToken(jti=jti, fk_user=user_id, expires_at=expires_at))
+        db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível revogar o token: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    revoked_tokens_filter.add(jti)
+
+
+def refresh_revoked_tokens_filter() -> None:
+    '''Apaga as revogações de tokens já expirados e reconstrói o filtro com as demais. Executada periodicamente.'''
+    with SessionLocal() as db:
+        agora = datetime.now()
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= agora))
+        db.commit()
+        jtis = db.scalars(select(RevokedToken.jti).where(RevokedToken.expires_at > agora)).all()
+    revoked_tokens_filter.rebuild(jtis=list(jtis))
@@ -1,12 +1,51 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 from fastapi import HTTPException, status
 from datetime import datetime
 
 from app.database.carona_orm import Carona
+from app.database.reserva_vaga_orm import ReservaVaga
 from app.database.user_carona_orm import UserCarona
+from app.database.user_orm import Motorista
+from app.database.veiculo_orm import MotoristaVeiculo
 from app.models.user_carona_oop import UserCaronaBase, UserCaronaUpdate
+from app.utils.cache_utils import carona_search_cache
+
+
+def get_reserve_vaga_statement(carona_id: int):
+    '''
+    Reserva uma vaga da carona num único UPDATE condicional. A conferência das vagas e o incremento são atômicos no
+    banco: de duas inscrições simultâneas na última vaga, a que chegar depois não altera nenhuma linha (rowcount 0), sem
+    superlotar a carona e sem serializar o resto da inscrição.
+    '''
+    return (
+        update(Carona)
+        .where(Carona.id == carona_id, Carona.vagas_preenchidas < Carona.vagas)
+        .values(vagas_preenchidas=Carona.vagas_preenchidas + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_consume_reserva_vaga_statement(user_id: int, carona_id: int):
+    '''
+    Apaga a reserva de vaga (POST /user-carona/hold) do usuário na carona, se houver. Enquanto a reserva existe, mesmo
+    expirada e ainda não liberada pelo sweeper, a vaga dela está contada em vagas_preenchidas: a inscrição que a
+    consome não ocupa outra vaga.
+    '''
+    return (
+        delete(ReservaVaga)
+        .where(ReservaVaga.fk_user == user_id, ReservaVaga.fk_carona == carona_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+carona_lotada_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, 
+    detail="Carona já está lotada."
+)
 
 
 def add_user_carona_to_db(user_carona_to_add: UserCaronaBase, db_carona: Carona, db: Session) -> UserCarona:
@@ -16,22 +55,23 @@ def add_user_carona_to_db(user_carona_to_add: UserCaronaBase, db_carona: Carona,
             detail="Motorista não pode se inscrever na própria carona."
         )
     
-    vagas_preenchidas = db.query(UserCarona).filter(UserCarona.fk_carona == user_carona_to_add.fk_carona).count()
-    if vagas_preenchidas >= db_carona.vagas:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, 
-            detail="Carona já está lotada."
-        )
-    
     db_user_carona = UserCarona(**user_carona_to_add.model_dump())
     try:
+        reserva_consumida = db.execute(get_consume_reserva_vaga_statement(
+            user_id=user_carona_to_add.fk_user, carona_id=user_carona_to_add.fk_carona
+        )).rowcount > 0
+        if not reserva_consumida and db.execute(get_reserve_vaga_statement(carona_id=user_carona_to_add.fk_carona)).rowcount == 0:
+            db.rollback()
+            raise carona_lotada_exception
         db.add(db_user_carona)
         db.commit()
         db.refresh(db_user_carona)
     except SQLAlchemyError as sqlae:
+        db.rollback()
         msg = f"Não foi possível adicionar usuário a carona: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
     return db_user_carona
 
 
@@ -60,9 +100,83 @@ def get_user_carona_by_user_and_carona(db: Session, user_id: int, carona_id: int
 def delete_user_carona_from_db(db: Session, db_user_carona: UserCarona) -> str:
     try:
         db.delete(db_user_carona)
+        (
+            db.query(Carona)
+            .filter(Carona.id == db_user_carona.fk_carona)
+            .update({Carona.vagas_preenchidas: Carona.vagas_preenchidas - 1})
+        )
         db.commit()
     except SQLAlchemyError as sqlae:
         msg = f"Não foi possível remover usuário da carona: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    return "Usuário removido da carona com sucesso!"
+
+
+# ===========================================================================
+# Versões assíncronas (DATABASE_ASYNC_MODE), usadas pelos routers *_async
+
+def get_user_carona_extended_load_options() -> list:
+    '''Opções de carregamento do grafo de UserCaronaExtended, necessárias em sessões assíncronas (sem lazy loading).'''
+    return [
+        selectinload(UserCarona.user),
+        selectinload(UserCarona.carona).selectinload(Carona.motorista).joinedload(Motorista.user),
+        selectinload(UserCarona.carona).selectinload(Carona.veiculo_do_motorista).joinedload(MotoristaVeiculo.veiculo),
+    ]
+
+
+async def get_user_carona_by_user_and_carona_async(db: AsyncSession, user_id: int, carona_id: int) -> UserCarona:
+    return (
+        await db.execute(
+            select(UserCarona)
+            .options(*get_user_carona_extended_load_options())
+            .filter(UserCarona.fk_user == user_id, UserCarona.fk_carona == carona_id)
+            .execution_options(populate_existing=True)
+        )
+    ).scalars().first()
+
+
+async def add_user_carona_to_db_async(user_carona_to_add: UserCaronaBase, db_carona: Carona, db: AsyncSession) -> UserCarona:
+    if db_carona.fk_motorista == user_carona_to_add.fk_user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail="Motorista não pode se inscrever na própria carona."
+        )
+    
+    db_user_carona = UserCarona(**user_carona_to_add.model_dump())
+    try:
+        reserva_consumida = (await db.execute(get_consume_reserva_vaga_statement(
+            user_id=user_carona_to_add.fk_user, carona_id=user_carona_to_add.fk_carona
+        ))).rowcount > 0
+        if not reserva_consumida and (await db.execute(get_reserve_vaga_statement(carona_id=user_carona_to_add.fk_carona))).rowcount == 0:
+            await db.rollback()
+            raise carona_lotada_exception
+        db.add(db_user_carona)
+        await db.commit()
+    except SQLAlchemyError as sqlae:
+        await db.rollback()
+        msg = f"Não foi possível adicionar usuário a carona: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
+    return await get_user_carona_by_user_and_carona_async(
+        db=db, user_id=user_carona_to_add.fk_user, carona_id=user_carona_to_add.fk_carona
+    )
+
+
+async def delete_user_carona_from_db_async(db: AsyncSession, db_user_carona: UserCarona) -> str:
+    try:
+        await db.delete(db_user_carona)
+        await db.execute(
+            update(Carona)
+            .where(Carona.id == db_user_carona.fk_carona)
+            .values(vagas_preenchidas=Carona.vagas_preenchidas - 1)
+        )
+        await db.commit()
+    except SQLAlchemyError as sqlae:
+        msg = f"Não foi possível remover usuário da carona: {sqlae}"
+        logging.error(msg)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    carona_search_cache.clear()
     return "Usuário removido da carona com sucesso!"
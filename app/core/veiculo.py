@@ -1,20 +1,25 @@
 import logging
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 
-from app.utils.db_utils import get_db
+from app.utils.db_utils import get_async_db, get_db
 
 from app.database.user_orm import User, Motorista
 from app.database.veiculo_orm import MotoristaVeiculo, Veiculo
 
 from app.models.veiculo_oop import MotoristaVeiculoBase, MotoristaVeiculoModel, MotoristaVeiculoUpdate, VeiculoBase, VeiculoModel
 
-from app.core.motorista import get_current_active_motorista
+from app.core.motorista import get_current_active_motorista, get_current_active_motorista_async
 from app.core.authentication import (
-    get_current_active_user
+    UserContext,
+    get_current_active_user,
+    get_current_user_context,
+    invalidate_cached_user
 )
 
 
@@ -59,6 +64,12 @@ def get_veiculo_by_info(
     return db_veiculo
 
 
+def get_email_of_motorista(fk_motorista: int, db: Session) -> str | None:
+    # normalmente o usuário já está no identity map (usuário autenticado), sem query extra
+    db_user = db.get(User, fk_motorista)
+    return db_user.email if db_user is not None else None
+
+
 def add_motorista_veiculo_to_db(
     motorista_veiculo_to_create: MotoristaVeiculoBase,
     db: Annotated[Session, Depends(get_db)]
@@ -68,6 +79,7 @@ def add_motorista_veiculo_to_db(
         fk_veiculo = motorista_veiculo_to_create.fk_veiculo,
         placa = motorista_veiculo_to_create.placa.upper()
     )
+    email = get_email_of_motorista(fk_motorista=db_motorista_veiculo.fk_motorista, db=db)
     try:
         db.add(db_motorista_veiculo)
         db.commit()
@@ -75,6 +87,9 @@ def add_motorista_veiculo_to_db(
         msg = f"Não foi possível atribuir veiculo ao motorista no banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    # os veículos ativos fazem parte do contexto do usuário guardado em user_cache
+    if email is not None:
+        invalidate_cached_user(email=email)
     
     return db_motorista_veiculo
 
@@ -82,50 +97,51 @@ def add_motorista_veiculo_to_db(
 def get_motorista_veiculo_of_user(
     veiculo_id: int,
     motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
-    db: Annotated[Session, Depends(get_db)]
+    context: Annotated[UserContext, Depends(get_current_user_context)]
+) -> MotoristaVeiculo:
+    db_motorista_veiculo: MotoristaVeiculo = next(
+        (motorista_veiculo for motorista_veiculo in context.veiculos_ativos if motorista_veiculo.fk_veiculo == veiculo_id),
+        None
+    )
+    
+    return db_motorista_veiculo
+
+
+async def get_motorista_veiculo_of_user_async(
+    veiculo_id: int,
+    motorista: Annotated[Motorista, Depends(get_current_active_motorista_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> MotoristaVeiculo:
     db_motorista_veiculo: MotoristaVeiculo = (
-        db.query(MotoristaVeiculo)
-        .filter(
-            MotoristaVeiculo.fk_motorista == motorista.id_fk_user,
-            MotoristaVeiculo.fk_veiculo == veiculo_id,
-            MotoristaVeiculo.active == True
+        await db.execute(
+            select(MotoristaVeiculo)
+            .filter(
+                MotoristaVeiculo.fk_motorista == motorista.id_fk_user,
+                MotoristaVeiculo.fk_veiculo == veiculo_id,
+                MotoristaVeiculo.active == True
+            )
         )
-        .first()
-    )
+    ).scalars().first()
     
     return db_motorista_veiculo
 
 def get_motorista_veiculo_of_user_by_placa(
     placa: str,
     motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
-    db: Annotated[Session, Depends(get_db)]
+    context: Annotated[UserContext, Depends(get_current_user_context)]
 ) -> MotoristaVeiculo:
-    db_motorista_veiculo: MotoristaVeiculo = (
-        db.query(MotoristaVeiculo)
-        .filter(
-            MotoristaVeiculo.fk_motorista == motorista.id_fk_user,
-            MotoristaVeiculo.placa == placa,
-            MotoristaVeiculo.active == True
-        )
-        .first()
+    db_motorista_veiculo: MotoristaVeiculo = next(
+        (motorista_veiculo for motorista_veiculo in context.veiculos_ativos if motorista_veiculo.placa == placa),
+        None
     )
     return db_motorista_veiculo
 
 
 def get_all_motorista_veiculo_of_user(
     motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
-    db: Annotated[Session, Depends(get_db)]
+    context: Annotated[UserContext, Depends(get_current_user_context)]
 )-> list[MotoristaVeiculo]:
-    db_motorista_veiculo: list[MotoristaVeiculo] = (
-        db.query(MotoristaVeiculo)
-        .filter(
-            MotoristaVeiculo.fk_motorista == motorista.id_fk_user,
-            MotoristaVeiculo.active == True
-        )
-        .all()
-    )
-    return db_motorista_veiculo
+    return context.veiculos_ativos
 
 
 def update_motorista_veiculo_in_db(
@@ -142,6 +158,7 @@ def update_motorista_veiculo_in_db(
     if new_active is not None:
         db_motorista_veiculo.active = new_active
     
+    email = get_email_of_motorista(fk_motorista=db_motorista_veiculo.fk_motorista, db=db)
     try:
         db.add(db_motorista_veiculo)
         db.commit()
@@ -149,5 +166,7 @@ def update_motorista_veiculo_in_db(
         msg = f"Não foi possível atualizar o veículo do motorista no banco: {sqlae}"
         logging.error(msg)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=msg)
+    if email is not None:
+        invalidate_cached_user(email=email)
     
     return db_motorista_veiculo
@@ -1,26 +1,66 @@
 from datetime import datetime
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
-from sqlalchemy import Column, ForeignKey, Integer, Float, String, DateTime, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy import Column, ForeignKey, Integer, Float, String, DateTime, UniqueConstraint, Index
 from database import Base
+from app.utils.endereco_utils import get_colunas_derivadas_do_local
 
 
 class Carona(Base):
     __tablename__ = "carona"
     
     id  = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    fk_motorista = Column(Integer, ForeignKey("motorista.id_fk_user"), index=True, nullable=False)
+    fk_motorista = Column(Integer, ForeignKey("motorista.id_fk_user"), index=False, nullable=False)  # Coberta por ix_carona_fk_motorista_hora_partida
     fk_motorista_veiculo = Column(Integer, ForeignKey("motorista_veiculo.id"), index=True, nullable=False)
     valor = Column(Float, index=True, nullable=False)
-    vagas = Column(Integer, index=True, nullable=False)
-    hora_partida = Column(DateTime, index=True, nullable=False)
-    local_partida = Column(String, index=True, nullable=False)
-    local_destino = Column(String, index=True, nullable=False)
+    vagas = Column(Integer, index=False, nullable=False)
+    vagas_preenchidas = Column(Integer, index=False, nullable=False, default=0, server_default="0")  # Mantida por add_user_carona_to_db e delete_user_carona_from_db
+    hora_partida = Column(DateTime, index=False, nullable=False)  # Coberta por ix_carona_hora_partida_valor
+    local_partida = Column(String, index=False, nullable=False)
+    local_destino = Column(String, index=False, nullable=False)
+    local_partida_busca = Column(String, index=False, nullable=False)  # local_partida sem acentos e em maiúsculas, indexada com pg_trgm
+    local_destino_busca = Column(String, index=False, nullable=False)  # local_destino sem acentos e em maiúsculas, indexada com pg_trgm
+    latitude_partida = Column(Float, index=False, nullable=True)  # Centroide do CEP de local_partida (None se o CEP não for conhecido)
+    longitude_partida = Column(Float, index=False, nullable=True)
+    geohash_partida = Column(String, index=False, nullable=True)
+    latitude_destino = Column(Float, index=False, nullable=True)  # Centroide do CEP de local_destino (None se o CEP não for conhecido)
+    longitude_destino = Column(Float, index=False, nullable=True)
+    geohash_destino = Column(String, index=False, nullable=True)
+    rua_partida = Column(String, index=False, nullable=True)  # Partes de local_partida separadas por parse_endereco
+    bairro_partida = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    cidade_partida = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    uf_partida = Column(String, index=False, nullable=True)
+    cep_partida = Column(String, index=False, nullable=True)  # Somente dígitos, indexado com text_pattern_ops para filtros por prefixo
+    rua_destino = Column(String, index=False, nullable=True)  # Partes de local_destino separadas por parse_endereco
+    bairro_destino = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    cidade_destino = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    uf_destino = Column(String, index=False, nullable=True)
+    cep_destino = Column(String, index=False, nullable=True)  # Somente dígitos, indexado com text_pattern_ops para filtros por prefixo
     created_at = Column(DateTime, index=False, nullable=False, default=datetime.now)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.current_timestamp())
     
+    __table_args__ = (
+        # Índices alinhados aos predicados e ordenações de search_caronas e dos históricos
+        Index("ix_carona_hora_partida_valor", hora_partida, valor),
+        Index("ix_carona_fk_motorista_hora_partida", fk_motorista, hora_partida.desc(), id.desc()),
+        Index("ix_carona_created_at_id", created_at, id),
+        Index("ix_carona_com_vagas_hora_partida", hora_partida, id, postgresql_where=(vagas_preenchidas < vagas)),
+        Index("ix_carona_vagas_restantes", vagas - vagas_preenchidas),
+        Index("ix_carona_local_partida_busca_trgm", local_partida_busca, postgresql_using="gin", postgresql_ops={"local_partida_busca": "gin_trgm_ops"}),
+        Index("ix_carona_local_destino_busca_trgm", local_destino_busca, postgresql_using="gin", postgresql_ops={"local_destino_busca": "gin_trgm_ops"}),
+        Index("ix_carona_geohash_partida", geohash_partida, postgresql_ops={"geohash_partida": "text_pattern_ops"}),
+        Index("ix_carona_geohash_destino", geohash_destino, postgresql_ops={"geohash_destino": "text_pattern_ops"}),
+        Index("ix_carona_cep_partida", cep_partida, postgresql_ops={"cep_partida": "text_pattern_ops"}),
+        Index("ix_carona_cep_destino", cep_destino, postgresql_ops={"cep_destino": "text_pattern_ops"}),
+    )
+    
     motorista = relationship("Motorista", lazy=True, uselist=False, back_populates="caronas")
     veiculo_do_motorista = relationship("MotoristaVeiculo", lazy=True, uselist=False, back_populates="caronas")
     passageiros = relationship("UserCarona", lazy=True, uselist=True, back_populates="carona")
     pedidos_de_caronas = relationship("PedidoCarona", lazy=True, uselist=True, back_populates="carona")
-    
\ No newline at end of file
+    
+    @validates("local_partida", "local_destino")
+    def validate_local(self, key: str, local: str) -> str:
+        for coluna, valor in get_colunas_derivadas_do_local(key=key, local=local).items():
+            setattr(self, coluna, valor)
+        return local
@@ -1,8 +1,9 @@
 from datetime import datetime
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
-from sqlalchemy import Column, ForeignKey, Integer, Float, String, DateTime, UniqueConstraint, Boolean, sql
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy import Column, ForeignKey, Integer, Float, String, DateTime, UniqueConstraint, Boolean, Index, literal_column, sql
 from database import Base
+from app.utils.endereco_utils import get_colunas_derivadas_do_local
 
 
 class PedidoCarona(Base):
@@ -15,11 +16,49 @@ class PedidoCarona(Base):
     valor = Column(Float, index=True, nullable=False)
     local_partida = Column(String, index=True, nullable=False)
     local_destino = Column(String, index=True, nullable=False)
+    local_partida_busca = Column(String, index=False, nullable=False)  # local_partida sem acentos e em maiúsculas, indexada com pg_trgm
+    local_destino_busca = Column(String, index=False, nullable=False)  # local_destino sem acentos e em maiúsculas, indexada com pg_trgm
+    latitude_partida = Column(Float, index=False, nullable=True)  # Centroide do CEP de local_partida (None se o CEP não for conhecido)
+    longitude_partida = Column(Float, index=False, nullable=True)
+    geohash_partida = Column(String, index=False, nullable=True)
+    latitude_destino = Column(Float, index=False, nullable=True)  # Centroide do CEP de local_destino (None se o CEP não for conhecido)
+    longitude_destino = Column(Float, index=False, nullable=True)
+    geohash_destino = Column(String, index=False, nullable=True)
+    rua_partida = Column(String, index=False, nullable=True)  # Partes de local_partida separadas por parse_endereco
+    bairro_partida = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    cidade_partida = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    uf_partida = Column(String, index=False, nullable=True)
+    cep_partida = Column(String, index=False, nullable=True)  # Somente dígitos, indexado com text_pattern_ops para filtros por prefixo
+    rua_destino = Column(String, index=False, nullable=True)  # Partes de local_destino separadas por parse_endereco
+    bairro_destino = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    cidade_destino = Column(String, index=True, nullable=True)  # Normalizado (sem acentos, maiúsculas) para filtros por igualdade
+    uf_destino = Column(String, index=False, nullable=True)
+    cep_destino = Column(String, index=False, nullable=True)  # Somente dígitos, indexado com text_pattern_ops para filtros por prefixo
     fk_carona = Column(Integer, ForeignKey("carona.id"), index=True, nullable=True)
     created_at = Column(DateTime, index=False, nullable=False, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.current_timestamp())
     
+    __table_args__ = (
+        Index("ix_pedido_carona_local_partida_busca_trgm", local_partida_busca, postgresql_using="gin", postgresql_ops={"local_partida_busca": "gin_trgm_ops"}),
+        Index("ix_pedido_carona_local_destino_busca_trgm", local_destino_busca, postgresql_using="gin", postgresql_ops={"local_destino_busca": "gin_trgm_ops"}),
+        Index("ix_pedido_carona_geohash_partida", geohash_partida, postgresql_ops={"geohash_partida": "text_pattern_ops"}),
+        Index("ix_pedido_carona_geohash_destino", geohash_destino, postgresql_ops={"geohash_destino": "text_pattern_ops"}),
+        Index("ix_pedido_carona_cep_partida", cep_partida, postgresql_ops={"cep_partida": "text_pattern_ops"}),
+        Index("ix_pedido_carona_cep_destino", cep_destino, postgresql_ops={"cep_destino": "text_pattern_ops"}),
+        # Índice de intervalo (GiST) das janelas de horário dos pedidos em aberto, usado para achar os pedidos que uma carona recém criada atende
+        Index(
+            "ix_pedido_carona_janela_aberta",
+            func.tsrange(hora_partida_minima, hora_partida_maxima, literal_column("'[]'")),
+            postgresql_using="gist",
+            postgresql_where=fk_carona.is_(None)
+        ).ddl_if(dialect="postgresql"),
+    )
+    
     user = relationship("User", lazy=True, uselist=False, back_populates="pedidos_de_caronas")
     carona = relationship("Carona", lazy=True, uselist=False, back_populates="pedidos_de_caronas")
-
     
+    @validates("local_partida", "local_destino")
+    def validate_local(self, key: str, local: str) -> str:
+        for coluna, valor in get_colunas_derivadas_do_local(key=key, local=local).items():
+            setattr(self, coluna, valor)
+        return local
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy.orm import relationship
+from database import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_token"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    fk_user = Column(Integer, ForeignKey("user.id"), index=True, nullable=False)
+    # sha256 do token: o token é aleatório (256 bits), então não precisa de um hash lento como o bcrypt
+    token_hash = Column(String(64), index=True, nullable=False, unique=True)
+    # Todos os tokens obtidos por rotação a partir de um mesmo login. O reuso de um token já rotacionado revoga a família
+    familia = Column(String(32), index=True, nullable=False)
+    created_at = Column(DateTime, index=False, nullable=False, default=datetime.now)
+    expires_at = Column(DateTime, index=False, nullable=False)
+    revoked_at = Column(DateTime, index=False, nullable=True)
+    
+    user = relationship("User", lazy=True, uselist=False)
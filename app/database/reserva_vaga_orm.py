@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, ForeignKey, Integer, DateTime, UniqueConstraint
+from database import Base
+
+
+class ReservaVaga(Base):
+    __tablename__ = "reserva_vaga"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    fk_user = Column(Integer, ForeignKey("user.id"), index=False, nullable=False)  # Coberta pela UniqueConstraint (fk_user, fk_carona)
+    fk_carona = Column(Integer, ForeignKey("carona.id"), index=True, nullable=False)
+    # até a confirmação (que troca a reserva por um UserCarona) ou a expiração, a vaga fica contada em carona.vagas_preenchidas
+    expires_at = Column(DateTime, index=True, nullable=False)
+    created_at = Column(DateTime, index=False, nullable=False, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint("fk_user", "fk_carona"),
+    )
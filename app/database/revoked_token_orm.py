@@ -0,0 +1,13 @@
+from datetime import datetime
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
+from database import Base
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_token"
+    
+    jti = Column(String(32), primary_key=True)
+    fk_user = Column(Integer, ForeignKey("user.id"), index=True, nullable=False)
+    # expiração do próprio access token: depois dela a linha pode ser apagada, o token já é recusado pelo exp
+    expires_at = Column(DateTime, index=True, nullable=False)
+    created_at = Column(DateTime, index=False, nullable=False, default=datetime.now)
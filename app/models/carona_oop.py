@@ -18,6 +18,7 @@ class CaronaBase(CaronaBasePartidaDestino):
     
 class CaronaModel(CaronaBase):
     id: int
+    vagas_preenchidas: int = 0
     created_at: datetime
     updated_at: datetime
     
@@ -40,14 +41,49 @@ class CaronaExtended(CaronaModel):
     passageiros: list[UserCaronaWithUser] = []
     
     @computed_field
-    def vagas_preenchidas(self) -> int:
-        return len(self.passageiros)
+    def vagas_restantes(self) -> int:
+        return self.vagas - self.vagas_preenchidas
+
+
+class CaronaCompact(BaseModel):  # Projeção enxuta de Carona para listagens (view=compact), sem dados pessoais de motorista e passageiros
+    id: int
+    hora_partida: datetime
+    valor: float
+    vagas: int
+    vagas_preenchidas: int
+    local_partida: str
+    local_destino: str
+    bairro_partida: str | None = None
+    bairro_destino: str | None = None
+    created_at: datetime
+    fk_motorista: int
+    motorista_first_name: str
+    veiculo_modelo: str
+    veiculo_cor: str | None = None
     
     @computed_field
     def vagas_restantes(self) -> int:
         return self.vagas - self.vagas_preenchidas
 
 
-    
-    
-    
\ No newline at end of file
+# ===========================================================================
+
+class FaixaDePrecoCount(BaseModel):
+    valor_minimo: float
+    valor_maximo: float
+    total: int
+
+class HoraDoDiaCount(BaseModel):
+    hora: int
+    total: int
+
+class BairroCount(BaseModel):
+    bairro: str | None
+    total: int
+
+class CaronaFacets(BaseModel):
+    total: int
+    faixas_de_preco: list[FaixaDePrecoCount] = []
+    horas_do_dia: list[HoraDoDiaCount] = []
+    bairros_partida: list[BairroCount] = []
+    bairros_destino: list[BairroCount] = []
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class EnderecoEstruturado(BaseModel):
+    rua: str | None = None
+    bairro: str | None = None
+    cidade: str | None = None
+    uf: str | None = None
+    cep: str | None = None  # Somente dígitos
@@ -7,3 +7,4 @@ class RouterTags(enum.Enum):
     pedido_carona = "Pedido de Carona"
     user_carona = "Inscrição em Carona"
     avaliacao= "Avalição da Carona"
+    metricas = "Métricas"
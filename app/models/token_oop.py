@@ -4,6 +4,23 @@ from pydantic import BaseModel
 class TokenModel(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
-    username: str | None = None
\ No newline at end of file
+    username: str | None = None
+    # claims de identidade (ausentes em tokens antigos), confiáveis até claims_exp
+    user_id: int | None = None
+    active: bool | None = None
+    is_motorista: bool | None = None
+    claims_exp: int | None = None
+    jti: str | None = None
+    exp: int | None = None
+
+class TokenIdentity(BaseModel):
+    id: int
+    email: str
+    active: bool
+    is_motorista: bool
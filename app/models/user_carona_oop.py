@@ -40,3 +40,10 @@ class CaronaSecondary(BaseModel):  # Modelo de Carona criado para evitar circula
 
 class UserCaronaExtended(UserCaronaWithUser):
     carona: CaronaSecondary
+
+class ReservaVagaModel(UserCaronaBase):
+    id: int
+    expires_at: datetime
+    created_at: datetime
+    class Config:
+        orm_mode = True
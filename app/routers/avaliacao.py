@@ -6,7 +6,7 @@ from sqlalchemy import exc, func
 
 from app.core.motorista import get_current_active_motorista, get_motorista_by_id
 from app.utils.db_utils import get_db
-from app.core.authentication import get_current_active_user, get_user_by_id
+from app.core.authentication import get_current_active_identity, get_current_active_user, get_read_db, get_user_by_id
 from app.database.user_carona_orm import UserCarona
 from app.database.carona_orm import Carona
 
@@ -15,6 +15,7 @@ from app.models.avaliacao_opp import AvaliacaoMotorista, AvaliacaoPassageiro, Av
 
 
 from app.models.router_tags import RouterTags
+from app.models.token_oop import TokenIdentity
 from app.database.user_orm import Motorista, User
 
 
@@ -91,8 +92,8 @@ def avaliar_motorista(
 @router.get("/motorista/{motorista_id}", response_model=AvaliacaoResponse, description="Média da avaliação de motorista")
 def get_media_avaliacao_motorista(
     motorista: Annotated[Motorista, Depends(get_motorista_by_id)],
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)]
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],
+    db: Annotated[Session, Depends(get_read_db)]
 )-> AvaliacaoResponse:
     if not motorista:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Motorista não encontrado.")
@@ -112,8 +113,8 @@ def get_media_avaliacao_motorista(
 @router.get("/passageiro/{user_id}", response_model=AvaliacaoResponse, description="Média da avaliação de passageiro")
 def get_media_avaliacao_passageiro(
     user: Annotated[User, Depends(get_user_by_id)],
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)]
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],
+    db: Annotated[Session, Depends(get_read_db)]
 )-> AvaliacaoResponse:
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado.")
@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
-from app.core.authentication import get_current_active_user
+from app.core.authentication import UserContext, get_current_active_identity, get_current_active_user, get_current_user_context, get_read_db
 from app.core.pedido_carona import get_pedido_carona_by_id, update_carona_from_pedido_carona_in_db
 from app.core.user_carona import add_user_carona_to_db
 from app.database.carona_orm import Carona
@@ -13,16 +13,27 @@ from app.database.user_carona_orm import UserCarona
 from app.database.user_orm import Motorista, User
 from app.database.veiculo_orm import MotoristaVeiculo
 
-from app.models.carona_oop import CaronaBase, CaronaBasePartidaDestino, CaronaExtended, CaronaUpdate, CaronaUpdatePartidaDestino
+from app.models.carona_oop import CaronaBase, CaronaBasePartidaDestino, CaronaCompact, CaronaExtended, CaronaFacets, CaronaUpdate, CaronaUpdatePartidaDestino
 
 from app.models.user_carona_oop import UserCaronaBase
-from app.utils.db_utils import apply_limit_offset, get_db
-from app.utils.carona_utils import CaronaOrderByOptions
-
-from app.core.carona import add_carona_to_db, get_carona_by_id, remove_carona_from_db, update_carona_in_db
-from app.core.motorista import get_current_active_motorista
+from app.utils.cache_utils import carona_search_cache
+from app.utils.db_utils import NEXT_CURSOR_HEADER, apply_keyset_pagination, get_db, get_next_cursor, has_recent_writes, is_primary_session
+from app.utils.carona_utils import CaronaOrderByOptions, CaronaSearchFilters, CaronaViewOptions, ExportFormatOptions
+
+from app.core.carona import (
+    add_carona_to_db,
+    fetch_caronas,
+    get_carona_by_id,
+    get_carona_facets,
+    get_caronas_query,
+    remove_carona_from_db,
+    stream_caronas_export,
+    update_carona_in_db
+)
+from app.core.motorista import get_current_active_motorista, get_current_active_motorista_identity
 from app.core.veiculo import get_motorista_veiculo_of_user
 from app.models.router_tags import RouterTags
+from app.models.token_oop import TokenIdentity
 
 
 router = APIRouter(prefix="/carona", tags=[RouterTags.carona])
@@ -37,6 +48,7 @@ def create_carona(
     preco_carona: float,
     partida_destino: CaronaBasePartidaDestino,
     db: Annotated[Session, Depends(get_db)],
+    background_tasks: BackgroundTasks,
     vagas: int = 4,
 )-> CaronaExtended:
     '''
@@ -78,7 +90,8 @@ def create_carona(
             local_destino=partida_destino.local_destino,
             vagas=vagas
         ),
-        db=db
+        db=db,
+        background_tasks=background_tasks
     )
     return carona
 
@@ -89,85 +102,91 @@ description_search_caronas = (
     - Os endereços armazenados no banco de dados são strings, e não coordenadas geográficas. Eles possuem um formato específico que segue o padrão do Google Maps.\\
     ---- Exemplo: "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240"\\
     - A filtragem por _keyword_partida_ e _keyword_destino_ é feita por meio de uma busca textual, isto é, a query retornará as caronas cujo local de partida ou destino contém a palavra chave passada.\\
-    ---- Exemplo: se _keyword_partida_="Ipanema", a query retornará as caronas cujo local de partida contém a palavra "Ipanema" (ex: "Ipanema, Rio de Janeiro").
+    ---- Exemplo: se _keyword_partida_="Ipanema", a query retornará as caronas cujo local de partida contém a palavra "Ipanema" (ex: "Ipanema, Rio de Janeiro").\\
+    - A busca textual ignora acentos e maiúsculas/minúsculas.\\
+    ---- Exemplo: _keyword_destino_="niteroi" encontra "Niterói".\\
+    - Os endereços são separados em rua, bairro, cidade, UF e CEP na escrita. Os filtros _bairro_partida_, _cidade_destino_, _cep_prefix_partida_, etc. usam essas partes e são bem mais baratos que a busca textual por palavra chave. Caronas cujo endereço não segue o padrão acima não aparecem nesses filtros.\\
+    - A filtragem por raio (_raio_partida_ e _raio_destino_, em km) usa as coordenadas do centroide do CEP de cada endereço. Caronas cujo endereço não tem um CEP conhecido não aparecem numa busca por raio.\\
+    - Paginação por cursor: a resposta traz no header _X-Next-Cursor_ o cursor da próxima página (ausente na última página). Passe-o em _cursor_, mantendo os demais params, para buscar a página seguinte sem o custo do _deslocamento_.\\
+    - Os resultados ficam em cache por alguns segundos, e o cache é invalidado a cada escrita em caronas ou inscrições. _hora_minima_ e _hora_maxima_ são truncadas para o minuto.\\
+    - Para telas de listagem, use _view_=compact: a resposta traz só os campos de CaronaCompact (sem dados pessoais de motorista e passageiros), vindos de uma única query com as colunas necessárias.
     '''
 )
-@router.get("", response_model=list[CaronaExtended], description=description_search_caronas)
+@router.get("", response_model=list[CaronaExtended] | list[CaronaCompact], description=description_search_caronas)
 def search_caronas(
-    db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)],  # precisa estar logado para usar o endpoint
-    motorista_id: int | None = Query(None, description="ID do motorista para filtrar as caronas de um motorista. Se nada for passado, as caronas não serão filtradas por motorista"),
-    hora_minima: datetime = Query(datetime.now(), description="Hora mínima de partida da carona. Se nada for passado, será considerada a hora atual"),
-    hora_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Hora máxima de partida da carona. Se nada for passado, será considerada a hora atual+1ano"),
-    valor_minimo: float = Query(0, description="Valor mínimo de preço da carona"),
-    valor_maximo: float = Query(999999, description="Valor máximo de preço da carona"),
-    vagas_restantes_minimas: int = Query(1, description="Número de vagas restantes disponíveis na carona. Se nada for passado, será considerado 1 vaga no mínimo"),
-    keyword_partida: str = Query(None, description="Palavra chave para filtrar os endereços de partida."),
-    # raio_partida: ? = x,
-    keyword_destino: str = Query(None, description="Palavra chave para filtrar os endereços destinos."),
-    # raio_destino: ? = x
+    response: Response,
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],  # precisa estar logado para usar o endpoint
+    search_filters: Annotated[CaronaSearchFilters, Depends()],
     order_by: CaronaOrderByOptions = Query(CaronaOrderByOptions.hora_partida, description="Como a query deve ser ordenada."),
     is_crescente: bool = Query(True, description="Indica se a ordenação deve ser feita em ordem crescente."),
     limite: int = Query(10, description="Limite de caronas retornadas pela query"),
     deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
-) -> list[CaronaExtended]:
-    filters = []
-
-    if hora_minima > hora_maxima:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="hora_minima não pode ser maior que hora_maxima"
-        )
-    if valor_minimo > valor_maximo:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="valor_minimo não pode ser maior que hvalor_maximo"
-        )
-
-    if motorista_id is not None:
-        filters.append(Carona.fk_motorista == motorista_id)
-    if hora_minima:
-        filters.append(Carona.hora_partida >= hora_minima)
-    if hora_maxima:
-        filters.append(Carona.hora_partida <= hora_maxima)
-    if valor_minimo is not None:
-        filters.append(Carona.valor >= valor_minimo)
-    if valor_maximo is not None:
-        filters.append(Carona.valor <= valor_maximo)
-    if vagas_restantes_minimas is not None:
-        # subquery para contar as vagas preenchidas
-        vagas_query = (
-            db.query(UserCarona.fk_carona, func.count(UserCarona.fk_user).label("num_passageiros"))
-            .group_by(UserCarona.fk_carona)
-            .subquery()
-        )
-        # filra as caronas que possuem pelo menos vagas_restantes_minimas vagas disponíveis
-        filters.append(Carona.vagas - func.coalesce(vagas_query.c.num_passageiros, 0) >= vagas_restantes_minimas)
-    if keyword_partida:
-        filters.append(func.upper(Carona.local_partida).contains(keyword_partida.upper()))
-    if keyword_destino: 
-        filters.append(func.upper(Carona.local_destino).contains(keyword_destino.upper()))
-
-    order_by_dict = CaronaOrderByOptions.get_order_by_dict()
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    cache_key = search_filters.get_cache_key() + (order_by.value, is_crescente, limite, None if cursor else deslocamento, cursor, view.value)
+    # quem escreveu há pouco (read-your-writes) não lê do cache: a busca vai ao primário, como em get_read_db
+    usar_cache = not has_recent_writes(usuario_id=current_user.id)
+    resultado_em_cache = carona_search_cache.get(cache_key) if usar_cache else None
+    if resultado_em_cache is not None:
+        caronas, next_cursor = resultado_em_cache
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return caronas
+    geracao_do_cache = carona_search_cache.geracao
     
-    caronas_query = (
-        db.query(Carona)
-        .outerjoin(vagas_query, Carona.id == vagas_query.c.fk_carona)
-        .filter(*filters)
-        .order_by(order_by_dict[order_by.value][is_crescente]))
-    caronas_query = apply_limit_offset(query=caronas_query, limit=limite, offset=deslocamento)
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[order_by.value]
+    
+    caronas_query = get_caronas_query(view=view, db=db).filter(*search_filters.get_filters())
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=is_crescente,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
     
-    caronas = caronas_query.all()
+    # serializa uma vez só, com a sessão ainda aberta, e guarda os modelos prontos no cache
+    caronas = fetch_caronas(caronas_query=caronas_query, view=view, db=db)
+    
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    # só resultados lidos do primário vão para o cache: a réplica pode estar atrasada em relação à escrita que acabou de
+    # invalidá-lo, e o resultado desatualizado seria servido a todos (inclusive a quem escreveu) até o TTL
+    if is_primary_session(db):
+        carona_search_cache.set(cache_key, (caronas, next_cursor), geracao=geracao_do_cache)
     
     return caronas
 
+description_carona_facets = (
+    '''
+    - Retorna as contagens de caronas agrupadas por faixa de preço, hora do dia da partida, bairro de partida e bairro de destino, aceitando os mesmos filtros de GET /carona.\\
+    - Todas as contagens vêm de uma única query agregada (GROUPING SETS), então uma chamada substitui várias buscas completas.\\
+    - As faixas de preço têm largura _largura_faixa_preco_ e começam em múltiplos dela (ex: largura 10 -> [0, 10), [10, 20), ...).\\
+    - Caronas cujo endereço não segue o padrão do Google Maps são contadas no bairro _null_.
+    '''
+)
+@router.get("/facets", response_model=CaronaFacets, description=description_carona_facets)
+def get_facets_caronas(
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],  # precisa estar logado para usar o endpoint
+    search_filters: Annotated[CaronaSearchFilters, Depends()],
+    largura_faixa_preco: float = Query(10, gt=0, description="Largura (em reais) de cada faixa de preço."),
+) -> CaronaFacets:
+    return get_carona_facets(filters=search_filters.get_filters(), largura_faixa_preco=largura_faixa_preco, db=db)
+
 
 @router.get("/{carona_id}", response_model=CaronaExtended)
 def read_carona_by_id(
-    carona: Annotated[Carona, Depends(get_carona_by_id)],
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    carona_id: int,
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)]
 ) -> CaronaExtended:
-    return carona
+    return get_carona_by_id(carona_id=carona_id, db=db)
 
 
 @router.put("/{carona_id}", response_model=CaronaExtended)
@@ -175,6 +194,7 @@ def update_carona(
     carona: Annotated[Carona, Depends(get_carona_by_id)],
     carona_id: int,
     motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
+    context: Annotated[UserContext, Depends(get_current_user_context)],
     db: Annotated[Session, Depends(get_db)],
     partida_destino: CaronaUpdatePartidaDestino,
     veiculo_id: int | None = None,
@@ -197,7 +217,7 @@ def update_carona(
         db_motorista_veiculo = get_motorista_veiculo_of_user(
             veiculo_id=veiculo_id,
             motorista=motorista,
-            db=db
+            context=context
         )
         if not db_motorista_veiculo:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Vehicle of current user with id {veiculo_id} not found.")
@@ -239,15 +259,7 @@ def delete_carona(
     return f"Carona id={carona_id} removida com sucesso"
 
 
-@router.get("/historico/me/motorista", response_model=list[CaronaExtended])
-def get_my_historico_as_motorista(
-    current_motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
-    db: Annotated[Session, Depends(get_db)],
-    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
-    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
-    limite: int = Query(10, description="Limite de caronas retornadas pela query"),
-    deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
-) -> list[CaronaExtended]:
+def get_historico_filters(data_minima: datetime, data_maxima: datetime) -> list:
     filters = []
     
     if data_minima > data_maxima:
@@ -256,66 +268,136 @@ def get_my_historico_as_motorista(
             detail="data_minima não pode ser maior que data_maxima"
         )
     
-    filters.append(Carona.fk_motorista == current_motorista.id_fk_user)
     if data_minima:
         filters.append(Carona.hora_partida >= data_minima)
     if data_maxima:
         filters.append(Carona.hora_partida <= data_maxima)
+    return filters
+
+
+@router.get("/historico/me/motorista", response_model=list[CaronaExtended] | list[CaronaCompact])
+def get_my_historico_as_motorista(
+    response: Response,
+    current_motorista: Annotated[TokenIdentity, Depends(get_current_active_motorista_identity)],
+    db: Annotated[Session, Depends(get_read_db)],
+    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
+    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
+    limite: int = Query(10, description="Limite de caronas retornadas pela query"),
+    deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
+    filters.append(Carona.fk_motorista == current_motorista.id)
+    
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[CaronaOrderByOptions.hora_partida.value]
     
-    order_by_dict = CaronaOrderByOptions.get_order_by_dict()
+    caronas_query = get_caronas_query(view=view, db=db).filter(*filters)
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=False,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
     
-    caronas_query = db.query(Carona).filter(*filters).order_by(order_by_dict[CaronaOrderByOptions.hora_partida.value][False])
-    caronas_query = apply_limit_offset(query=caronas_query, limit=limite, offset=deslocamento)
+    caronas = fetch_caronas(caronas_query=caronas_query, view=view, db=db)
     
-    caronas = caronas_query.all()
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return caronas
 
 
-@router.get("/historico/me/passageiro", response_model=list[CaronaExtended])
+@router.get("/historico/me/passageiro", response_model=list[CaronaExtended] | list[CaronaCompact])
 def get_my_historico_as_passageiro(
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    response: Response,
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],
+    db: Annotated[Session, Depends(get_read_db)],
     data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
     data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
     limite: int = Query(10, description="Limite de caronas retornadas pela query"),
     deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
-) -> list[CaronaExtended]:
-    filters = []
-    
-    if data_minima > data_maxima:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="data_minima não pode ser maior que data_maxima"
-        )
-    
-    if data_minima:
-        filters.append(Carona.hora_partida >= data_minima)
-    if data_maxima:
-        filters.append(Carona.hora_partida <= data_maxima)
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
     filters.append(UserCarona.fk_user == current_user.id)
     
-    order_by_dict = CaronaOrderByOptions.get_order_by_dict()
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[CaronaOrderByOptions.hora_partida.value]
     
     caronas_query = (
-        db.query(Carona)
+        get_caronas_query(view=view, db=db)
         .join(UserCarona, Carona.id == UserCarona.fk_carona)
         .filter(*filters)
-        .order_by(order_by_dict[CaronaOrderByOptions.hora_partida.value][False])
     )
-    caronas_query = apply_limit_offset(query=caronas_query, limit=limite, offset=deslocamento)
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=False,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
     
-    caronas = caronas_query.all()
+    caronas = fetch_caronas(caronas_query=caronas_query, view=view, db=db)
+    
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return caronas
 
 
+description_export_historico = (
+    '''
+    - Exporta todo o histórico filtrado, sem paginação, em NDJSON (uma carona por linha, no mesmo formato de _CaronaExtended_) ou CSV (relacionamentos achatados), da carona mais recente para a mais antiga.
+    - A resposta é enviada em stream à medida que as caronas são lidas do banco, então o tempo até o primeiro byte e o uso de memória não dependem do tamanho do histórico.
+    '''
+)
+@router.get("/historico/me/motorista/export", response_class=StreamingResponse, description=description_export_historico)
+def export_my_historico_as_motorista(
+    current_motorista: Annotated[TokenIdentity, Depends(get_current_active_motorista_identity)],
+    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
+    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
+    formato: ExportFormatOptions = Query(ExportFormatOptions.ndjson, description="Formato do export."),
+) -> StreamingResponse:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
+    filters.append(Carona.fk_motorista == current_motorista.id)
+    
+    return StreamingResponse(
+        stream_caronas_export(filters=filters, formato=formato, usuario_id=current_motorista.id),
+        media_type=ExportFormatOptions.get_media_type_dict()[formato.value],
+        headers={"Content-Disposition": f"attachment; filename=historico_motorista.{formato.value}"}
+    )
+
+
+@router.get("/historico/me/passageiro/export", response_class=StreamingResponse, description=description_export_historico)
+def export_my_historico_as_passageiro(
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],
+    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
+    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
+    formato: ExportFormatOptions = Query(ExportFormatOptions.ndjson, description="Formato do export."),
+) -> StreamingResponse:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
+    filters.append(UserCarona.fk_user == current_user.id)
+    
+    return StreamingResponse(
+        stream_caronas_export(filters=filters, formato=formato, join_user_carona=True, usuario_id=current_user.id),
+        media_type=ExportFormatOptions.get_media_type_dict()[formato.value],
+        headers={"Content-Disposition": f"attachment; filename=historico_passageiro.{formato.value}"}
+    )
+
+
 @router.post("/caronas/pedido/{pedido_carona_id}", response_model=CaronaExtended)
 def create_carona_from_pedido(
     pedido_carona: Annotated[PedidoCarona, Depends(get_pedido_carona_by_id)],
     db: Annotated[Session, Depends(get_db)], 
     current_motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
     motorista_veiculo: Annotated[MotoristaVeiculo, Depends(get_motorista_veiculo_of_user)],
+    background_tasks: BackgroundTasks,
     veiculo_id: int,
     hora_de_partida: datetime = Query(),
     vagas: int = Query(),
@@ -367,7 +449,8 @@ def create_carona_from_pedido(
             valor=pedido_carona.valor,
             vagas=vagas
         ),
-        db=db
+        db=db,
+        background_tasks=background_tasks
     )
     
     db_user_carona = add_user_carona_to_db(
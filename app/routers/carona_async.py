@@ -0,0 +1,278 @@
+'''
+Versões assíncronas (async def + AsyncSession) das rotas de carona mais acessadas. Só são registradas com
+DATABASE_ASYNC_MODE=true, antes do router síncrono de carona, de forma que atendem os mesmos paths; as rotas que não
+têm versão aqui (exports, carona a partir de pedido) continuam sendo atendidas pelo router síncrono.
+'''
+from datetime import datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status, Query
+from typing import Annotated
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.authentication import get_current_active_user_async
+from app.database.carona_orm import Carona
+from app.database.user_carona_orm import UserCarona
+from app.database.user_orm import Motorista, User
+from app.database.veiculo_orm import MotoristaVeiculo
+
+from app.models.carona_oop import CaronaBase, CaronaBasePartidaDestino, CaronaCompact, CaronaExtended, CaronaFacets, CaronaUpdate, CaronaUpdatePartidaDestino
+
+from app.utils.cache_utils import carona_search_cache
+from app.utils.db_utils import NEXT_CURSOR_HEADER, apply_keyset_pagination, get_async_db, get_next_cursor, has_recent_writes
+from app.utils.carona_utils import CaronaOrderByOptions, CaronaSearchFilters, CaronaViewOptions
+
+from app.core.carona import (
+    add_carona_to_db_async,
+    fetch_caronas_async,
+    get_carona_by_id_async,
+    get_carona_facets_async,
+    get_caronas_select,
+    remove_carona_from_db_async,
+    update_carona_in_db_async
+)
+from app.core.motorista import get_current_active_motorista_async
+from app.core.veiculo import get_motorista_veiculo_of_user_async
+from app.models.router_tags import RouterTags
+from app.routers.carona import description_carona_facets, description_search_caronas, get_historico_filters
+
+
+router = APIRouter(prefix="/carona", tags=[RouterTags.carona])
+
+
+@router.post("", response_model=CaronaExtended)
+async def create_carona_async(
+    motorista: Annotated[Motorista, Depends(get_current_active_motorista_async)],
+    motorista_veiculo: Annotated[MotoristaVeiculo, Depends(get_motorista_veiculo_of_user_async)],
+    veiculo_id: int,
+    hora_de_partida: datetime,
+    preco_carona: float,
+    partida_destino: CaronaBasePartidaDestino,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    background_tasks: BackgroundTasks,
+    vagas: int = 4,
+)-> CaronaExtended:
+    '''
+    Cria uma nova carona no sistema. Mesmo comportamento de POST /carona no modo síncrono.
+    '''
+    if not motorista_veiculo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Veículo id={veiculo_id} do usuário não encontrado.")
+    
+    if vagas < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Número de vagas deve ser maior que 0.")
+    
+    carona = await add_carona_to_db_async(
+        carona_to_add=CaronaBase(
+            fk_motorista=motorista.id_fk_user,
+            fk_motorista_veiculo=motorista_veiculo.id,
+            hora_partida= hora_de_partida,
+            valor=preco_carona,
+            local_partida=partida_destino.local_partida,
+            local_destino=partida_destino.local_destino,
+            vagas=vagas
+        ),
+        db=db,
+        background_tasks=background_tasks
+    )
+    return carona
+
+
+@router.get("", response_model=list[CaronaExtended] | list[CaronaCompact], description=description_search_caronas)
+async def search_caronas_async(
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    current_user: Annotated[User, Depends(get_current_active_user_async)],  # precisa estar logado para usar o endpoint
+    search_filters: Annotated[CaronaSearchFilters, Depends()],
+    order_by: CaronaOrderByOptions = Query(CaronaOrderByOptions.hora_partida, description="Como a query deve ser ordenada."),
+    is_crescente: bool = Query(True, description="Indica se a ordenação deve ser feita em ordem crescente."),
+    limite: int = Query(10, description="Limite de caronas retornadas pela query"),
+    deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    cache_key = search_filters.get_cache_key() + (order_by.value, is_crescente, limite, None if cursor else deslocamento, cursor, view.value)
+    # quem escreveu há pouco (read-your-writes) não lê do cache: a busca vai ao primário, como em get_read_db
+    usar_cache = not has_recent_writes(usuario_id=current_user.id)
+    resultado_em_cache = carona_search_cache.get(cache_key) if usar_cache else None
+    if resultado_em_cache is not None:
+        caronas, next_cursor = resultado_em_cache
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return caronas
+    geracao_do_cache = carona_search_cache.geracao
+    
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[order_by.value]
+    
+    caronas_query = get_caronas_select(view=view).filter(*search_filters.get_filters())
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=is_crescente,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
+    
+    caronas = await fetch_caronas_async(caronas_query=caronas_query, view=view, db=db)
+    
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    carona_search_cache.set(cache_key, (caronas, next_cursor), geracao=geracao_do_cache)
+    
+    return caronas
+
+
+@router.get("/facets", response_model=CaronaFacets, description=description_carona_facets)
+async def get_facets_caronas_async(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    current_user: Annotated[User, Depends(get_current_active_user_async)],  # precisa estar logado para usar o endpoint
+    search_filters: Annotated[CaronaSearchFilters, Depends()],
+    largura_faixa_preco: float = Query(10, gt=0, description="Largura (em reais) de cada faixa de preço."),
+) -> CaronaFacets:
+    return await get_carona_facets_async(filters=search_filters.get_filters(), largura_faixa_preco=largura_faixa_preco, db=db)
+
+
+@router.get("/{carona_id}", response_model=CaronaExtended)
+async def read_carona_by_id_async(
+    carona: Annotated[Carona, Depends(get_carona_by_id_async)],
+    current_user: Annotated[User, Depends(get_current_active_user_async)]
+) -> CaronaExtended:
+    return carona
+
+
+@router.put("/{carona_id}", response_model=CaronaExtended)
+async def update_carona_async(
+    carona: Annotated[Carona, Depends(get_carona_by_id_async)],
+    carona_id: int,
+    motorista: Annotated[Motorista, Depends(get_current_active_motorista_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    partida_destino: CaronaUpdatePartidaDestino,
+    veiculo_id: int | None = None,
+    hora_de_partida: datetime | None = None,
+    preco_carona: float | None = None,
+    vagas: int | None = None
+) -> CaronaExtended:
+    '''
+    Atualiza informações de uma carona criada pelo usuário. Mesmo comportamento de PUT /carona/{carona_id} no modo síncrono.
+    '''
+    if carona.fk_motorista != motorista.id_fk_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Carona id={carona_id} não encontrada.")
+    
+    if veiculo_id is not None:
+        db_motorista_veiculo = await get_motorista_veiculo_of_user_async(
+            veiculo_id=veiculo_id,
+            motorista=motorista,
+            db=db
+        )
+        if not db_motorista_veiculo:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Vehicle of current user with id {veiculo_id} not found.")
+    
+    carona = await update_carona_in_db_async(
+        db_carona=carona,
+        carona_new_info=CaronaUpdate(
+            fk_motorista_veiculo=veiculo_id,
+            hora_partida=hora_de_partida,
+            valor=preco_carona,
+            local_partida=partida_destino.local_partida,
+            local_destino=partida_destino.local_destino,
+            vagas=vagas
+        ),
+        db=db
+    )
+    
+    return carona
+
+
+@router.delete("/{carona_id}", response_model=str)
+async def delete_carona_async(
+    carona: Annotated[Carona, Depends(get_carona_by_id_async)],
+    carona_id: int,
+    motorista: Annotated[Motorista, Depends(get_current_active_motorista_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    enforce: bool = False,
+)-> str:
+    '''
+    Remove a carona criada pelo usuário. Mesmo comportamento de DELETE /carona/{carona_id} no modo síncrono.
+    '''
+    if carona.fk_motorista != motorista.id_fk_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Carona id={carona_id} não encontrada.")
+
+    await remove_carona_from_db_async(db_carona=carona, db=db, enforce=enforce)
+    
+    return f"Carona id={carona_id} removida com sucesso"
+
+
+@router.get("/historico/me/motorista", response_model=list[CaronaExtended] | list[CaronaCompact])
+async def get_my_historico_as_motorista_async(
+    response: Response,
+    current_motorista: Annotated[Motorista, Depends(get_current_active_motorista_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
+    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
+    limite: int = Query(10, description="Limite de caronas retornadas pela query"),
+    deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
+    filters.append(Carona.fk_motorista == current_motorista.id_fk_user)
+    
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[CaronaOrderByOptions.hora_partida.value]
+    
+    caronas_query = get_caronas_select(view=view).filter(*filters)
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=False,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
+    
+    caronas = await fetch_caronas_async(caronas_query=caronas_query, view=view, db=db)
+    
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return caronas
+
+
+@router.get("/historico/me/passageiro", response_model=list[CaronaExtended] | list[CaronaCompact])
+async def get_my_historico_as_passageiro_async(
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_active_user_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    data_minima: datetime = Query(datetime.now()-timedelta(days=365), description="Data mínima de partida da carona. Se nada for passado, será considerada a data atual-1ano"),
+    data_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Data máxima de partida da carona. Se nada for passado, será considerada a data atual+1ano"),
+    limite: int = Query(10, description="Limite de caronas retornadas pela query"),
+    deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará as caronas de 11 a 20, pulando as caronas de 1 a 10."),
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
+    view: CaronaViewOptions = Query(CaronaViewOptions.full, description="Formato de cada carona na resposta: _full_ (CaronaExtended, com motorista, veículo e passageiros) ou _compact_ (CaronaCompact, só os campos de listagem)."),
+) -> list[CaronaExtended] | list[CaronaCompact]:
+    filters = get_historico_filters(data_minima=data_minima, data_maxima=data_maxima)
+    filters.append(UserCarona.fk_user == current_user.id)
+    
+    keyset_columns = CaronaOrderByOptions.get_keyset_columns_dict()[CaronaOrderByOptions.hora_partida.value]
+    
+    caronas_query = (
+        get_caronas_select(view=view)
+        .join(UserCarona, Carona.id == UserCarona.fk_carona)
+        .filter(*filters)
+    )
+    caronas_query = apply_keyset_pagination(
+        query=caronas_query,
+        colunas=keyset_columns,
+        is_crescente=False,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
+    
+    caronas = await fetch_caronas_async(caronas_query=caronas_query, view=view, db=db)
+    
+    next_cursor = get_next_cursor(resultados=caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return caronas
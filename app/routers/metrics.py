@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.models.router_tags import RouterTags
+from app.utils.metrics_utils import render_metricas_prometheus
+
+
+router = APIRouter(prefix="/metrics", tags=[RouterTags.metricas])
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_metrics() -> str:
+    '''
+    Expõe as métricas internas da aplicação (hits/misses de cache, etc.) no formato texto do Prometheus, para scrape.
+    '''
+    return render_metricas_prometheus()
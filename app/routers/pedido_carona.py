@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Annotated
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query, Body
 
 from app.database.user_carona_orm import UserCarona
 from app.database.user_orm import User
@@ -12,6 +12,7 @@ from app.database.carona_orm import Carona
 from app.database.pedido_carona_orm import PedidoCarona
 
 from app.models.router_tags import RouterTags
+from app.models.token_oop import TokenIdentity
 from app.models.user_carona_oop import UserCaronaBase
 from app.models.pedido_carona_oop import (
     PedidoCaronaBase, PedidoCaronaBasePartidaDestino, PedidoCaronaCreate, 
@@ -19,10 +20,12 @@ from app.models.pedido_carona_oop import (
 )
 
 from app.utils.pedido_carona_utils import PedidoCaronaOrderByOptions
-from app.utils.db_utils import apply_limit_offset, get_db
+from app.utils.endereco_utils import apenas_digitos, normalizar_endereco
+from app.utils.geo_utils import get_filtros_raio
+from app.utils.db_utils import NEXT_CURSOR_HEADER, apply_keyset_pagination, get_db, get_next_cursor
 
 from app.core.user_carona import add_user_carona_to_db
-from app.core.authentication import get_current_active_user
+from app.core.authentication import get_current_active_identity, get_current_active_user, get_read_db
 from app.core.pedido_carona import (
     add_pedido_carona_to_db, 
     get_pedido_carona_by_id, 
@@ -68,21 +71,15 @@ def create_pedido_carona(
     
     try:
         if inserir_automatico:
-            vagas_subquery = (
-                db.query(UserCarona.fk_carona, func.count(UserCarona.fk_user).label("num_passageiros"))
-                .group_by(UserCarona.fk_carona)
-                .subquery()
-            )
             carona_escolhida = (
                 db.query(Carona)
-                .outerjoin(vagas_subquery, Carona.id == vagas_subquery.c.fk_carona)
                 .filter(
                     Carona.hora_partida >= hora_partida_minima,
                     Carona.hora_partida <= hora_partida_maxima,
-                    func.upper(Carona.local_partida).contains(keyword_partida.upper()),
-                    func.upper(Carona.local_destino).contains(keyword_destino.upper()),
+                    Carona.local_partida_busca.contains(normalizar_endereco(keyword_partida), autoescape=True),
+                    Carona.local_destino_busca.contains(normalizar_endereco(keyword_destino), autoescape=True),
                     Carona.valor <= valor_sugerido,
-                    Carona.vagas - func.coalesce(vagas_subquery.c.num_passageiros, 0) >= 1  # filra as caronas que possuem pelo menos 1 vaga disponível
+                    Carona.vagas_preenchidas < Carona.vagas  # filra as caronas que possuem pelo menos 1 vaga disponível (usa o índice parcial ix_carona_com_vagas_hora_partida)
                 )
                 .order_by(asc(Carona.valor))
                 .first()
@@ -117,8 +114,8 @@ def create_pedido_carona(
 @router.get("/{pedido_carona_id}", response_model=PedidoCaronaExtended)
 def read_pedido_carona(
     pedido_carona_id: int,
-    db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)]  # precisa estar logado para usar o endpoint
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)]  # precisa estar logado para usar o endpoint
 ) -> PedidoCaronaExtended:
     pedido_carona = get_pedido_carona_by_id(db, pedido_carona_id)
     if not pedido_carona:
@@ -151,26 +148,43 @@ description_search_pedidos_caronas = (
     - Os endereços armazenados no banco de dados são strings, e não coordenadas geográficas. Eles possuem um formato específico que segue o padrão do Google Maps.\\
     ---- Exemplo: "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240"\\
     - A filtragem por _keyword_partida_ e _keyword_destino_ é feita por meio de uma busca textual, isto é, a query retornará as caronas cujo local de partida ou destino contém a palavra chave passada.\\
-    ---- Exemplo: se _keyword_partida_="Ipanema", a query retornará as caronas cujo local de partida contém a palavra "Ipanema" (ex: "Ipanema, Rio de Janeiro").
+    ---- Exemplo: se _keyword_partida_="Ipanema", a query retornará as caronas cujo local de partida contém a palavra "Ipanema" (ex: "Ipanema, Rio de Janeiro").\\
+    - A busca textual ignora acentos e maiúsculas/minúsculas.\\
+    ---- Exemplo: _keyword_destino_="niteroi" encontra "Niterói".\\
+    - Os endereços são separados em rua, bairro, cidade, UF e CEP na escrita. Os filtros _bairro_partida_, _cidade_destino_, _cep_prefix_partida_, etc. usam essas partes e são bem mais baratos que a busca textual por palavra chave. Pedidos cujo endereço não segue o padrão acima não aparecem nesses filtros.\\
+    - A filtragem por raio (_raio_partida_ e _raio_destino_, em km) usa as coordenadas do centroide do CEP de cada endereço. Pedidos cujo endereço não tem um CEP conhecido não aparecem numa busca por raio.\\
+    - Paginação por cursor: a resposta traz no header _X-Next-Cursor_ o cursor da próxima página (ausente na última página). Passe-o em _cursor_, mantendo os demais params, para buscar a página seguinte sem o custo do _deslocamento_.
     '''
 )
 @router.get("", response_model=list[PedidoCaronaExtended], description=description_search_pedidos_caronas)
 def search_pedidos_carona(
-    db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],
     user_id: int | None = Query(None, description="ID do usuário para filtrar os pedidos feitos por um usuário. Se nada for passado, os pedidos não serão filtrados por usuário"),
     hora_minima: datetime = Query(datetime.now()-timedelta(hours=12), description="Hora mínima de partida para filtrar os pedidos. Se nada for passado, será considerada a hora atual-12h"),
     hora_maxima: datetime = Query(datetime.now()-timedelta(days=365), description="Hora máxima de partida para filtrar os pedidos. Se nada for passado, será considerada a hora atual+1ano"),
     valor_minimo: float = Query(0, description="Valor mínimo de preço do pedido de carona"),
     valor_maximo: float = Query(999999, description="Valor máximo de preço pedido de carona"),
     keyword_partida: str = Query(None, description="Palavra chave para filtrar os endereços de partida."),
-    # raio_partida: ? = x,
+    latitude_partida: float | None = Query(None, description="Latitude do centro da busca por raio de partida."),
+    longitude_partida: float | None = Query(None, description="Longitude do centro da busca por raio de partida."),
+    raio_partida: float | None = Query(None, description="Raio (em km) em torno de (_latitude_partida_, _longitude_partida_) para filtrar os locais de partida."),
+    bairro_partida: str | None = Query(None, description="Bairro exato do local de partida (ignora acentos e maiúsculas/minúsculas)."),
+    cidade_partida: str | None = Query(None, description="Cidade exata do local de partida (ignora acentos e maiúsculas/minúsculas)."),
+    cep_prefix_partida: str | None = Query(None, description="Prefixo do CEP do local de partida (ex: 24210)."),
     keyword_destino: str = Query(None, description="Palavra chave para filtrar os endereços destinos."),
-    # raio_destino: ? = x
+    latitude_destino: float | None = Query(None, description="Latitude do centro da busca por raio de destino."),
+    longitude_destino: float | None = Query(None, description="Longitude do centro da busca por raio de destino."),
+    raio_destino: float | None = Query(None, description="Raio (em km) em torno de (_latitude_destino_, _longitude_destino_) para filtrar os locais de destino."),
+    bairro_destino: str | None = Query(None, description="Bairro exato do local de destino (ignora acentos e maiúsculas/minúsculas)."),
+    cidade_destino: str | None = Query(None, description="Cidade exata do local de destino (ignora acentos e maiúsculas/minúsculas)."),
+    cep_prefix_destino: str | None = Query(None, description="Prefixo do CEP do local de destino (ex: 24210)."),
     order_by: PedidoCaronaOrderByOptions = Query(PedidoCaronaOrderByOptions.hora_minima_partida, description="Como a query deve ser ordenada."),
     is_crescente: bool = Query(True, description="Indica se a ordenação deve ser feita em ordem crescente."),
     limite: int = Query(10, description="Limite de pedidos de carona retornados pela query"),
     deslocamento: int = Query(0, description="Deslocamento (offset) da query. Os params _deslocamento_=1 e _limit_=10, por exemplo, indicam que a query retornará os pedidos de 11 a 20, pulando os pedidos de 1 a 10."),
+    cursor: str | None = Query(None, description="Cursor da próxima página, retornado no header X-Next-Cursor da página anterior. Se passado, _deslocamento_ é ignorado."),
 ) -> list[PedidoCaronaExtended]:
     
     if hora_minima > hora_maxima:
@@ -197,16 +211,67 @@ def search_pedidos_carona(
     if valor_maximo:
         filters.append(PedidoCarona.valor <= valor_maximo)
     if keyword_partida:
-        filters.append(func.upper(PedidoCarona.local_partida).contains(keyword_partida.upper()))
+        filters.append(PedidoCarona.local_partida_busca.contains(normalizar_endereco(keyword_partida), autoescape=True))
     if keyword_destino: 
-        filters.append(func.upper(PedidoCarona.local_destino).contains(keyword_destino.upper()))
+        filters.append(PedidoCarona.local_destino_busca.contains(normalizar_endereco(keyword_destino), autoescape=True))
+    if bairro_partida:
+        filters.append(PedidoCarona.bairro_partida == normalizar_endereco(bairro_partida))
+    if cidade_partida:
+        filters.append(PedidoCarona.cidade_partida == normalizar_endereco(cidade_partida))
+    if cep_prefix_partida:
+        filters.append(PedidoCarona.cep_partida.startswith(apenas_digitos(cep_prefix_partida)))
+    if bairro_destino:
+        filters.append(PedidoCarona.bairro_destino == normalizar_endereco(bairro_destino))
+    if cidade_destino:
+        filters.append(PedidoCarona.cidade_destino == normalizar_endereco(cidade_destino))
+    if cep_prefix_destino:
+        filters.append(PedidoCarona.cep_destino.startswith(apenas_digitos(cep_prefix_destino)))
+    if raio_partida is not None:
+        if latitude_partida is None or longitude_partida is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="raio_partida exige latitude_partida e longitude_partida"
+            )
+        filters.extend(get_filtros_raio(
+            coluna_latitude=PedidoCarona.latitude_partida,
+            coluna_longitude=PedidoCarona.longitude_partida,
+            coluna_geohash=PedidoCarona.geohash_partida,
+            latitude=latitude_partida,
+            longitude=longitude_partida,
+            raio_km=raio_partida
+        ))
+    if raio_destino is not None:
+        if latitude_destino is None or longitude_destino is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="raio_destino exige latitude_destino e longitude_destino"
+            )
+        filters.extend(get_filtros_raio(
+            coluna_latitude=PedidoCarona.latitude_destino,
+            coluna_longitude=PedidoCarona.longitude_destino,
+            coluna_geohash=PedidoCarona.geohash_destino,
+            latitude=latitude_destino,
+            longitude=longitude_destino,
+            raio_km=raio_destino
+        ))
     
-    order_by_dict = PedidoCaronaOrderByOptions.get_order_by_dict()
+    keyset_columns = PedidoCaronaOrderByOptions.get_keyset_columns_dict()[order_by.value]
 
-    pedidos_caronas_query = db.query(PedidoCarona).filter(*filters).order_by(order_by_dict[order_by.value][is_crescente])
-    pedidos_caronas_query = apply_limit_offset(query=pedidos_caronas_query, limit=limite, offset=deslocamento)
+    pedidos_caronas_query = db.query(PedidoCarona).filter(*filters)
+    pedidos_caronas_query = apply_keyset_pagination(
+        query=pedidos_caronas_query,
+        colunas=keyset_columns,
+        is_crescente=is_crescente,
+        limit=limite,
+        cursor=cursor,
+        offset=deslocamento
+    )
     
     pedidos_caronas = pedidos_caronas_query.all()
     
+    next_cursor = get_next_cursor(resultados=pedidos_caronas, colunas=keyset_columns, limit=limite)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
     return pedidos_caronas
 
@@ -6,7 +6,8 @@ from sqlalchemy.orm import Session
 
 from datetime import datetime
 from app.database.user_carona_orm import UserCarona
-from app.models.user_carona_oop import UserCaronaBase, UserCaronaUpdate, UserCaronaExtended
+from app.database.reserva_vaga_orm import ReservaVaga
+from app.models.user_carona_oop import UserCaronaBase, UserCaronaUpdate, UserCaronaExtended, ReservaVagaModel
 from app.utils.db_utils import get_db
 from app.core.user_carona import (
     add_user_carona_to_db, 
@@ -14,6 +15,14 @@ from app.core.user_carona import (
     # update_user_carona_in_db, 
     delete_user_carona_from_db
 )
+from app.core.reserva_vaga import (
+    RESERVA_VAGA_SEGUNDOS,
+    RESERVA_VAGA_SEGUNDOS_MAXIMO,
+    get_reserva_vaga_of_user,
+    hold_vaga_in_db,
+    confirm_reserva_vaga_in_db,
+    release_reserva_vaga_in_db
+)
 from app.core.carona import get_carona_by_id
 from app.core.authentication import get_current_active_user
 from app.models.router_tags import RouterTags
@@ -41,6 +50,32 @@ def add_me_to_carona(
     return user_carona
 
 
+@router.post("/hold", response_model=ReservaVagaModel)
+def hold_vaga_for_me(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    carona: Annotated[Carona, Depends(get_carona_by_id)],
+    db: Annotated[Session, Depends(get_db)],
+    segundos: int = Query(RESERVA_VAGA_SEGUNDOS, gt=0, le=RESERVA_VAGA_SEGUNDOS_MAXIMO)
+) -> ReservaVagaModel:
+    return hold_vaga_in_db(user_id=current_user.id, db_carona=carona, segundos=segundos, db=db)
+
+
+@router.post("/hold/{reserva_id}/confirm", response_model=UserCaronaExtended)
+def confirm_my_hold(
+    reserva: Annotated[ReservaVaga, Depends(get_reserva_vaga_of_user)],
+    db: Annotated[Session, Depends(get_db)]
+) -> UserCaronaExtended:
+    return confirm_reserva_vaga_in_db(db_reserva=reserva, db=db)
+
+
+@router.delete("/hold/{reserva_id}", response_model=str)
+def release_my_hold(
+    reserva: Annotated[ReservaVaga, Depends(get_reserva_vaga_of_user)],
+    db: Annotated[Session, Depends(get_db)]
+) -> str:
+    return release_reserva_vaga_in_db(db_reserva=reserva, db=db)
+
+
 @router.get("/{user_carona_id}", response_model=UserCaronaExtended)
 def read_user_carona(
     user_id: int,
@@ -0,0 +1,54 @@
+'''
+Versões assíncronas das rotas de inscrição em carona. Só são registradas com DATABASE_ASYNC_MODE=true, antes do router
+síncrono de user-carona, de forma que atendem os mesmos paths.
+'''
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Annotated
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.carona_orm import Carona
+from app.database.user_orm import User
+from app.models.user_carona_oop import UserCaronaBase, UserCaronaExtended
+from app.utils.db_utils import get_async_db
+from app.core.user_carona import (
+    add_user_carona_to_db_async,
+    get_user_carona_by_user_and_carona_async,
+    delete_user_carona_from_db_async
+)
+from app.core.carona import get_carona_by_id_async
+from app.core.authentication import get_current_active_user_async
+from app.models.router_tags import RouterTags
+
+
+router = APIRouter(prefix="/user-carona", tags=[RouterTags.user_carona])
+
+
+@router.post("", response_model=UserCaronaExtended)
+async def add_me_to_carona_async(
+    current_user: Annotated[User, Depends(get_current_active_user_async)],
+    carona: Annotated[Carona, Depends(get_carona_by_id_async)],
+    carona_id: int,
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> UserCaronaExtended:
+
+    user_carona = await add_user_carona_to_db_async(
+        user_carona_to_add=UserCaronaBase(
+            fk_user=current_user.id,
+            fk_carona=carona_id,
+        ),
+        db_carona=carona,
+        db=db
+    )
+    return user_carona
+
+
+@router.delete("/{user_carona_id}", response_model=str)
+async def remove_me_from_carona_async(
+    carona: Annotated[Carona, Depends(get_carona_by_id_async)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    current_user: Annotated[User, Depends(get_current_active_user_async)]
+) -> str:
+    db_user_carona = await get_user_carona_by_user_and_carona_async(db=db, user_id=current_user.id, carona_id=carona.id)
+    if not db_user_carona:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não foi encontrado inscrito na carona.")
+    return await delete_user_carona_from_db_async(db=db, db_user_carona=db_user_carona)
@@ -11,11 +11,12 @@ from app.utils.veiculo_utils import TipoVeiculo, MarcaVeiculo, Cor
 from app.database.user_orm import Motorista, User
 
 from app.models.router_tags import RouterTags
+from app.models.token_oop import TokenIdentity
 from app.models.veiculo_oop import MotoristaVeiculoBase, MotoristaVeiculoExtended, MotoristaVeiculoModel, MotoristaVeiculoUpdate, VeiculoBase, VeiculoModel
 
 from app.utils.db_utils import get_db
 from app.core.veiculo import add_motorista_veiculo_to_db, add_veiculo_to_db, get_all_motorista_veiculo_of_user, get_motorista_veiculo_of_user_by_placa, get_veiculo_by_info, get_motorista_veiculo_of_user, update_motorista_veiculo_in_db
-from app.core.authentication import get_current_active_user
+from app.core.authentication import UserContext, get_current_active_identity, get_current_active_user, get_current_user_context
 
 
 router = APIRouter(prefix="/veiculo", tags=[RouterTags.motorista_e_veiculos])
@@ -23,7 +24,7 @@ router = APIRouter(prefix="/veiculo", tags=[RouterTags.motorista_e_veiculos])
 
 @router.get("/tipos", response_model=list[str])
 def get_all_veiculo_tipos(
-    current_user: Annotated[User, Depends(get_current_active_user)], 
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)], 
 )->list[str]:
     '''
     - Retorna lista com todos os tipos de veículos esperados e tratados na API.
@@ -33,7 +34,7 @@ def get_all_veiculo_tipos(
 
 @router.get("/marcas", response_model=list[str])
 def get_all_veiculo_marcas(
-   current_user: Annotated[User, Depends(get_current_active_user)],  
+   current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)],  
 ) -> list[str]:
     '''
     - Retorna lista com todas as marcas de veículos esperadas e tratadas na API.
@@ -43,7 +44,7 @@ def get_all_veiculo_marcas(
 
 @router.get("/cores", response_model=list[str])
 def get_all_veiculo_cores(
-    current_user: Annotated[User, Depends(get_current_active_user)], 
+    current_user: Annotated[TokenIdentity, Depends(get_current_active_identity)], 
 ) -> list[str]:
     '''
     - Retorna lista com todas as cores de veículos esperadas e tratadas na API.
@@ -102,6 +103,7 @@ def add_veiculo_to_me(
     placa: str,
     current_motorista: Annotated[Motorista, Depends(get_current_active_motorista)],
     curent_user: Annotated[User, Depends(get_current_active_user)],
+    context: Annotated[UserContext, Depends(get_current_user_context)],
     db: Annotated[Session, Depends(get_db)]
 ) -> MotoristaVeiculoExtended:
     veiculo = VeiculoBase(
@@ -121,7 +123,7 @@ def add_veiculo_to_me(
     if not db_veiculo:
         db_veiculo = add_veiculo_to_db(veiculo_to_create=veiculo, db=db)
     
-    db_motorista_veiculo = get_motorista_veiculo_of_user(veiculo_id=db_veiculo.id, motorista=current_motorista, db=db)
+    db_motorista_veiculo = get_motorista_veiculo_of_user(veiculo_id=db_veiculo.id, motorista=current_motorista, context=context)
     if db_motorista_veiculo:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
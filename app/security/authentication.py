@@ -1,24 +1,28 @@
 import logging
 
 from typing import Annotated
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from sqlalchemy.orm import Session
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from app.database.user_orm import User
 
 from app.models.general_oop import BasicResponse
-from app.models.token_oop import TokenModel
+from app.models.token_oop import RefreshTokenRequest, TokenModel
 from app.models.router_tags import RouterTags
 from app.models.user_oop import UserCreate, UserModel
 
 from app.utils.db_utils import get_db
+from app.core.refresh_token import issue_refresh_token, revoke_refresh_token, rotate_refresh_token
+from app.core.revoked_token import revoke_access_token
 from app.core.authentication import (
-    ACCESS_TOKEN_EXPIRE_DAYS, change_current_user_info, get_active_user, get_current_active_user, authenticate_user, 
-    create_access_token, get_user_by_email, add_user_to_db
+    ACCESS_TOKEN_EXPIRE_DAYS, change_current_user_info, get_active_user, get_current_active_user, authenticate_user_without_blocking, 
+    create_access_token, get_access_token_claims, get_user_by_email, add_user_to_db, check_password_rate_limit, get_client_ip,
+    get_current_user, get_token_data
 )
 
 
@@ -29,11 +33,15 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 @router.post("/token", response_model=TokenModel)
 async def login_for_access_token(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Annotated[Session, Depends(get_db)],
 ) -> TokenModel:
     
-    user: User = authenticate_user(
+    # no threadpool porque o limitador pode estar num Redis
+    await run_in_threadpool(check_password_rate_limit, ip=get_client_ip(request), username=form_data.username)
+    
+    user: User = await authenticate_user_without_blocking(
         username=form_data.username,
         password=form_data.password,
         db=db,
@@ -46,17 +54,62 @@ async def login_for_access_token(
         )
     access_token_expires = timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=get_access_token_claims(user), expires_delta=access_token_expires
+    )
+    refresh_token = await run_in_threadpool(issue_refresh_token, user_id=user.id, db=db)
+    return TokenModel(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+@router.post("/token/refresh", response_model=TokenModel)
+def refresh_access_token(
+    refresh_request: RefreshTokenRequest,
+    db: Annotated[Session, Depends(get_db)],
+) -> TokenModel:
+    '''
+    Troca o refresh token (obtido em /token) por um novo access token sem verificar a senha. O refresh token é de uso
+    único: a resposta traz o próximo, e reapresentar um já usado revoga todos os tokens daquele login.
+    '''
+    user, refresh_token = rotate_refresh_token(refresh_token=refresh_request.refresh_token, db=db)
+    access_token = create_access_token(
+        data=get_access_token_claims(user), expires_delta=timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
     )
-    return TokenModel(access_token=access_token, token_type="bearer")
+    return TokenModel(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+@router.post("/logout", response_model=BasicResponse)
+def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+    refresh_request: RefreshTokenRequest | None = None,
+) -> BasicResponse:
+    '''
+    Revoga o access token usado na requisição e, se for enviado no body, o refresh token (junto com todos os tokens
+    obtidos por rotação a partir do mesmo login).
+    '''
+    token_data = get_token_data(token)
+    if token_data.jti is not None:
+        revoke_access_token(
+            jti=token_data.jti,
+            user_id=current_user.id,
+            expires_at=datetime.fromtimestamp(token_data.exp),
+            db=db
+        )
+    if refresh_request is not None:
+        revoke_refresh_token(refresh_token=refresh_request.refresh_token, user_id=current_user.id, db=db)
+    
+    return BasicResponse(response="Logged out.")
 
 
 @router.post("/users/create", response_model=UserModel)
 def create_user(
+    request: Request,
     db: Annotated[Session, Depends(get_db)],
     user_to_create: UserCreate,
 ) -> UserModel:
     
+    check_password_rate_limit(ip=get_client_ip(request), username=user_to_create.email)
+    
     db_user = get_user_by_email(db=db, email=user_to_create.email)
     
     if db_user:
@@ -0,0 +1,31 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    '''
+    Filtro de Bloom para testes de pertinência sem falsos negativos: "não contém" é garantido, "contém" é provável
+    (falsos positivos a uma taxa de ~taxa_falsos_positivos enquanto o número de itens não passar de _capacidade_).
+    '''
+    
+    def __init__(self, capacidade: int, taxa_falsos_positivos: float = 0.01):
+        capacidade = max(capacidade, 1)
+        self.num_bits = max(64, math.ceil(-capacidade * math.log(taxa_falsos_positivos) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacidade * math.log(2)))
+        self.tamanho = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+    
+    def _get_posicoes(self, item: str):
+        # double hashing (Kirsch-Mitzenmacher): num_hashes posições a partir de dois hashes de 64 bits
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+    
+    def add(self, item: str) -> None:
+        for posicao in self._get_posicoes(item):
+            self._bits[posicao >> 3] |= 1 << (posicao & 7)
+        self.tamanho += 1
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._get_posicoes(item))
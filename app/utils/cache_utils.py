@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Any, Hashable
+
+from app.utils.metrics_utils import registrar_metrica
+
+
+class TTLCache:
+    '''
+    Cache em memória com expiração por tempo (TTL) e tamanho máximo, com descarte LRU.
+    Seguro para uso entre as threads do threadpool do FastAPI. Conta hits e misses para exposição em /metrics.
+    '''
+    
+    def __init__(self, nome: str, ttl_segundos: float, tamanho_maximo: int):
+        self.nome = nome
+        self.ttl_segundos = ttl_segundos
+        self.tamanho_maximo = tamanho_maximo
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+        # Incrementada a cada invalidação. Quem calcula um valor guarda a geração lida antes da query e só o salva
+        # se ela não mudou, evitando que um resultado calculado antes de uma escrita seja salvo depois da invalidação
+        self.geracao = 0
+        self._entradas: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        
+        registrar_metrica(f"{nome}_cache_hits_total", f"Hits no cache {nome}.", "counter", lambda: self.hits)
+        registrar_metrica(f"{nome}_cache_misses_total", f"Misses no cache {nome}.", "counter", lambda: self.misses)
+        registrar_metrica(f"{nome}_cache_invalidacoes_total", f"Invalidações do cache {nome}.", "counter", lambda: self.invalidacoes)
+        registrar_metrica(f"{nome}_cache_entradas", f"Entradas atualmente no cache {nome}.", "gauge", lambda: len(self._entradas))
+    
+    def get(self, chave: Hashable) -> Any | None:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._entradas[chave]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return entrada[1]
+    
+    def set(self, chave: Hashable, valor: Any, geracao: int | None = None) -> None:
+        if self.tamanho_maximo <= 0 or self.ttl_segundos <= 0:
+            return
+        with self._lock:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self._entradas[chave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+    
+    def delete(self, chave: Hashable) -> None:
+        with self._lock:
+            self._entradas.pop(chave, None)
+            self.geracao += 1
+            self.invalidacoes += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self.geracao += 1
+            self.invalidacoes += 1
+
+
+class RedisCache:
+    '''
+    Mesma interface do TTLCache, mas guardada num Redis compartilhado entre os workers/instâncias da API. Os valores
+    são serializados em JSON (datetimes viram strings ISO 8601). Não há controle de geração: set(..., geracao) sempre
+    grava. Exige o pacote opcional redis (pip install redis).
+    '''
+    
+    def __init__(self, nome: str, url: str, ttl_segundos: float):
+        try:
+            import redis
+        except ImportError as ie:
+            raise RuntimeError(f"O cache {nome} está configurado para o Redis ({url}), mas o pacote redis não está instalado.") from ie
+        
+        self.nome = nome
+        self.ttl_segundos = ttl_segundos
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+        self.geracao = 0
+        self._redis = redis.Redis.from_url(url)
+        
+        registrar_metrica(f"{nome}_cache_hits_total", f"Hits no cache {nome}.", "counter", lambda: self.hits)
+        registrar_metrica(f"{nome}_cache_misses_total", f"Misses no cache {nome}.", "counter", lambda: self.misses)
+        registrar_metrica(f"{nome}_cache_invalidacoes_total", f"Invalidações do cache {nome}.", "counter", lambda: self.invalidacoes)
+    
+    def _get_chave_redis(self, chave: Hashable) -> str:
+        return f"{self.nome}:{chave}"
+    
+    def get(self, chave: Hashable) -> Any | None:
+        valor = self._redis.get(self._get_chave_redis(chave))
+        if valor is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(valor)
+    
+    def set(self, chave: Hashable, valor: Any, geracao: int | None = None) -> None:
+        if self.ttl_segundos <= 0:
+            return
+        valor_json = json.dumps(valor, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+        self._redis.set(self._get_chave_redis(chave), valor_json, px=int(self.ttl_segundos * 1000))
+    
+    def delete(self, chave: Hashable) -> None:
+        self._redis.delete(self._get_chave_redis(chave))
+        self.invalidacoes += 1
+    
+    def clear(self) -> None:
+        for chave_redis in self._redis.scan_iter(match=f"{self.nome}:*"):
+            self._redis.delete(chave_redis)
+        self.invalidacoes += 1
+
+
+def criar_cache(nome: str, ttl_segundos: float, tamanho_maximo: int, backend_url: str | None = None) -> TTLCache | RedisCache:
+    '''Cria o cache em memória do processo ou, se backend_url for passada (ex: redis://localhost:6379/0), no Redis.'''
+    if backend_url:
+        return RedisCache(nome=nome, url=backend_url, ttl_segundos=ttl_segundos)
+    return TTLCache(nome=nome, ttl_segundos=ttl_segundos, tamanho_maximo=tamanho_maximo)
+
+
+def truncar_para_minuto(hora: datetime) -> datetime:
+    '''Trunca um datetime para o minuto, agrupando em uma mesma chave de cache buscas feitas dentro do mesmo minuto.'''
+    return hora.replace(second=0, microsecond=0)
+
+
+# Cache dos resultados de GET /carona. Qualquer escrita em carona ou em inscrições de carona o invalida por inteiro,
+# então o TTL só limita por quanto tempo mudanças feitas por fora da aplicação (ex: scripts no banco) ficam invisíveis.
+# TTL <= 0 ou tamanho <= 0 desligam o cache.
+carona_search_cache = TTLCache(
+    nome="carona_search",
+    ttl_segundos=float(os.environ.get("CARONA_SEARCH_CACHE_TTL", 30)),
+    tamanho_maximo=int(os.environ.get("CARONA_SEARCH_CACHE_TAMANHO", 1024))
+)
+
+
+# Cache dos usuários resolvidos a partir do token (get_current_user_context), chaveado pelo subject do JWT (e-mail).
+# Guarda só as colunas de User, Motorista e dos veículos ativos, então pode ficar num backend compartilhado
+# (USER_CACHE_BACKEND_URL) quando a API roda com vários workers; em memória, a invalidação só alcança o worker que fez a
+# escrita e os demais esperam o TTL.
+user_cache = criar_cache(
+    nome="user",
+    ttl_segundos=float(os.environ.get("USER_CACHE_TTL", 60)),
+    tamanho_maximo=int(os.environ.get("USER_CACHE_TAMANHO", 10_000)),
+    backend_url=os.environ.get("USER_CACHE_BACKEND_URL")
+)
@@ -1,6 +1,16 @@
 import enum
-from sqlalchemy import asc, desc
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, asc, desc, select
+from sqlalchemy.orm import joinedload, selectinload
 from app.database.carona_orm import Carona
+from app.database.user_carona_orm import UserCarona
+from app.database.user_orm import Motorista, User
+from app.database.veiculo_orm import MotoristaVeiculo, Veiculo
+from app.models.carona_oop import CaronaExtended
+from app.utils.cache_utils import truncar_para_minuto
+from app.utils.endereco_utils import apenas_digitos, normalizar_endereco
+from app.utils.geo_utils import get_filtros_raio
 
 
 class CaronaOrderByOptions(str, enum.Enum):
@@ -24,4 +34,229 @@ class CaronaOrderByOptions(str, enum.Enum):
                 False: desc(Carona.created_at)
             }
         }
-        
\ No newline at end of file
+    
+    @classmethod
+    def get_keyset_columns_dict(self) -> dict:
+        # Colunas usadas na paginação por cursor. O id desempata caronas com o mesmo valor na coluna de ordenação
+        return {
+            self.hora_partida.value: [Carona.hora_partida, Carona.id],
+            self.valor.value: [Carona.valor, Carona.id],
+            self.hora_oferta.value: [Carona.created_at, Carona.id]
+        }
+
+
+class CaronaViewOptions(str, enum.Enum):
+    full = "full"
+    compact = "compact"
+
+
+class CaronaSearchFilters:
+    '''
+    Filtros da busca de caronas, usados como dependência (Depends()) por GET /carona e GET /carona/facets, de forma que os
+    dois endpoints aceitem exatamente os mesmos query params. Os valores são validados e normalizados na construção.
+    '''
+    
+    def __init__(
+        self,
+        motorista_id: int | None = Query(None, description="ID do motorista para filtrar as caronas de um motorista. Se nada for passado, as caronas não serão filtradas por motorista"),
+        hora_minima: datetime = Query(datetime.now(), description="Hora mínima de partida da carona. Se nada for passado, será considerada a hora atual"),
+        hora_maxima: datetime = Query(datetime.now()+timedelta(days=365), description="Hora máxima de partida da carona. Se nada for passado, será considerada a hora atual+1ano"),
+        valor_minimo: float = Query(0, description="Valor mínimo de preço da carona"),
+        valor_maximo: float = Query(999999, description="Valor máximo de preço da carona"),
+        vagas_restantes_minimas: int = Query(1, description="Número de vagas restantes disponíveis na carona. Se nada for passado, será considerado 1 vaga no mínimo"),
+        keyword_partida: str = Query(None, description="Palavra chave para filtrar os endereços de partida."),
+        latitude_partida: float | None = Query(None, description="Latitude do centro da busca por raio de partida."),
+        longitude_partida: float | None = Query(None, description="Longitude do centro da busca por raio de partida."),
+        raio_partida: float | None = Query(None, description="Raio (em km) em torno de (_latitude_partida_, _longitude_partida_) para filtrar os locais de partida."),
+        bairro_partida: str | None = Query(None, description="Bairro exato do local de partida (ignora acentos e maiúsculas/minúsculas)."),
+        cidade_partida: str | None = Query(None, description="Cidade exata do local de partida (ignora acentos e maiúsculas/minúsculas)."),
+        cep_prefix_partida: str | None = Query(None, description="Prefixo do CEP do local de partida (ex: 24210)."),
+        keyword_destino: str = Query(None, description="Palavra chave para filtrar os endereços destinos."),
+        latitude_destino: float | None = Query(None, description="Latitude do centro da busca por raio de destino."),
+        longitude_destino: float | None = Query(None, description="Longitude do centro da busca por raio de destino."),
+        raio_destino: float | None = Query(None, description="Raio (em km) em torno de (_latitude_destino_, _longitude_destino_) para filtrar os locais de destino."),
+        bairro_destino: str | None = Query(None, description="Bairro exato do local de destino (ignora acentos e maiúsculas/minúsculas)."),
+        cidade_destino: str | None = Query(None, description="Cidade exata do local de destino (ignora acentos e maiúsculas/minúsculas)."),
+        cep_prefix_destino: str | None = Query(None, description="Prefixo do CEP do local de destino (ex: 24210)."),
+    ):
+        if hora_minima > hora_maxima:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="hora_minima não pode ser maior que hora_maxima"
+            )
+        if valor_minimo > valor_maximo:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="valor_minimo não pode ser maior que hvalor_maximo"
+            )
+        if raio_partida is not None and (latitude_partida is None or longitude_partida is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="raio_partida exige latitude_partida e longitude_partida"
+            )
+        if raio_destino is not None and (latitude_destino is None or longitude_destino is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="raio_destino exige latitude_destino e longitude_destino"
+            )
+        
+        self.motorista_id = motorista_id
+        # truncadas para o minuto para que buscas repetidas no mesmo minuto caiam na mesma entrada do cache
+        self.hora_minima = truncar_para_minuto(hora_minima)
+        self.hora_maxima = truncar_para_minuto(hora_maxima)
+        self.valor_minimo = valor_minimo
+        self.valor_maximo = valor_maximo
+        self.vagas_restantes_minimas = vagas_restantes_minimas
+        self.keyword_partida = normalizar_endereco(keyword_partida)
+        self.latitude_partida = latitude_partida
+        self.longitude_partida = longitude_partida
+        self.raio_partida = raio_partida
+        self.bairro_partida = normalizar_endereco(bairro_partida)
+        self.cidade_partida = normalizar_endereco(cidade_partida)
+        self.cep_prefix_partida = apenas_digitos(cep_prefix_partida)
+        self.keyword_destino = normalizar_endereco(keyword_destino)
+        self.latitude_destino = latitude_destino
+        self.longitude_destino = longitude_destino
+        self.raio_destino = raio_destino
+        self.bairro_destino = normalizar_endereco(bairro_destino)
+        self.cidade_destino = normalizar_endereco(cidade_destino)
+        self.cep_prefix_destino = apenas_digitos(cep_prefix_destino)
+    
+    def get_cache_key(self) -> tuple:
+        return tuple(vars(self).items())
+    
+    def get_filters(self) -> list:
+        filters = []
+        
+        if self.motorista_id is not None:
+            filters.append(Carona.fk_motorista == self.motorista_id)
+        if self.hora_minima:
+            filters.append(Carona.hora_partida >= self.hora_minima)
+        if self.hora_maxima:
+            filters.append(Carona.hora_partida <= self.hora_maxima)
+        if self.valor_minimo is not None:
+            filters.append(Carona.valor >= self.valor_minimo)
+        if self.valor_maximo is not None:
+            filters.append(Carona.valor <= self.valor_maximo)
+        if self.vagas_restantes_minimas is not None:
+            # filra as caronas que possuem pelo menos vagas_restantes_minimas vagas disponíveis (usa o índice ix_carona_vagas_restantes)
+            filters.append(Carona.vagas - Carona.vagas_preenchidas >= self.vagas_restantes_minimas)
+            if self.vagas_restantes_minimas >= 1:
+                # redundante com o filtro acima, mas permite ao planner usar o índice parcial ix_carona_com_vagas_hora_partida
+                filters.append(Carona.vagas_preenchidas < Carona.vagas)
+        if self.keyword_partida:
+            filters.append(Carona.local_partida_busca.contains(self.keyword_partida, autoescape=True))
+        if self.keyword_destino:
+            filters.append(Carona.local_destino_busca.contains(self.keyword_destino, autoescape=True))
+        if self.bairro_partida:
+            filters.append(Carona.bairro_partida == self.bairro_partida)
+        if self.cidade_partida:
+            filters.append(Carona.cidade_partida == self.cidade_partida)
+        if self.cep_prefix_partida:
+            filters.append(Carona.cep_partida.startswith(self.cep_prefix_partida))
+        if self.bairro_destino:
+            filters.append(Carona.bairro_destino == self.bairro_destino)
+        if self.cidade_destino:
+            filters.append(Carona.cidade_destino == self.cidade_destino)
+        if self.cep_prefix_destino:
+            filters.append(Carona.cep_destino.startswith(self.cep_prefix_destino))
+        if self.raio_partida is not None:
+            filters.extend(get_filtros_raio(
+                coluna_latitude=Carona.latitude_partida,
+                coluna_longitude=Carona.longitude_partida,
+                coluna_geohash=Carona.geohash_partida,
+                latitude=self.latitude_partida,
+                longitude=self.longitude_partida,
+                raio_km=self.raio_partida
+            ))
+        if self.raio_destino is not None:
+            filters.extend(get_filtros_raio(
+                coluna_latitude=Carona.latitude_destino,
+                coluna_longitude=Carona.longitude_destino,
+                coluna_geohash=Carona.geohash_destino,
+                latitude=self.latitude_destino,
+                longitude=self.longitude_destino,
+                raio_km=self.raio_destino
+            ))
+        
+        return filters
+
+
+class ExportFormatOptions(str, enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    
+    @classmethod
+    def get_media_type_dict(self) -> dict:
+        return {
+            self.ndjson.value: "application/x-ndjson",
+            self.csv.value: "text/csv"
+        }
+
+
+# Colunas do export em CSV. Os relacionamentos são achatados; os passageiros viram uma lista de nomes separada por "; "
+CARONA_CSV_HEADER = [
+    "id", "hora_partida", "valor", "vagas", "vagas_preenchidas", "vagas_restantes", "local_partida", "local_destino",
+    "motorista_id", "motorista_nome", "veiculo", "placa", "passageiros", "created_at"
+]
+
+
+def get_carona_csv_row(carona: CaronaExtended) -> list:
+    veiculo = carona.veiculo_do_motorista.veiculo
+    return [
+        carona.id,
+        carona.hora_partida.isoformat(),
+        carona.valor,
+        carona.vagas,
+        carona.vagas_preenchidas,
+        carona.vagas_restantes,
+        carona.local_partida,
+        carona.local_destino,
+        carona.motorista.id_fk_user,
+        f"{carona.motorista.user.first_name} {carona.motorista.user.last_name}",
+        f"{veiculo.marca} {veiculo.modelo} {veiculo.cor or ''}".strip(),
+        carona.veiculo_do_motorista.placa,
+        "; ".join(f"{passageiro.user.first_name} {passageiro.user.last_name}" for passageiro in carona.passageiros),
+        carona.created_at.isoformat(),
+    ]
+
+
+def get_carona_extended_load_options() -> list:
+    '''
+    Opções de carregamento para queries cujo resultado é serializado como CaronaExtended.
+    Carrega motorista (com usuário), veículo do motorista (com veículo) e passageiros (com usuário) em lote,
+    de forma que uma página de caronas custe um número fixo de queries, independente do seu tamanho.
+    '''
+    return [
+        selectinload(Carona.motorista).joinedload(Motorista.user),
+        selectinload(Carona.veiculo_do_motorista).joinedload(MotoristaVeiculo.veiculo),
+        selectinload(Carona.passageiros).joinedload(UserCarona.user),
+    ]
+
+
+def get_carona_compact_select() -> Select:
+    '''
+    Projeção (SQLAlchemy Core) com só as colunas de CaronaCompact: uma única query com os joins de motorista e veículo,
+    sem instanciar objetos da ORM nem carregar passageiros.
+    '''
+    return (
+        select(
+            Carona.id,
+            Carona.hora_partida,
+            Carona.valor,
+            Carona.vagas,
+            Carona.vagas_preenchidas,
+            Carona.local_partida,
+            Carona.local_destino,
+            Carona.bairro_partida,
+            Carona.bairro_destino,
+            Carona.created_at,
+            Carona.fk_motorista,
+            User.first_name.label("motorista_first_name"),
+            Veiculo.modelo.label("veiculo_modelo"),
+            Veiculo.cor.label("veiculo_cor"),
+        )
+        .join(User, User.id == Carona.fk_motorista)
+        .join(MotoristaVeiculo, MotoristaVeiculo.id == Carona.fk_motorista_veiculo)
+        .join(Veiculo, Veiculo.id == MotoristaVeiculo.fk_veiculo)
+    )
@@ -1,5 +1,54 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import InstrumentedAttribute, ORMExecuteState, Session
 from sqlalchemy.orm.query import Query
-from database import SessionLocal
+import database
+from database import READ_YOUR_WRITES_JANELA_SEGUNDOS, SessionLocal
+from app.utils.cache_utils import TTLCache
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Chaves em Session.info: o usuário autenticado da requisição (preenchido por get_current_user) e se a transação
+# atual escreveu no banco
+USUARIO_ID_INFO_KEY = "usuario_id"
+ESCREVEU_INFO_KEY = "escreveu"
+
+# Usuários que escreveram no primário há menos de READ_YOUR_WRITES_JANELA_SEGUNDOS. O registro é em memória, por
+# worker do uvicorn: com vários workers sem afinidade de sessão, a leitura seguinte pode cair em outro worker
+escritas_recentes = TTLCache(
+    nome="escritas_recentes",
+    ttl_segundos=READ_YOUR_WRITES_JANELA_SEGUNDOS,
+    tamanho_maximo=100_000
+)
+
+
+@event.listens_for(Session, "after_flush")
+def marcar_escrita_no_flush(session: Session, flush_context) -> None:
+    session.info[ESCREVEU_INFO_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def marcar_escrita_em_lote(orm_execute_state: ORMExecuteState) -> None:
+    # UPDATE/DELETE/INSERT executados direto (ex: db.execute(update(...))) não passam pelo flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[ESCREVEU_INFO_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def registrar_escrita_do_usuario(session: Session) -> None:
+    usuario_id = session.info.get(USUARIO_ID_INFO_KEY)
+    if session.info.pop(ESCREVEU_INFO_KEY, False) and usuario_id is not None:
+        escritas_recentes.set(usuario_id, True)
+
+
+@event.listens_for(Session, "after_rollback")
+def descartar_escrita(session: Session) -> None:
+    session.info.pop(ESCREVEU_INFO_KEY, None)
 
 
 def get_db():
@@ -8,6 +57,35 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def open_read_session(usuario_id: int | None) -> Session | None:
+    '''
+    Abre uma sessão na réplica de leitura, ou retorna None quando a leitura deve ir para o primário: réplica não
+    configurada ou usuário que escreveu recentemente (read-your-writes).
+    '''
+    if database.ReadSessionLocal is None:
+        return None
+    if has_recent_writes(usuario_id=usuario_id):
+        return None
+    return database.ReadSessionLocal()
+
+
+def has_recent_writes(usuario_id: int | None) -> bool:
+    '''Se o usuário escreveu no primário há menos de READ_YOUR_WRITES_JANELA_SEGUNDOS (neste worker).'''
+    return usuario_id is not None and escritas_recentes.get(usuario_id) is not None
+
+
+def is_primary_session(db: Session) -> bool:
+    '''Se a sessão lê do primário, e não da réplica aberta por open_read_session.'''
+    return db.get_bind() is database.engine
+
+
+async def get_async_db():
+    if database.AsyncSessionLocal is None:
+        raise RuntimeError("Sessões assíncronas exigem DATABASE_ASYNC_MODE=true.")
+    async with database.AsyncSessionLocal() as db:
+        yield db
         
         
 def apply_limit_offset(
@@ -20,3 +98,86 @@ def apply_limit_offset(
     if offset:
         query = query.offset(offset*limit)
     return query
+
+
+def encode_cursor(colunas: list[InstrumentedAttribute], valores: list) -> str:
+    payload = {
+        "k": [coluna.key for coluna in colunas],
+        "v": [{"dt": valor.isoformat()} if isinstance(valor, datetime) else valor for valor in valores]
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+cursor_invalido_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+
+
+def decode_cursor_value(valor, coluna: InstrumentedAttribute):
+    '''Valor do cursor convertido para o tipo da coluna. ValueError se o cursor foi adulterado.'''
+    tipo = coluna.type.python_type
+    if tipo is datetime:
+        if not isinstance(valor, dict) or not isinstance(valor.get("dt"), str):
+            raise ValueError(valor)
+        data = datetime.fromisoformat(valor["dt"])
+        if data.tzinfo is not None:  # as colunas são sem fuso, e encode_cursor nunca grava fuso
+            raise ValueError(valor)
+        return data
+    if isinstance(valor, bool) or not isinstance(valor, (int, float) if tipo is float else tipo):
+        raise ValueError(valor)
+    return tipo(valor)
+
+
+def decode_cursor(cursor: str, colunas: list[InstrumentedAttribute]) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        chaves, valores = payload["k"], payload["v"]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise cursor_invalido_exception
+    
+    if chaves != [coluna.key for coluna in colunas]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor não corresponde à ordenação pedida. Use o mesmo _order_by_ da página anterior."
+        )
+    # um valor por coluna e do tipo dela: um cursor adulterado não pode chegar à comparação de tuplas no banco
+    if not isinstance(valores, list) or len(valores) != len(colunas):
+        raise cursor_invalido_exception
+    try:
+        return [decode_cursor_value(valor=valor, coluna=coluna) for valor, coluna in zip(valores, colunas)]
+    except ValueError:
+        raise cursor_invalido_exception
+
+
+def apply_keyset_pagination(
+    query: Query,
+    colunas: list[InstrumentedAttribute],
+    is_crescente: bool,
+    limit: int | None = None,
+    cursor: str | None = None,
+    offset: int | None = None
+) -> Query:
+    '''
+    Ordena a query por _colunas_ (a última deve ser única, ex: id, para desempate) e pagina a partir do _cursor_,
+    que guarda os valores dessas colunas na última linha da página anterior. Diferente do OFFSET, o custo de buscar
+    a página N é o mesmo de buscar a primeira. Sem cursor, cai no limit/offset tradicional.
+    '''
+    if cursor:
+        valores = decode_cursor(cursor=cursor, colunas=colunas)
+        if is_crescente:
+            query = query.filter(tuple_(*colunas) > tuple_(*valores))
+        else:
+            query = query.filter(tuple_(*colunas) < tuple_(*valores))
+        offset = None
+    
+    query = query.order_by(*[coluna.asc() if is_crescente else coluna.desc() for coluna in colunas])
+    return apply_limit_offset(query=query, limit=limit, offset=offset)
+
+
+def get_next_cursor(
+    resultados: list,
+    colunas: list[InstrumentedAttribute],
+    limit: int | None = None
+) -> str | None:
+    if not limit or len(resultados) < limit:
+        return None
+    ultimo = resultados[-1]
+    return encode_cursor(colunas=colunas, valores=[getattr(ultimo, coluna.key) for coluna in colunas])
@@ -0,0 +1,114 @@
+import re
+import unicodedata
+
+from app.models.endereco_oop import EnderecoEstruturado
+from app.utils.geo_utils import encode_geohash, geocodificar_cep
+
+
+CEP_REGEX = re.compile(r"\b(\d{5})-?(\d{3})\b")
+UFS = {
+    "AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+    "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"
+}
+UF_NO_FINAL_REGEX = re.compile(r"^(.*?)\s*[-,]\s*([A-Za-z]{2})$")
+PAIS_NO_FINAL_REGEX = re.compile(r",\s*(Brasil|Brazil)\s*$", re.IGNORECASE)
+
+
+def normalizar_endereco(endereco: str | None) -> str | None:
+    '''
+    Remove acentos, converte para maiúsculas e colapsa espaços de um endereço ou palavra chave.
+    Ex: "São Domingos,  Niterói" -> "SAO DOMINGOS, NITEROI"
+    '''
+    if endereco is None:
+        return None
+    sem_acentos = "".join(
+        caractere for caractere in unicodedata.normalize("NFKD", endereco)
+        if not unicodedata.combining(caractere)
+    )
+    return " ".join(sem_acentos.upper().split())
+
+
+def apenas_digitos(texto: str | None) -> str | None:
+    if texto is None:
+        return None
+    return re.sub(r"\D", "", texto)
+
+
+def extrair_cep(endereco: str | None) -> str | None:
+    '''
+    Retorna o último CEP do endereço, somente com dígitos.
+    Ex: "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240" -> "24210240"
+    '''
+    if endereco is None:
+        return None
+    ceps = CEP_REGEX.findall(endereco)
+    if not ceps:
+        return None
+    return "".join(ceps[-1])
+
+
+def parse_endereco(endereco: str | None) -> EnderecoEstruturado:
+    '''
+    Separa um endereço no padrão do Google Maps em rua, bairro, cidade, UF e CEP. Partes que não puderem ser
+    identificadas ficam como None.
+    Ex: "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240" ->
+        rua="R. Passo da Pátria, 152-470", bairro="São Domingos", cidade="Niterói", uf="RJ", cep="24210240"
+    '''
+    if not endereco:
+        return EnderecoEstruturado()
+    
+    cep = extrair_cep(endereco)
+    resto = PAIS_NO_FINAL_REGEX.sub("", endereco.strip())
+    resto = CEP_REGEX.sub("", resto).strip().rstrip(",-").strip()
+    
+    match_uf = UF_NO_FINAL_REGEX.match(resto)
+    if not match_uf or match_uf.group(2).upper() not in UFS:
+        # Sem UF não dá pra saber onde termina a cidade
+        return EnderecoEstruturado(cep=cep)
+    resto, uf = match_uf.group(1).strip(), match_uf.group(2).upper()
+    
+    # "R. Passo da Pátria, 152-470 - São Domingos, Niterói" -> cidade é o que vem depois da última vírgula
+    antes, _, ultimo = resto.rpartition(",")
+    if " - " in ultimo:
+        # "R. Miguel de Frias, 9 - Niterói" -> sem bairro, cidade é o que vem depois do último " - "
+        numero, _, cidade = ultimo.rpartition(" - ")
+        rua = ",".join(parte for parte in [antes, numero] if parte)
+        bairro = ""
+    else:
+        resto, cidade = antes.strip(), ultimo
+        # "R. Passo da Pátria, 152-470 - São Domingos" -> rua e bairro são separados por " - "
+        rua, separador, bairro = resto.rpartition(" - ")
+        if not separador:
+            # Só há uma parte: é rua se tiver número (ou vírgula), senão é bairro
+            rua, bairro = (resto, "") if re.search(r"\d|,", resto) else ("", resto)
+    cidade = cidade.strip()
+    
+    return EnderecoEstruturado(
+        rua=rua.strip() or None,
+        bairro=bairro.strip() or None,
+        cidade=cidade or None,
+        uf=uf,
+        cep=cep
+    )
+
+
+def get_colunas_derivadas_do_local(key: str, local: str | None) -> dict:
+    '''
+    Calcula as colunas derivadas de um endereço de partida ou destino (key="local_partida" ou "local_destino").
+    Usada pelos validadores das ORMs de Carona e PedidoCarona para mantê-las atualizadas em toda escrita.
+    '''
+    sufixo = key.removeprefix("local_")
+    endereco = parse_endereco(local)
+    coordenadas = geocodificar_cep(endereco.cep)
+    latitude, longitude = coordenadas if coordenadas else (None, None)
+    return {
+        f"{key}_busca": normalizar_endereco(local),
+        f"latitude_{sufixo}": latitude,
+        f"longitude_{sufixo}": longitude,
+        f"geohash_{sufixo}": encode_geohash(latitude, longitude) if coordenadas else None,
+        f"rua_{sufixo}": endereco.rua,
+        f"bairro_{sufixo}": normalizar_endereco(endereco.bairro),
+        f"cidade_{sufixo}": normalizar_endereco(endereco.cidade),
+        f"uf_{sufixo}": endereco.uf,
+        f"cep_{sufixo}": endereco.cep,
+    }
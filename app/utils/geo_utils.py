@@ -0,0 +1,146 @@
+import csv
+import math
+import os
+from functools import lru_cache
+from sqlalchemy import func, or_
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+RAIO_TERRA_KM = 6371.0
+KM_POR_GRAU = 111.32
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISAO = 9  # ~5m x 5m, precisão armazenada no banco
+CEP_CENTROIDES_PATH = os.environ.get(
+    "CEP_CENTROIDES_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "cep_centroides.csv")
+)
+
+
+# ===========================================================================
+# Geocodificação local: CEP -> centroide, sem chamadas de rede
+
+@lru_cache(maxsize=1)
+def carregar_centroides_cep(caminho: str = CEP_CENTROIDES_PATH) -> dict[str, tuple[float, float]]:
+    '''
+    Carrega a tabela de centroides de CEP (CSV com colunas cep_prefixo, latitude e longitude).
+    Os prefixos podem ter de 2 a 8 dígitos, o que permite usar desde centroides de logradouro até de região.
+    '''
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as arquivo:
+        return {
+            linha["cep_prefixo"]: (float(linha["latitude"]), float(linha["longitude"]))
+            for linha in csv.DictReader(arquivo)
+        }
+
+
+def geocodificar_cep(cep: str | None) -> tuple[float, float] | None:
+    '''Retorna (latitude, longitude) do centroide mais específico conhecido para o CEP (8 dígitos), ou None.'''
+    if not cep:
+        return None
+    centroides = carregar_centroides_cep()
+    for tamanho in range(len(cep), 1, -1):
+        if cep[:tamanho] in centroides:
+            return centroides[cep[:tamanho]]
+    return None
+
+
+# ===========================================================================
+# Geohash
+
+def encode_geohash(latitude: float, longitude: float, precisao: int = GEOHASH_PRECISAO) -> str:
+    intervalo_lat, intervalo_lon = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, num_bits, is_longitude = [], 0, 0, True
+    while len(geohash) < precisao:
+        intervalo, valor = (intervalo_lon, longitude) if is_longitude else (intervalo_lat, latitude)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        bits <<= 1
+        if valor >= meio:
+            bits |= 1
+            intervalo[0] = meio
+        else:
+            intervalo[1] = meio
+        is_longitude = not is_longitude
+        num_bits += 1
+        if num_bits == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits, num_bits = 0, 0
+    return "".join(geohash)
+
+
+def tamanho_celula_geohash_graus(precisao: int) -> tuple[float, float]:
+    '''Retorna (altura em graus de latitude, largura em graus de longitude) de uma célula geohash.'''
+    bits_lon = math.ceil(5 * precisao / 2)
+    bits_lat = math.floor(5 * precisao / 2)
+    return 180.0 / 2**bits_lat, 360.0 / 2**bits_lon
+
+
+def precisao_geohash_para_raio(latitude: float, raio_km: float) -> int:
+    '''
+    Maior precisão cuja célula é pelo menos tão grande quanto o raio, de forma que a célula do centro mais suas
+    8 vizinhas cubram todo o círculo. Retorna 0 se nenhuma precisão servir (raio maior que uma célula de precisão 1).
+    '''
+    for precisao in range(GEOHASH_PRECISAO, 0, -1):
+        altura, largura = tamanho_celula_geohash_graus(precisao)
+        if min(altura * KM_POR_GRAU, largura * KM_POR_GRAU * math.cos(math.radians(latitude))) >= raio_km:
+            return precisao
+    return 0
+
+
+def geohash_vizinhanca(latitude: float, longitude: float, precisao: int) -> set[str]:
+    '''Célula geohash que contém o ponto mais suas 8 vizinhas.'''
+    altura, largura = tamanho_celula_geohash_graus(precisao)
+    celulas = set()
+    for delta_lat in (-altura, 0, altura):
+        for delta_lon in (-largura, 0, largura):
+            lat = max(-90.0, min(90.0, latitude + delta_lat))
+            lon = (longitude + delta_lon + 180.0) % 360.0 - 180.0
+            celulas.add(encode_geohash(lat, lon, precisao))
+    return celulas
+
+
+# ===========================================================================
+# Filtros de raio
+
+def distancia_km_sql(
+    coluna_latitude: InstrumentedAttribute,
+    coluna_longitude: InstrumentedAttribute,
+    latitude: float,
+    longitude: float
+):
+    # Fórmula de haversine. O least limita o argumento do asin a 1: com pontos (quase) antipodais o arredondamento
+    # pode passar de 1, e o asin falharia com "input is out of range", derrubando a busca inteira
+    return 2 * RAIO_TERRA_KM * func.asin(func.least(1.0, func.sqrt(
+        func.power(func.sin(func.radians(coluna_latitude - latitude) / 2), 2)
+        + math.cos(math.radians(latitude)) * func.cos(func.radians(coluna_latitude))
+        * func.power(func.sin(func.radians(coluna_longitude - longitude) / 2), 2)
+    )))
+
+
+def get_filtros_raio(
+    coluna_latitude: InstrumentedAttribute,
+    coluna_longitude: InstrumentedAttribute,
+    coluna_geohash: InstrumentedAttribute,
+    latitude: float,
+    longitude: float,
+    raio_km: float
+) -> list:
+    '''
+    Filtros para linhas a no máximo raio_km do ponto. O prefixo de geohash (servido pelo índice b-tree da coluna)
+    reduz os candidatos às 9 células em volta do ponto e a distância de haversine faz o corte exato.
+    
+    Linhas sem coordenadas nunca passam nesses filtros. As coordenadas vêm de geocodificar_cep, e a tabela versionada
+    em data/cep_centroides.csv tem só 22 CEPs de exemplo (Niterói e arredores): a maioria dos endereços fica com
+    latitude/longitude nulas e some das buscas por raio. Em produção, aponte CEP_CENTROIDES_PATH para uma tabela
+    completa de centroides de CEP; as coordenadas são calculadas na escrita do endereço, então as linhas já salvas só
+    passam a tê-las quando forem regravadas.
+    '''
+    filters = []
+    precisao = precisao_geohash_para_raio(latitude=latitude, raio_km=raio_km)
+    if precisao:
+        filters.append(or_(*[
+            coluna_geohash.startswith(celula)
+            for celula in sorted(geohash_vizinhanca(latitude=latitude, longitude=longitude, precisao=precisao))
+        ]))
+    filters.append(distancia_km_sql(coluna_latitude, coluna_longitude, latitude, longitude) <= raio_km)
+    return filters
@@ -0,0 +1,167 @@
+import numpy as np
+
+
+# Maior número de células (pedidos x caronas) da matriz de compatibilidade montada de uma vez
+CELULAS_POR_BLOCO = 4_000_000
+
+
+def agrupar_por_codigo(codigos: np.ndarray) -> dict[int, np.ndarray]:
+    '''Índices das linhas de cada código (ignorando códigos negativos), em ordem crescente dentro de cada grupo.'''
+    validos = np.flatnonzero(codigos >= 0)
+    ordem = validos[np.argsort(codigos[validos], kind="stable")]
+    valores, inicios = np.unique(codigos[ordem], return_index=True)
+    return dict(zip(valores.tolist(), np.split(ordem, inicios[1:])))
+
+
+def calcular_atribuicoes(
+    pedido_area: np.ndarray,
+    pedido_hora_minima: np.ndarray,
+    pedido_hora_maxima: np.ndarray,
+    pedido_valor: np.ndarray,
+    pedido_user: np.ndarray,
+    carona_area: np.ndarray,
+    carona_hora: np.ndarray,
+    carona_valor: np.ndarray,
+    carona_motorista: np.ndarray,
+    carona_vagas: np.ndarray,
+) -> np.ndarray:
+    '''
+    Atribui pedidos de carona a caronas com vagas. Um pedido é compatível com uma carona da mesma área (código de
+    partida/destino), que parte dentro da sua janela de horário, custa no máximo o valor do pedido e não é oferecida
+    pelo próprio usuário. Os pedidos preferem as caronas compatíveis mais baratas e, quando mais pedidos que vagas
+    disputam uma carona, vencem os de menor índice (o chamador ordena os pedidos por prioridade).
+    
+    Horários são inteiros (ex: segundos desde a época). Áreas negativas são desconhecidas e nunca são atribuídas.
+    Retorna, para cada pedido, o índice da carona atribuída ou -1.
+    '''
+    atribuicoes = np.full(len(pedido_area), -1, dtype=np.int64)
+    vagas = carona_vagas.astype(np.int64)
+    caronas_por_area = agrupar_por_codigo(carona_area)
+    for area, pedidos in agrupar_por_codigo(pedido_area).items():
+        caronas = caronas_por_area.get(area)
+        if caronas is None:
+            continue
+        caronas = caronas[np.argsort(carona_hora[caronas], kind="stable")]
+        escolhas = atribuir_no_grupo(
+            hora_minima=pedido_hora_minima[pedidos],
+            hora_maxima=pedido_hora_maxima[pedidos],
+            valor_maximo=pedido_valor[pedidos],
+            user=pedido_user[pedidos],
+            hora=carona_hora[caronas],
+            valor=carona_valor[caronas],
+            motorista=carona_motorista[caronas],
+            vagas=vagas[caronas],
+        )
+        atribuidos = escolhas >= 0
+        atribuicoes[pedidos[atribuidos]] = caronas[escolhas[atribuidos]]
+    return atribuicoes
+
+
+def atribuir_no_grupo(
+    hora_minima: np.ndarray,
+    hora_maxima: np.ndarray,
+    valor_maximo: np.ndarray,
+    user: np.ndarray,
+    hora: np.ndarray,
+    valor: np.ndarray,
+    motorista: np.ndarray,
+    vagas: np.ndarray,
+) -> np.ndarray:
+    '''
+    Atribuição dentro de uma área, com as caronas ordenadas por hora. Em cada rodada, todo pedido pendente propõe a uma
+    carona e cada carona aceita as propostas de maior prioridade até encher. Um pedido recusado guarda quantos pedidos
+    de maior prioridade ficaram à sua frente na fila daquela carona e, na rodada seguinte, pula essa quantidade de vagas
+    entre as suas opções compatíveis: quando muitos pedidos querem as mesmas caronas, eles se distribuem por elas em
+    poucas rodadas em vez de encher uma carona por rodada.
+    '''
+    vagas = vagas.copy()
+    escolhas = np.full(len(hora_minima), -1, dtype=np.int64)
+    pendentes = np.arange(len(hora_minima))
+    a_pular = np.zeros(len(hora_minima), dtype=np.int64)
+    
+    while len(pendentes):
+        propostas = propor(
+            pendentes=pendentes, a_pular=a_pular[pendentes], hora_minima=hora_minima, hora_maxima=hora_maxima,
+            valor_maximo=valor_maximo, user=user, hora=hora, valor=valor, motorista=motorista, vagas=vagas
+        )
+        # sem carona compatível com vaga, o pedido não tem mais chance: as vagas só diminuem
+        com_proposta = propostas >= 0
+        pendentes, propostas = pendentes[com_proposta], propostas[com_proposta]
+        if not len(pendentes):
+            break
+        
+        ordem = np.lexsort((pendentes, propostas))
+        pendentes, propostas = pendentes[ordem], propostas[ordem]
+        inicio_da_fila = np.flatnonzero(np.r_[True, propostas[1:] != propostas[:-1]])
+        tamanho_da_fila = np.diff(np.r_[inicio_da_fila, len(propostas)])
+        posicao_na_fila = np.arange(len(propostas)) - np.repeat(inicio_da_fila, tamanho_da_fila)
+        excedente = posicao_na_fila - vagas[propostas]
+        aceitos = excedente < 0
+        
+        escolhas[pendentes[aceitos]] = propostas[aceitos]
+        vagas -= np.bincount(propostas[aceitos], minlength=len(vagas))
+        a_pular[pendentes[~aceitos]] = excedente[~aceitos]
+        pendentes = pendentes[~aceitos]
+    
+    return escolhas
+
+
+def propor(
+    pendentes: np.ndarray,
+    a_pular: np.ndarray,
+    hora_minima: np.ndarray,
+    hora_maxima: np.ndarray,
+    valor_maximo: np.ndarray,
+    user: np.ndarray,
+    hora: np.ndarray,
+    valor: np.ndarray,
+    motorista: np.ndarray,
+    vagas: np.ndarray,
+) -> np.ndarray:
+    '''
+    Para cada pedido pendente, a carona (índice no grupo) a que ele propõe nesta rodada, ou -1: a mais barata entre as
+    compatíveis com vaga depois de pular _a_pular_ vagas (ou a mais barata de todas, se não houver tantas vagas).
+    Os pedidos são processados em blocos ordenados por hora mínima, e cada bloco só compara com as caronas que partem
+    dentro da janela do bloco.
+    '''
+    propostas = np.full(len(pendentes), -1, dtype=np.int64)
+    com_vaga = np.flatnonzero(vagas > 0)
+    if not len(com_vaga):
+        return propostas
+    
+    ordem = np.argsort(hora_minima[pendentes], kind="stable")
+    hora_com_vaga = hora[com_vaga]
+    inicio = 0
+    tamanho = len(ordem)
+    while inicio < len(ordem):
+        # reduz o bloco até a matriz caber em CELULAS_POR_BLOCO (ou até restar um pedido)
+        while True:
+            linhas = pendentes[ordem[inicio:inicio + tamanho]]
+            primeira_coluna = np.searchsorted(hora_com_vaga, hora_minima[linhas].min())
+            ultima_coluna = np.searchsorted(hora_com_vaga, hora_maxima[linhas].max(), side="right")
+            num_colunas = max(ultima_coluna - primeira_coluna, 1)
+            if len(linhas) == 1 or len(linhas) * num_colunas <= CELULAS_POR_BLOCO:
+                break
+            tamanho = max(min(CELULAS_POR_BLOCO // num_colunas, len(linhas) // 2), 1)
+        bloco = ordem[inicio:inicio + len(linhas)]
+        inicio += len(linhas)
+        tamanho = len(linhas) * 2
+        
+        janela = com_vaga[primeira_coluna:ultima_coluna]
+        if not len(janela):
+            continue
+        colunas = janela[np.argsort(valor[janela], kind="stable")]  # mais barata primeiro
+        
+        compativel = (
+            (hora[colunas] >= hora_minima[linhas, None])
+            & (hora[colunas] <= hora_maxima[linhas, None])
+            & (valor[colunas] <= valor_maximo[linhas, None])
+            & (motorista[colunas] != user[linhas, None])
+        )
+        vagas_acumuladas = np.cumsum(compativel * vagas[colunas], axis=1)
+        total = vagas_acumuladas[:, -1]
+        pular = np.where(total > a_pular[bloco], a_pular[bloco], 0)
+        escolhida = (vagas_acumuladas > pular[:, None]).argmax(axis=1)
+        propostas[bloco] = np.where(total > 0, colunas[escolhida], -1)
+    
+    return propostas
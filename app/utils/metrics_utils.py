@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable
+
+
+@dataclass
+class Metrica:
+    nome: str
+    descricao: str
+    tipo: str  # "counter" ou "gauge", como no formato de exposição do Prometheus
+    coletar: Callable[[], float]
+
+
+_METRICAS: dict[str, Metrica] = {}
+_lock = Lock()
+
+
+def registrar_metrica(nome: str, descricao: str, tipo: str, coletar: Callable[[], float]) -> None:
+    '''
+    Registra uma métrica exposta em GET /metrics. O valor é lido de _coletar_ no momento da coleta,
+    então quem mantém o contador continua sendo o componente medido (cache, pool de conexões, etc.).
+    '''
+    with _lock:
+        _METRICAS[nome] = Metrica(nome=nome, descricao=descricao, tipo=tipo, coletar=coletar)
+
+
+def render_metricas_prometheus() -> str:
+    '''Renderiza todas as métricas registradas no formato texto do Prometheus.'''
+    with _lock:
+        metricas = sorted(_METRICAS.values(), key=lambda metrica: metrica.nome)
+    linhas = []
+    for metrica in metricas:
+        linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.append(f"{metrica.nome} {metrica.coletar()}")
+    return "\n".join(linhas) + "\n"
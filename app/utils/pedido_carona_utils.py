@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import asc, desc
+from datetime import datetime
+from sqlalchemy import ColumnElement, and_, asc, desc, func, literal_column
 from app.database.pedido_carona_orm import PedidoCarona
 
 
@@ -29,4 +30,24 @@ class PedidoCaronaOrderByOptions(str, enum.Enum):
                 False: desc(PedidoCarona.created_at)
             }
         }
-        
\ No newline at end of file
+    
+    @classmethod
+    def get_keyset_columns_dict(self) -> dict:
+        # Colunas usadas na paginação por cursor. O id desempata pedidos com o mesmo valor na coluna de ordenação
+        return {
+            self.hora_minima_partida.value: [PedidoCarona.hora_partida_minima, PedidoCarona.id],
+            self.hora_maxima_partida.value: [PedidoCarona.hora_partida_maxima, PedidoCarona.id],
+            self.valor.value: [PedidoCarona.valor, PedidoCarona.id],
+            self.hora_criacao.value: [PedidoCarona.created_at, PedidoCarona.id]
+        }
+
+        
+
+
+def get_janela_contem_hora_filter(hora: datetime, dialeto: str) -> ColumnElement[bool]:
+    '''Pedidos cuja janela [hora_partida_minima, hora_partida_maxima] contém _hora_.'''
+    if dialeto == "postgresql":
+        # mesma expressão do índice GiST ix_pedido_carona_janela_aberta, para que o planner o use
+        janela = func.tsrange(PedidoCarona.hora_partida_minima, PedidoCarona.hora_partida_maxima, literal_column("'[]'"))
+        return janela.op("@>", is_comparison=True)(hora)
+    return and_(PedidoCarona.hora_partida_minima <= hora, PedidoCarona.hora_partida_maxima >= hora)
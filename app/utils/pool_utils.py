@@ -0,0 +1,95 @@
+import logging
+import time
+from threading import Lock
+
+import anyio.to_thread
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics_utils import registrar_metrica
+
+
+class EstatisticasPool:
+    def __init__(self):
+        self.checkouts = 0
+        self.espera_total_segundos = 0.0
+        self.espera_maxima_segundos = 0.0
+        self.timeouts = 0
+        self._lock = Lock()
+    
+    def registrar_checkout(self, espera_segundos: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_segundos += espera_segundos
+            self.espera_maxima_segundos = max(self.espera_maxima_segundos, espera_segundos)
+    
+    def registrar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+
+class PoolInstrumentadoMixin:
+    '''
+    Mede o tempo de espera de cada checkout de conexão e conta os timeouts. O SQLAlchemy não tem evento para o início
+    de um checkout, então a medição é feita em _do_get, que é onde a requisição fica bloqueada quando o pool está cheio.
+    '''
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estatisticas = EstatisticasPool()
+    
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except PoolTimeoutError:
+            self.estatisticas.registrar_timeout()
+            raise
+        self.estatisticas.registrar_checkout(time.perf_counter() - inicio)
+        return conexao
+
+
+class QueuePoolInstrumentado(PoolInstrumentadoMixin, QueuePool):
+    pass
+
+
+class AsyncAdaptedQueuePoolInstrumentado(PoolInstrumentadoMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrumentar_pool(engine: Engine, prefixo: str) -> None:
+    '''
+    Registra as métricas do pool do engine em /metrics. O pool é lido a cada coleta (engine.pool), pois o SQLAlchemy
+    pode recriá-lo (ex: engine.dispose()).
+    '''
+    def estatisticas() -> EstatisticasPool:
+        return getattr(engine.pool, "estatisticas", None) or EstatisticasPool()
+    
+    registrar_metrica(f"{prefixo}_pool_size", "Tamanho configurado do pool de conexões.", "gauge", lambda: engine.pool.size())
+    registrar_metrica(f"{prefixo}_pool_conexoes_em_uso", "Conexões emprestadas (checked out) no momento.", "gauge", lambda: engine.pool.checkedout())
+    registrar_metrica(f"{prefixo}_pool_overflow", "Conexões abertas além de pool_size no momento (negativo: pool ainda não preenchido).", "gauge", lambda: engine.pool.overflow())
+    registrar_metrica(f"{prefixo}_pool_checkouts_total", "Checkouts de conexão realizados.", "counter", lambda: estatisticas().checkouts)
+    registrar_metrica(f"{prefixo}_pool_espera_checkout_segundos_total", "Soma do tempo de espera dos checkouts de conexão.", "counter", lambda: estatisticas().espera_total_segundos)
+    registrar_metrica(f"{prefixo}_pool_espera_checkout_maxima_segundos", "Maior espera de checkout de conexão desde o início do processo.", "gauge", lambda: estatisticas().espera_maxima_segundos)
+    registrar_metrica(f"{prefixo}_pool_timeouts_total", "Checkouts que estouraram pool_timeout.", "counter", lambda: estatisticas().timeouts)
+
+
+def verificar_capacidade_do_pool(capacidade_do_pool: int, tamanho_do_threadpool: int | None = None) -> None:
+    '''
+    Ajusta (se configurado) e compara o threadpool do AnyIO, onde rodam as rotas síncronas, com a capacidade do pool de
+    conexões síncrono. Com mais threads que conexões, as requisições excedentes ficam bloqueadas no checkout do pool.
+    Deve ser chamada com o event loop rodando (ex: no lifespan da aplicação).
+    '''
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    if tamanho_do_threadpool:
+        limiter.total_tokens = tamanho_do_threadpool
+    registrar_metrica("threadpool_size", "Número máximo de threads para rotas síncronas (por worker).", "gauge", lambda: limiter.total_tokens)
+    
+    if limiter.total_tokens > capacidade_do_pool:
+        logging.warning(
+            f"O threadpool ({limiter.total_tokens} threads) é maior que a capacidade do pool de conexões "
+            f"({capacidade_do_pool} = DB_POOL_SIZE + DB_MAX_OVERFLOW). Sob carga, as requisições excedentes vão esperar "
+            f"por uma conexão (até DB_POOL_TIMEOUT). Ajuste THREADPOOL_SIZE ou o pool, lembrando que cada worker do "
+            f"uvicorn tem o seu próprio pool."
+        )
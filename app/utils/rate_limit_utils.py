@@ -0,0 +1,140 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from app.utils.metrics_utils import registrar_metrica
+
+
+class TokenBucketLimiter:
+    '''
+    Limitador por token bucket em memória: cada chave (IP, usuário, ...) tem um balde com até _capacidade_ fichas,
+    repostas à taxa de _reposicao_por_segundo_; cada tentativa consome uma ficha. Guarda no máximo _tamanho_maximo_
+    chaves, descartando as usadas há mais tempo (o que equivale a encher o balde delas de novo).
+    '''
+    
+    def __init__(self, nome: str, capacidade: float, reposicao_por_segundo: float, tamanho_maximo: int = 100_000):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.reposicao_por_segundo = reposicao_por_segundo
+        self.tamanho_maximo = tamanho_maximo
+        self.permitidas = 0
+        self.bloqueadas = 0
+        self._baldes: OrderedDict[str, tuple[float, float]] = OrderedDict()  # chave -> (fichas, instante)
+        self._lock = Lock()
+        
+        registrar_metrica(f"{nome}_rate_limit_permitidas_total", f"Tentativas permitidas pelo limitador {nome}.", "counter", lambda: self.permitidas)
+        registrar_metrica(f"{nome}_rate_limit_bloqueadas_total", f"Tentativas bloqueadas pelo limitador {nome}.", "counter", lambda: self.bloqueadas)
+    
+    def consumir(self, chave: str) -> float:
+        '''Tenta consumir uma ficha do balde da chave. Retorna 0 se permitido ou, se não, os segundos até haver uma ficha.'''
+        if self.capacidade <= 0:
+            return 0.0
+        agora = time.monotonic()
+        with self._lock:
+            fichas, instante = self._baldes.get(chave, (self.capacidade, agora))
+            fichas = min(self.capacidade, fichas + (agora - instante) * self.reposicao_por_segundo)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+                self.permitidas += 1
+            else:
+                espera = (1 - fichas) / self.reposicao_por_segundo
+                self.bloqueadas += 1
+            self._baldes[chave] = (fichas, agora)
+            self._baldes.move_to_end(chave)
+            while len(self._baldes) > self.tamanho_maximo:
+                self._baldes.popitem(last=False)
+            return espera
+
+
+# Token bucket atômico no Redis. O relógio é o do próprio Redis, para que instâncias com relógios diferentes
+# compartilhem os baldes corretamente
+TOKEN_BUCKET_LUA = '''
+local capacidade = tonumber(ARGV[1])
+local reposicao = tonumber(ARGV[2])
+local tempo = redis.call('TIME')
+local agora = tonumber(tempo[1]) + tonumber(tempo[2]) / 1000000
+local balde = redis.call('HMGET', KEYS[1], 'fichas', 'instante')
+local fichas = tonumber(balde[1]) or capacidade
+local instante = tonumber(balde[2]) or agora
+fichas = math.min(capacidade, fichas + math.max(0, agora - instante) * reposicao)
+local espera = 0
+if fichas >= 1 then
+    fichas = fichas - 1
+else
+    espera = (1 - fichas) / reposicao
+end
+redis.call('HSET', KEYS[1], 'fichas', tostring(fichas), 'instante', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / reposicao * 1000))
+return tostring(espera)
+'''
+
+
+class RedisTokenBucketLimiter:
+    '''
+    Mesma interface do TokenBucketLimiter, com os baldes num Redis compartilhado entre os workers/instâncias da API.
+    Exige o pacote opcional redis (pip install redis).
+    '''
+    
+    def __init__(self, nome: str, url: str, capacidade: float, reposicao_por_segundo: float):
+        try:
+            import redis
+        except ImportError as ie:
+            raise RuntimeError(f"O limitador {nome} está configurado para o Redis ({url}), mas o pacote redis não está instalado.") from ie
+        
+        self.nome = nome
+        self.capacidade = capacidade
+        self.reposicao_por_segundo = reposicao_por_segundo
+        self.permitidas = 0
+        self.bloqueadas = 0
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_LUA)
+        
+        registrar_metrica(f"{nome}_rate_limit_permitidas_total", f"Tentativas permitidas pelo limitador {nome}.", "counter", lambda: self.permitidas)
+        registrar_metrica(f"{nome}_rate_limit_bloqueadas_total", f"Tentativas bloqueadas pelo limitador {nome}.", "counter", lambda: self.bloqueadas)
+    
+    def consumir(self, chave: str) -> float:
+        if self.capacidade <= 0:
+            return 0.0
+        espera = float(self._script(keys=[f"{self.nome}:{chave}"], args=[self.capacidade, self.reposicao_por_segundo]))
+        if espera > 0:
+            self.bloqueadas += 1
+        else:
+            self.permitidas += 1
+        return espera
+
+
+def criar_limiter(
+    nome: str,
+    capacidade: float,
+    reposicao_por_minuto: float,
+    backend_url: str | None = None
+) -> TokenBucketLimiter | RedisTokenBucketLimiter:
+    '''Cria o limitador em memória do processo ou, se backend_url for passada (ex: redis://localhost:6379/0), no Redis.'''
+    if backend_url:
+        return RedisTokenBucketLimiter(nome=nome, url=backend_url, capacidade=capacidade, reposicao_por_segundo=reposicao_por_minuto / 60)
+    return TokenBucketLimiter(nome=nome, capacidade=capacidade, reposicao_por_segundo=reposicao_por_minuto / 60)
+
+
+def segundos_para_retry_after(espera: float) -> str:
+    return str(max(math.ceil(espera), 1))
+
+
+# Limitadores das rotas que verificam ou geram hash de senha (bcrypt). O limite por IP é generoso porque muitos alunos
+# compartilham o IP da rede da universidade; o limite por usuário é o que barra tentativas de senha contra uma conta.
+# Capacidade <= 0 desliga o limitador.
+RATE_LIMIT_BACKEND_URL = os.environ.get("RATE_LIMIT_BACKEND_URL")
+senha_por_ip_limiter = criar_limiter(
+    nome="senha_por_ip",
+    capacidade=float(os.environ.get("SENHA_RATE_LIMIT_IP_CAPACIDADE", 100)),
+    reposicao_por_minuto=float(os.environ.get("SENHA_RATE_LIMIT_IP_POR_MINUTO", 100)),
+    backend_url=RATE_LIMIT_BACKEND_URL
+)
+senha_por_usuario_limiter = criar_limiter(
+    nome="senha_por_usuario",
+    capacidade=float(os.environ.get("SENHA_RATE_LIMIT_USUARIO_CAPACIDADE", 10)),
+    reposicao_por_minuto=float(os.environ.get("SENHA_RATE_LIMIT_USUARIO_POR_MINUTO", 5)),
+    backend_url=RATE_LIMIT_BACKEND_URL
+)
@@ -0,0 +1,19 @@
+import asyncio
+import logging
+from typing import Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+
+async def executar_periodicamente(nome: str, intervalo_segundos: float, funcao: Callable[[], None]) -> None:
+    '''Executa a função síncrona no threadpool a cada intervalo_segundos até a task ser cancelada. Falhas só são registradas.'''
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await run_in_threadpool(funcao)
+        except Exception as e:
+            logging.error(f"Falha na tarefa periódica {nome}: {e}")
+
+
+def iniciar_tarefa_periodica(nome: str, intervalo_segundos: float, funcao: Callable[[], None]) -> asyncio.Task:
+    return asyncio.create_task(executar_periodicamente(nome, intervalo_segundos, funcao), name=nome)
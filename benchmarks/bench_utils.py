@@ -0,0 +1,140 @@
+'''
+Utilitários compartilhados pelos benchmarks.
+
+Os benchmarks rodam contra o banco configurado em SQLALCHEMY_DATABASE_URL (credentials.env), sempre dentro de uma
+transação que sofre rollback ao final. Nenhum dado semeado permanece no banco.
+'''
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from database import engine
+from app.database.carona_orm import Carona
+from app.utils.endereco_utils import get_colunas_derivadas_do_local
+
+
+BAIRROS = [
+    ("São Domingos", "Niterói", "RJ", "24210-240"),
+    ("Gragoatá", "Niterói", "RJ", "24210-201"),
+    ("Icaraí", "Niterói", "RJ", "24220-031"),
+    ("Ingá", "Niterói", "RJ", "24210-450"),
+    ("Centro", "Niterói", "RJ", "24020-077"),
+    ("Santa Rosa", "Niterói", "RJ", "24240-660"),
+    ("Alcântara", "São Gonçalo", "RJ", "24710-260"),
+    ("Centro", "Rio de Janeiro", "RJ", "20040-020"),
+    ("Botafogo", "Rio de Janeiro", "RJ", "22250-040"),
+    ("Copacabana", "Rio de Janeiro", "RJ", "22070-011"),
+    ("Ipanema", "Rio de Janeiro", "RJ", "22410-003"),
+    ("Tijuca", "Rio de Janeiro", "RJ", "20511-170"),
+]
+RUAS = ["R. Passo da Pátria", "Av. Visc. do Rio Branco", "R. Miguel de Frias", "R. Gavião Peixoto", "Av. Amaral Peixoto", "R. Dr. Paulo César"]
+
+
+@contextmanager
+def conexao_descartavel():
+    '''Conexão cuja transação sofre rollback ao final, descartando tudo que foi semeado.'''
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            yield conn
+        finally:
+            trans.rollback()
+
+
+def gerar_enderecos(quantidade: int, seed: int = 42) -> list[str]:
+    aleatorio = random.Random(seed)
+    enderecos = []
+    for _ in range(quantidade):
+        bairro, cidade, uf, cep = aleatorio.choice(BAIRROS)
+        enderecos.append(f"{aleatorio.choice(RUAS)}, {aleatorio.randint(1, 999)} - {bairro}, {cidade} - {uf}, {cep}")
+    return enderecos
+
+
+def semear_motorista(conn: Connection) -> tuple[int, int]:
+    '''Cria um usuário motorista com um veículo. Retorna (id do motorista, id do motorista_veiculo).'''
+    sufixo = f"{time.time_ns()}"
+    user_id = conn.execute(
+        text(
+            '''
+            INSERT INTO "user" (email, first_name, last_name, cpf, phone, hashed_password, birthdate, created_at, active)
+            VALUES (:email, 'Bench', 'Motorista', :cpf, :phone, 'x', '1990-01-01', now(), true)
+            RETURNING id
+            '''
+        ),
+        {"email": f"bench.{sufixo}@id.uff.br", "cpf": f"bench{sufixo}", "phone": f"bench{sufixo}"}
+    ).scalar_one()
+    conn.execute(
+        text("INSERT INTO motorista (id_fk_user, num_cnh, created_at) VALUES (:id, :cnh, now())"),
+        {"id": user_id, "cnh": f"bench{sufixo}"}
+    )
+    veiculo_id = conn.execute(
+        text("INSERT INTO veiculo (tipo, marca, modelo, cor, created_at) VALUES ('CARRO', 'BENCH', :modelo, 'PRETO', now()) RETURNING id"),
+        {"modelo": f"BENCH{sufixo}"}
+    ).scalar_one()
+    motorista_veiculo_id = conn.execute(
+        text("INSERT INTO motorista_veiculo (fk_motorista, fk_veiculo, placa) VALUES (:motorista, :veiculo, 'BEN0C00') RETURNING id"),
+        {"motorista": user_id, "veiculo": veiculo_id}
+    ).scalar_one()
+    return user_id, motorista_veiculo_id
+
+
+def semear_caronas(conn: Connection, num_caronas: int, num_enderecos: int = 500) -> int:
+    '''
+    Insere num_caronas caronas de um novo motorista via generate_series e retorna o id do motorista. Os endereços são
+    sorteados de um conjunto de num_enderecos endereços, cujas colunas derivadas (busca, coordenadas, ...) são
+    calculadas pela própria ORM (Carona.validate_local).
+    '''
+    motorista_id, motorista_veiculo_id = semear_motorista(conn)
+    caronas_modelo = [
+        Carona(local_partida=partida, local_destino=destino)
+        for partida, destino in zip(gerar_enderecos(num_enderecos, seed=1), gerar_enderecos(num_enderecos, seed=2))
+    ]
+    colunas_endereco = ["local_partida", "local_destino"] + [
+        coluna
+        for key in ["local_partida", "local_destino"]
+        for coluna in get_colunas_derivadas_do_local(key=key, local=caronas_modelo[0].local_partida)
+    ]
+    tipos_sql = {float: "float8[]", str: "text[]"}
+    conn.execute(
+        text(
+            f'''
+            INSERT INTO carona (
+                fk_motorista, fk_motorista_veiculo, valor, vagas, vagas_preenchidas, hora_partida, created_at,
+                {", ".join(colunas_endereco)}
+            )
+            SELECT
+                :motorista_id, :motorista_veiculo_id, round((random() * 50)::numeric, 2), 4, floor(random() * 5),
+                now() + (g - :num_caronas / 2) * interval '1 minute', now() - g * interval '1 second',
+                {", ".join(
+                    f"(CAST(:{coluna} AS {tipos_sql[Carona.__table__.c[coluna].type.python_type]}))[1 + g % :num_enderecos]"
+                    for coluna in colunas_endereco
+                )}
+            FROM generate_series(1, :num_caronas) AS g
+            '''
+        ),
+        {
+            "motorista_id": motorista_id,
+            "motorista_veiculo_id": motorista_veiculo_id,
+            "num_caronas": num_caronas,
+            "num_enderecos": num_enderecos,
+        } | {
+            coluna: [getattr(carona, coluna) for carona in caronas_modelo]
+            for coluna in colunas_endereco
+        }
+    )
+    conn.execute(text("ANALYZE carona"))
+    return motorista_id
+
+
+def medir_latencia_ms(conn: Connection, query: str, params: dict | None = None, repeticoes: int = 20) -> tuple[float, list]:
+    '''Executa a query repeticoes vezes e retorna (mediana da latência em ms, resultado da última execução).'''
+    latencias = []
+    resultado = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = conn.execute(text(query), params or {}).all()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(latencias), resultado
@@ -0,0 +1,43 @@
+'''
+Compara a latência da busca por palavra chave em endereços de carona antes e depois das colunas de busca com pg_trgm.
+
+- Antes: UPPER(local_destino) LIKE '%PALAVRA%' (sequential scan, sensível a acentos)
+- Depois: local_destino_busca LIKE '%PALAVRA%' (GIN pg_trgm, insensível a acentos)
+
+Uso (na raiz do projeto, com o banco migrado até o head):
+    python -m benchmarks.busca_endereco_benchmark [num_caronas]
+'''
+import sys
+
+from app.utils.endereco_utils import normalizar_endereco
+from benchmarks.bench_utils import conexao_descartavel, medir_latencia_ms, semear_caronas
+
+
+KEYWORDS = ["Gragoatá", "Niteroi", "Copacabana", "Passo da Pátria"]
+
+
+def main(num_caronas: int = 100_000) -> None:
+    with conexao_descartavel() as conn:
+        print(f"Semeando {num_caronas} caronas...")
+        semear_caronas(conn, num_caronas)
+        
+        print(f"{'keyword':<20}{'antes (ms)':>12}{'linhas':>10}{'depois (ms)':>14}{'linhas':>10}")
+        for keyword in KEYWORDS:
+            latencia_antes, resultado_antes = medir_latencia_ms(
+                conn,
+                "SELECT count(*) FROM carona WHERE upper(local_destino) LIKE '%' || :keyword || '%'",
+                {"keyword": keyword.upper()}
+            )
+            latencia_depois, resultado_depois = medir_latencia_ms(
+                conn,
+                "SELECT count(*) FROM carona WHERE local_destino_busca LIKE '%' || :keyword || '%'",
+                {"keyword": normalizar_endereco(keyword)}
+            )
+            print(
+                f"{keyword:<20}{latencia_antes:>12.2f}{resultado_antes[0][0]:>10}"
+                f"{latencia_depois:>14.2f}{resultado_depois[0][0]:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,104 @@
+'''
+Teste de carga de GET /carona nos modos síncrono (threadpool + psycopg2) e assíncrono (DATABASE_ASYNC_MODE, asyncpg).
+
+Para cada modo, sobe um servidor uvicorn (1 worker) com o cache de busca desligado, cria um usuário de teste, dispara
+_concorrencia_ clientes simultâneos durante _duracao_ segundos e imprime requests/s e latências. Usa os dados que já
+estão no banco configurado em credentials.env (semeie antes, se necessário; o usuário de teste permanece no banco).
+
+Uso (na raiz do projeto, com o banco migrado até o head):
+    python -m benchmarks.carona_load_test [concorrencia] [duracao_segundos]
+'''
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+
+PORTA = 8765
+BASE_URL = f"http://127.0.0.1:{PORTA}"
+PATH = "/carona"
+PARAMS = {"vagas_restantes_minimas": 0, "limite": 10}
+MODOS = {"sync": "false", "async": "true"}
+
+
+def subir_servidor(modo: str) -> subprocess.Popen:
+    env = os.environ | {"DATABASE_ASYNC_MODE": MODOS[modo], "CARONA_SEARCH_CACHE_TTL": "0"}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORTA), "--log-level", "warning"],
+        env=env
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{BASE_URL}/ping")
+            return servidor
+        except httpx.TransportError:
+            time.sleep(0.1)
+    servidor.terminate()
+    raise RuntimeError(f"Servidor no modo {modo} não subiu.")
+
+
+def criar_usuario_de_teste() -> dict:
+    sufixo = time.time_ns()
+    usuario = {
+        "email": f"carga.{sufixo}@id.uff.br",
+        "first_name": "Carga",
+        "last_name": "Teste",
+        "cpf": f"{sufixo}"[-11:],
+        "birthdate": "1990-01-01T00:00:00",
+        "phone": f"{sufixo}"[-11:],
+        "password": "carga",
+    }
+    httpx.post(f"{BASE_URL}/users/create", json=usuario).raise_for_status()
+    resposta = httpx.post(f"{BASE_URL}/token", data={"username": usuario["email"], "password": usuario["password"]})
+    resposta.raise_for_status()
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+async def cliente(http: httpx.AsyncClient, headers: dict, fim: float, latencias: list, erros: list) -> None:
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        try:
+            resposta = await http.get(PATH, params=PARAMS, headers=headers)
+            if resposta.status_code != 200:
+                erros.append(resposta.status_code)
+                continue
+        except httpx.HTTPError as erro:
+            erros.append(type(erro).__name__)
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+
+async def gerar_carga(headers: dict, concorrencia: int, duracao: float) -> tuple[list, list]:
+    latencias, erros = [], []
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limites, timeout=60) as http:
+        fim = time.perf_counter() + duracao
+        await asyncio.gather(*(cliente(http, headers, fim, latencias, erros) for _ in range(concorrencia)))
+    return latencias, erros
+
+
+def percentil(valores: list, p: float) -> float:
+    return statistics.quantiles(valores, n=100)[int(p) - 1] if len(valores) > 1 else (valores or [0])[0]
+
+
+def main(concorrencia: int = 500, duracao: float = 30) -> None:
+    print(f"{'modo':<8}{'req/s':>10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}{'erros':>8}")
+    for modo in MODOS:
+        servidor = subir_servidor(modo)
+        try:
+            headers = criar_usuario_de_teste()
+            latencias, erros = asyncio.run(gerar_carga(headers, concorrencia, duracao))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+        print(
+            f"{modo:<8}{len(latencias) / duracao:>10.1f}{percentil(latencias, 50):>12.1f}"
+            f"{percentil(latencias, 95):>12.1f}{percentil(latencias, 99):>12.1f}{len(erros):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])))
@@ -0,0 +1,118 @@
+'''
+Mostra o EXPLAIN ANALYZE das queries principais dos endpoints de carona antes e depois dos índices compostos e
+parcial de carona (migration 5b0e3a9d7c12).
+
+- Antes: índices de coluna única em hora_partida, fk_motorista, vagas, local_partida e local_destino
+- Depois: (hora_partida, valor), (fk_motorista, hora_partida DESC, id DESC), (created_at, id) e o índice parcial
+  (hora_partida, id) WHERE vagas_preenchidas < vagas
+
+O estado "antes" é montado dentro de um SAVEPOINT (DDL é transacional no PostgreSQL) e desfeito em seguida. Como
+DROP INDEX bloqueia a tabela até o fim da transação, rode contra um banco de desenvolvimento.
+
+Uso (na raiz do projeto, com o banco migrado até o head):
+    python -m benchmarks.indices_carona_explain [num_caronas] [num_motoristas]
+'''
+import sys
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from benchmarks.bench_utils import conexao_descartavel, semear_caronas
+
+
+INDICES_NOVOS = [
+    "ix_carona_hora_partida_valor",
+    "ix_carona_fk_motorista_hora_partida",
+    "ix_carona_created_at_id",
+    "ix_carona_com_vagas_hora_partida",
+]
+INDICES_ANTIGOS = {
+    "ix_carona_hora_partida": "hora_partida",
+    "ix_carona_fk_motorista": "fk_motorista",
+    "ix_carona_vagas": "vagas",
+    "ix_carona_local_partida": "local_partida",
+    "ix_carona_local_destino": "local_destino",
+}
+
+# Queries principais (sem os carregamentos em lote dos relacionamentos) de cada endpoint, com os filtros padrão
+QUERIES = {
+    "GET /carona (ordem: hora da partida)": (
+        '''
+        SELECT * FROM carona
+        WHERE hora_partida >= now() AND hora_partida <= now() + interval '2 hours'
+          AND valor >= 0 AND valor <= 30
+          AND vagas - vagas_preenchidas >= 1 AND vagas_preenchidas < vagas
+        ORDER BY hora_partida, id
+        LIMIT 10
+        '''
+    ),
+    "GET /carona (ordem: valor)": (
+        '''
+        SELECT * FROM carona
+        WHERE hora_partida >= now() AND hora_partida <= now() + interval '2 hours'
+          AND valor >= 10 AND valor <= 20
+          AND vagas - vagas_preenchidas >= 1 AND vagas_preenchidas < vagas
+        ORDER BY valor, id
+        LIMIT 10
+        '''
+    ),
+    "GET /carona (ordem: hora da oferta)": (
+        '''
+        SELECT * FROM carona
+        WHERE hora_partida >= now() AND hora_partida <= now() + interval '365 days'
+          AND valor >= 0 AND valor <= 999999
+          AND vagas - vagas_preenchidas >= 1 AND vagas_preenchidas < vagas
+        ORDER BY created_at, id
+        LIMIT 10
+        '''
+    ),
+    "GET /carona/historico/me/motorista": (
+        '''
+        SELECT * FROM carona
+        WHERE fk_motorista = :motorista_id
+          AND hora_partida >= now() - interval '365 days' AND hora_partida <= now() + interval '365 days'
+        ORDER BY hora_partida DESC, id DESC
+        LIMIT 10
+        '''
+    ),
+    "POST /pedido-carona (inserir_automatico)": (
+        '''
+        SELECT * FROM carona
+        WHERE hora_partida >= now() AND hora_partida <= now() + interval '1 hour'
+          AND valor <= 25
+          AND vagas_preenchidas < vagas
+        ORDER BY valor
+        LIMIT 1
+        '''
+    ),
+}
+
+
+def imprimir_explains(conn: Connection, titulo: str, params: dict) -> None:
+    print(f"\n{'=' * 100}\n{titulo}\n{'=' * 100}")
+    for endpoint, query in QUERIES.items():
+        plano = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params).scalars().all()
+        print(f"\n--- {endpoint}")
+        print("\n".join(plano))
+
+
+def main(num_caronas: int = 200_000, num_motoristas: int = 20) -> None:
+    with conexao_descartavel() as conn:
+        print(f"Semeando {num_caronas} caronas de {num_motoristas} motoristas...")
+        motoristas_ids = [semear_caronas(conn, num_caronas // num_motoristas) for _ in range(num_motoristas)]
+        params = {"motorista_id": motoristas_ids[0]}
+        
+        savepoint = conn.begin_nested()
+        for nome in INDICES_NOVOS:
+            conn.execute(text(f"DROP INDEX {nome}"))
+        for nome, coluna in INDICES_ANTIGOS.items():
+            conn.execute(text(f"CREATE INDEX {nome} ON carona ({coluna})"))
+        conn.execute(text("ANALYZE carona"))
+        imprimir_explains(conn, "ANTES: índices de coluna única", params)
+        savepoint.rollback()
+        
+        conn.execute(text("ANALYZE carona"))
+        imprimir_explains(conn, "DEPOIS: índices compostos e parcial", params)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,83 @@
+'''
+Latência de endpoints não relacionados ao login durante uma rajada de logins (POST /token).
+
+Sobe um servidor uvicorn (1 worker, modo síncrono), cria um usuário de teste e mede a latência de GET /ping e
+GET /veiculo/cores (autenticado) com _sondas_ clientes simultâneos, primeiro sem carga e depois enquanto _logins_
+clientes fazem login sem parar. Com o bcrypt fora do event loop, o p99 das sondas deve ficar próximo do da linha de
+base; com o bcrypt no event loop, cada login trava o worker inteiro por ~100ms+. O usuário de teste permanece no banco.
+
+Uso (na raiz do projeto, com o banco migrado até o head):
+    python -m benchmarks.login_burst_benchmark [logins] [duracao_segundos] [sondas]
+'''
+import asyncio
+import sys
+import time
+import httpx
+
+from benchmarks.carona_load_test import BASE_URL, criar_usuario_de_teste, percentil, subir_servidor
+
+
+SONDAS = ["/ping", "/veiculo/cores"]
+
+
+async def sonda(http: httpx.AsyncClient, path: str, headers: dict, fim: float, latencias: list, erros: list) -> None:
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        try:
+            resposta = await http.get(path, headers=headers)
+            if resposta.status_code != 200:
+                erros.append(resposta.status_code)
+                continue
+        except httpx.HTTPError as erro:
+            erros.append(type(erro).__name__)
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def login(http: httpx.AsyncClient, credenciais: dict, fim: float, logins: list, erros: list) -> None:
+    while time.perf_counter() < fim:
+        try:
+            resposta = await http.post("/token", data=credenciais)
+            if resposta.status_code != 200:
+                erros.append(resposta.status_code)
+                continue
+        except httpx.HTTPError as erro:
+            erros.append(type(erro).__name__)
+            continue
+        logins.append(time.perf_counter())
+
+
+async def medir(headers: dict, credenciais: dict, num_logins: int, num_sondas: int, duracao: float) -> tuple[list, list, list]:
+    latencias, logins, erros = [], [], []
+    limites = httpx.Limits(max_connections=num_logins + num_sondas)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limites, timeout=120) as http:
+        fim = time.perf_counter() + duracao
+        await asyncio.gather(
+            *(sonda(http, SONDAS[i % len(SONDAS)], headers, fim, latencias, erros) for i in range(num_sondas)),
+            *(login(http, credenciais, fim, logins, erros) for _ in range(num_logins))
+        )
+    return latencias, logins, erros
+
+
+def main(num_logins: int = 50, duracao: float = 20, num_sondas: int = 10) -> None:
+    servidor = subir_servidor("sync")
+    try:
+        headers = criar_usuario_de_teste()
+        # criar_usuario_de_teste usa a senha "carga"
+        credenciais = {"username": httpx.get(f"{BASE_URL}/users/me", headers=headers).json()["email"], "password": "carga"}
+
+        print(f"{'cenário':<22}{'sondas/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'logins/s':>10}{'erros':>8}")
+        for cenario, logins_simultaneos in [("sem logins", 0), (f"{num_logins} logins simultâneos", num_logins)]:
+            latencias, logins, erros = asyncio.run(medir(headers, credenciais, logins_simultaneos, num_sondas, duracao))
+            print(
+                f"{cenario:<22}{len(latencias) / duracao:>10.1f}{percentil(latencias, 50):>12.1f}"
+                f"{percentil(latencias, 99):>12.1f}{len(logins) / duracao:>10.1f}{len(erros):>8}"
+            )
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i == 1 else int(arg) for i, arg in enumerate(sys.argv[1:])))
@@ -0,0 +1,63 @@
+'''
+Tempo do cálculo das atribuições do atendimento em lote de pedidos de carona (calcular_atribuicoes), sem o banco.
+
+Gera _pedidos_ pedidos e _caronas_ caronas sintéticos ao longo de uma semana, com janelas de 10 minutos a 4 horas, e
+mede o cálculo com todas as viagens numa única área e espalhadas por várias áreas (pares de bairros de partida e
+destino). Confere que toda atribuição respeita a área, a janela, o valor e as vagas de cada carona.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.pedido_carona_matcher_benchmark [pedidos] [caronas]
+'''
+import sys
+import time
+import numpy as np
+
+from app.utils.matching_utils import calcular_atribuicoes
+
+
+SEMANA_EM_SEGUNDOS = 7 * 24 * 3600
+NUM_AREAS = [1, 12, 144]  # 144 = 12 bairros de partida x 12 de destino (como em bench_utils.BAIRROS)
+
+
+def gerar(num_pedidos: int, num_caronas: int, num_areas: int, seed: int = 42) -> dict:
+    aleatorio = np.random.default_rng(seed)
+    hora_minima = aleatorio.integers(0, SEMANA_EM_SEGUNDOS, num_pedidos)
+    return {
+        "pedido_area": aleatorio.integers(0, num_areas, num_pedidos),
+        "pedido_hora_minima": hora_minima,
+        "pedido_hora_maxima": hora_minima + aleatorio.integers(600, 4 * 3600, num_pedidos),
+        "pedido_valor": aleatorio.uniform(5, 30, num_pedidos),
+        "pedido_user": aleatorio.integers(0, num_pedidos, num_pedidos),
+        "carona_area": aleatorio.integers(0, num_areas, num_caronas),
+        "carona_hora": aleatorio.integers(0, SEMANA_EM_SEGUNDOS, num_caronas),
+        "carona_valor": aleatorio.uniform(5, 30, num_caronas),
+        "carona_motorista": aleatorio.integers(0, num_pedidos, num_caronas),
+        "carona_vagas": aleatorio.integers(1, 5, num_caronas),
+    }
+
+
+def conferir(atribuicoes: np.ndarray, dados: dict) -> None:
+    atribuidos = atribuicoes >= 0
+    caronas = atribuicoes[atribuidos]
+    assert (dados["carona_area"][caronas] == dados["pedido_area"][atribuidos]).all()
+    assert (dados["carona_hora"][caronas] >= dados["pedido_hora_minima"][atribuidos]).all()
+    assert (dados["carona_hora"][caronas] <= dados["pedido_hora_maxima"][atribuidos]).all()
+    assert (dados["carona_valor"][caronas] <= dados["pedido_valor"][atribuidos]).all()
+    assert (dados["carona_motorista"][caronas] != dados["pedido_user"][atribuidos]).all()
+    assert (np.bincount(caronas, minlength=len(dados["carona_vagas"])) <= dados["carona_vagas"]).all()
+
+
+def main(num_pedidos: int = 50_000, num_caronas: int = 20_000) -> None:
+    print(f"{num_pedidos} pedidos x {num_caronas} caronas")
+    print(f"{'áreas':>8}{'tempo (s)':>12}{'atendidos':>12}{'vagas':>10}")
+    for num_areas in NUM_AREAS:
+        dados = gerar(num_pedidos, num_caronas, num_areas)
+        inicio = time.perf_counter()
+        atribuicoes = calcular_atribuicoes(**dados)
+        duracao = time.perf_counter() - inicio
+        conferir(atribuicoes, dados)
+        print(f"{num_areas:>8}{duracao:>12.2f}{int((atribuicoes >= 0).sum()):>12}{int(dados['carona_vagas'].sum()):>10}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -1,9 +1,11 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+from app.utils.pool_utils import AsyncAdaptedQueuePoolInstrumentado, QueuePoolInstrumentado, instrumentar_pool
+
 load_dotenv(dotenv_path="credentials.env")
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
@@ -13,12 +15,73 @@ if SQLALCHEMY_DATABASE_URL is None:
     raise ValueError("SQLALCHEMY_DATABASE_URL environment variable is not set")
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Modo assíncrono (AsyncEngine com asyncpg): as rotas com versão async passam a usá-lo. O engine síncrono continua
+# existindo para as demais rotas, migrations, benchmarks e exports em stream.
+DATABASE_ASYNC_MODE = os.getenv("DATABASE_ASYNC_MODE", "false").lower() in ("1", "true", "yes")
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def get_async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+
+# Configuração do pool de conexões (por worker do uvicorn). A capacidade (DB_POOL_SIZE + DB_MAX_OVERFLOW) deve
+# acompanhar THREADPOOL_SIZE, o número de threads que atendem as rotas síncronas (padrão do AnyIO: 40)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 0)) or None  # None mantém o padrão do AnyIO
+
+
+def get_pool_kwargs(database_url: str, poolclass: type) -> dict:
+    if make_url(database_url).database in (None, "", ":memory:"):
+        return {}  # SQLite em memória usa um pool próprio, sem tamanho configurável
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **get_pool_kwargs(SQLALCHEMY_DATABASE_URL, QueuePoolInstrumentado))
+instrumentar_pool(engine, prefixo="db")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Réplica somente leitura (opcional). As rotas de leitura usam get_read_db, que manda para o primário as leituras de
+# um usuário que escreveu nos últimos READ_YOUR_WRITES_JANELA_SEGUNDOS, para que ele sempre veja as próprias escritas
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("SQLALCHEMY_READ_DATABASE_URL")
+READ_YOUR_WRITES_JANELA_SEGUNDOS = float(os.getenv("READ_YOUR_WRITES_JANELA_SEGUNDOS", 10))
+
+read_engine = None
+ReadSessionLocal = None
+if SQLALCHEMY_READ_DATABASE_URL:
+    read_engine = create_engine(SQLALCHEMY_READ_DATABASE_URL, **get_pool_kwargs(SQLALCHEMY_READ_DATABASE_URL, QueuePoolInstrumentado))
+    instrumentar_pool(read_engine, prefixo="db_read")
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    
+    ASYNC_DATABASE_URL = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_pool_kwargs(ASYNC_DATABASE_URL, AsyncAdaptedQueuePoolInstrumentado))
+    instrumentar_pool(async_engine.sync_engine, prefixo="db_async")
+    # expire_on_commit=False: depois do commit os atributos continuam acessíveis sem um novo SELECT (que exigiria await)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 from app.database.user_orm import *
 from app.database.veiculo_orm import *
 from app.database.carona_orm import *
 from app.database.user_carona_orm import *
 from app.database.pedido_carona_orm import *
+from app.database.refresh_token_orm import *
+from app.database.revoked_token_orm import *
+from app.database.reserva_vaga_orm import *
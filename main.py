@@ -1,4 +1,7 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -9,10 +12,39 @@ from app.routers import motorista
 from app.routers import veiculo
 from app.routers import user_carona
 from app.routers import avaliacao
+from app.routers import metrics
+from app.routers import carona_async, user_carona_async
+from app.core.pedido_carona import PEDIDO_CARONA_MATCHER_SEGUNDOS, match_open_pedidos_carona
+from app.core.reserva_vaga import RESERVA_VAGA_SWEEPER_SEGUNDOS, release_expired_reservas_vaga
+from app.core.revoked_token import REVOKED_TOKENS_REFRESH_SEGUNDOS, refresh_revoked_tokens_filter
+from app.utils.pool_utils import verificar_capacidade_do_pool
+from app.utils.task_utils import iniciar_tarefa_periodica
+from database import DATABASE_ASYNC_MODE, DB_MAX_OVERFLOW, DB_POOL_SIZE, THREADPOOL_SIZE
+from app.utils.db_utils import NEXT_CURSOR_HEADER
 
 load_dotenv(dotenv_path="credentials.env")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    verificar_capacidade_do_pool(capacidade_do_pool=DB_POOL_SIZE + DB_MAX_OVERFLOW, tamanho_do_threadpool=THREADPOOL_SIZE)
+    try:
+        await run_in_threadpool(refresh_revoked_tokens_filter)
+    except Exception as e:
+        logging.error(f"Não foi possível carregar os tokens revogados: {e}")
+    tarefas = [
+        iniciar_tarefa_periodica("revoked_tokens_filter", REVOKED_TOKENS_REFRESH_SEGUNDOS, refresh_revoked_tokens_filter),
+    ]
+    if PEDIDO_CARONA_MATCHER_SEGUNDOS > 0:
+        tarefas.append(iniciar_tarefa_periodica("pedido_carona_matcher", PEDIDO_CARONA_MATCHER_SEGUNDOS, match_open_pedidos_carona))
+    if RESERVA_VAGA_SWEEPER_SEGUNDOS > 0:
+        tarefas.append(iniciar_tarefa_periodica("reserva_vaga_sweeper", RESERVA_VAGA_SWEEPER_SEGUNDOS, release_expired_reservas_vaga))
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS para permitir qualquer origem
 app.add_middleware(
@@ -21,17 +53,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos os métodos HTTP (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Permitir todos os cabeçalhos
+    expose_headers=[NEXT_CURSOR_HEADER],  # Permite que o front leia o cursor da próxima página
 )
 
 
 app.include_router(hello_world.router)
 app.include_router(authentication.router)
+if DATABASE_ASYNC_MODE:
+    # registrados antes dos routers síncronos: as rotas com versão async têm precedência nos mesmos paths
+    app.include_router(carona_async.router)
+    app.include_router(user_carona_async.router)
 app.include_router(carona.router)
 app.include_router(motorista.router)
 app.include_router(veiculo.router)
 app.include_router(user_carona.router)
 app.include_router(pedido_carona.router)
 app.include_router(avaliacao.router)
+app.include_router(metrics.router)
 
 @app.get("/ping")
 def ping():
@@ -0,0 +1,45 @@
+"""indices compostos e parcial de carona alinhados as buscas
+
+Revision ID: 5b0e3a9d7c12
+Revises: f2d84b17ac35
+Create Date: 2026-10-18 14:05:27.918364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e3a9d7c12'
+down_revision: Union[str, None] = 'f2d84b17ac35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Índices de coluna única que ficam redundantes (prefixo de um composto) ou que nenhuma query usa
+INDICES_REMOVIDOS = {
+    'ix_carona_hora_partida': 'hora_partida',
+    'ix_carona_fk_motorista': 'fk_motorista',
+    'ix_carona_vagas': 'vagas',
+    'ix_carona_local_partida': 'local_partida',
+    'ix_carona_local_destino': 'local_destino',
+}
+
+
+def upgrade() -> None:
+    op.create_index('ix_carona_hora_partida_valor', 'carona', ['hora_partida', 'valor'], unique=False)
+    op.create_index('ix_carona_fk_motorista_hora_partida', 'carona', ['fk_motorista', sa.text('hora_partida DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_carona_created_at_id', 'carona', ['created_at', 'id'], unique=False)
+    op.create_index('ix_carona_com_vagas_hora_partida', 'carona', ['hora_partida', 'id'], unique=False, postgresql_where=sa.text('vagas_preenchidas < vagas'))
+    for nome in INDICES_REMOVIDOS:
+        op.drop_index(nome, table_name='carona')
+
+
+def downgrade() -> None:
+    for nome, coluna in INDICES_REMOVIDOS.items():
+        op.create_index(nome, 'carona', [coluna], unique=False)
+    op.drop_index('ix_carona_com_vagas_hora_partida', table_name='carona', postgresql_where=sa.text('vagas_preenchidas < vagas'))
+    op.drop_index('ix_carona_created_at_id', table_name='carona')
+    op.drop_index('ix_carona_fk_motorista_hora_partida', table_name='carona')
+    op.drop_index('ix_carona_hora_partida_valor', table_name='carona')
@@ -0,0 +1,44 @@
+"""tabela refresh_token criada
+
+Revision ID: 9c4e1f7a2b63
+Revises: 5b0e3a9d7c12
+Create Date: 2026-10-18 16:42:10.381227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e1f7a2b63'
+down_revision: Union[str, None] = '5b0e3a9d7c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('refresh_token',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('fk_user', sa.Integer(), nullable=False),
+    sa.Column('token_hash', sa.String(length=64), nullable=False),
+    sa.Column('familia', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['fk_user'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_refresh_token_id'), 'refresh_token', ['id'], unique=False)
+    op.create_index(op.f('ix_refresh_token_fk_user'), 'refresh_token', ['fk_user'], unique=False)
+    op.create_index(op.f('ix_refresh_token_token_hash'), 'refresh_token', ['token_hash'], unique=True)
+    op.create_index(op.f('ix_refresh_token_familia'), 'refresh_token', ['familia'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_refresh_token_familia'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_token_hash'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_fk_user'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_id'), table_name='refresh_token')
+    op.drop_table('refresh_token')
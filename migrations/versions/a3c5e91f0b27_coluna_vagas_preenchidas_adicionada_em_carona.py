@@ -0,0 +1,41 @@
+"""coluna vagas_preenchidas adicionada em carona
+
+Revision ID: a3c5e91f0b27
+Revises: 6ad2ebdd1f4c
+Create Date: 2026-10-18 09:12:40.532118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e91f0b27'
+down_revision: Union[str, None] = '6ad2ebdd1f4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('carona', sa.Column('vagas_preenchidas', sa.Integer(), server_default='0', nullable=False))
+    # Preenche o contador das caronas existentes a partir das inscrições já feitas
+    op.execute(
+        '''
+        UPDATE carona
+        SET vagas_preenchidas = inscricoes.num_passageiros
+        FROM (
+            SELECT fk_carona, COUNT(*) AS num_passageiros
+            FROM user_carona
+            GROUP BY fk_carona
+        ) AS inscricoes
+        WHERE carona.id = inscricoes.fk_carona
+        '''
+    )
+    op.create_index('ix_carona_vagas_restantes', 'carona', [sa.text('(vagas - vagas_preenchidas)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_carona_vagas_restantes', table_name='carona')
+    op.drop_column('carona', 'vagas_preenchidas')
@@ -0,0 +1,33 @@
+"""indice gist da janela de horario dos pedidos de carona em aberto
+
+Revision ID: b8e2f4a6c1d9
+Revises: d7a3b5e8c914
+Create Date: 2026-10-18 19:02:37.541286
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f4a6c1d9'
+down_revision: Union[str, None] = 'd7a3b5e8c914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_pedido_carona_janela_aberta',
+        'pedido_carona',
+        [sa.text("tsrange(hora_partida_minima, hora_partida_maxima, '[]')")],
+        unique=False,
+        postgresql_using='gist',
+        postgresql_where=sa.text('fk_carona IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pedido_carona_janela_aberta', table_name='pedido_carona', postgresql_using='gist', postgresql_where=sa.text('fk_carona IS NULL'))
@@ -0,0 +1,92 @@
+"""colunas de busca de endereco com pg_trgm em carona e pedido_carona
+
+Revision ID: c41f7d8a2e90
+Revises: a3c5e91f0b27
+Create Date: 2026-10-18 10:03:17.204551
+
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7d8a2e90'
+down_revision: Union[str, None] = 'a3c5e91f0b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS = ['carona', 'pedido_carona']
+TAMANHO_DO_LOTE = 1000
+
+
+def normalizar_endereco(endereco: str | None) -> str | None:
+    # Cópia congelada de app.utils.endereco_utils.normalizar_endereco na data desta revisão: a migração não pode mudar
+    # de resultado (nem quebrar) quando a função da aplicação for alterada depois
+    if endereco is None:
+        return None
+    sem_acentos = "".join(
+        caractere for caractere in unicodedata.normalize("NFKD", endereco)
+        if not unicodedata.combining(caractere)
+    )
+    return " ".join(sem_acentos.upper().split())
+
+
+def preencher_colunas_de_busca(nome_tabela: str) -> None:
+    # Mesma normalização da aplicação, para que as linhas antigas e novas sejam comparáveis. Em lotes por id, para não
+    # carregar a tabela inteira na memória
+    tabela = sa.table(
+        nome_tabela,
+        sa.column('id', sa.Integer),
+        sa.column('local_partida', sa.String),
+        sa.column('local_destino', sa.String),
+        sa.column('local_partida_busca', sa.String),
+        sa.column('local_destino_busca', sa.String),
+    )
+    conn = op.get_bind()
+    update = (
+        tabela.update()
+        .where(tabela.c.id == sa.bindparam('_id'))
+        .values(local_partida_busca=sa.bindparam('_partida'), local_destino_busca=sa.bindparam('_destino'))
+    )
+    ultimo_id = None
+    while True:
+        query = sa.select(tabela.c.id, tabela.c.local_partida, tabela.c.local_destino).order_by(tabela.c.id).limit(TAMANHO_DO_LOTE)
+        if ultimo_id is not None:
+            query = query.where(tabela.c.id > ultimo_id)
+        linhas = conn.execute(query).all()
+        if not linhas:
+            return
+        conn.execute(
+            update,
+            [
+                {'_id': id, '_partida': normalizar_endereco(partida), '_destino': normalizar_endereco(destino)}
+                for id, partida, destino in linhas
+            ]
+        )
+        ultimo_id = linhas[-1].id
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for tabela in TABELAS:
+        op.add_column(tabela, sa.Column('local_partida_busca', sa.String(), nullable=True))
+        op.add_column(tabela, sa.Column('local_destino_busca', sa.String(), nullable=True))
+        preencher_colunas_de_busca(tabela)
+        op.alter_column(tabela, 'local_partida_busca', nullable=False)
+        op.alter_column(tabela, 'local_destino_busca', nullable=False)
+        for coluna in ['local_partida_busca', 'local_destino_busca']:
+            op.create_index(
+                f'ix_{tabela}_{coluna}_trgm', tabela, [coluna], unique=False,
+                postgresql_using='gin', postgresql_ops={coluna: 'gin_trgm_ops'}
+            )
+
+
+def downgrade() -> None:
+    for tabela in TABELAS:
+        op.drop_index(f'ix_{tabela}_local_destino_busca_trgm', table_name=tabela)
+        op.drop_index(f'ix_{tabela}_local_partida_busca_trgm', table_name=tabela)
+        op.drop_column(tabela, 'local_destino_busca')
+        op.drop_column(tabela, 'local_partida_busca')
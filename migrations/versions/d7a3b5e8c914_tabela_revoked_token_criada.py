@@ -0,0 +1,37 @@
+"""tabela revoked_token criada
+
+Revision ID: d7a3b5e8c914
+Revises: 9c4e1f7a2b63
+Create Date: 2026-10-18 17:20:44.105913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3b5e8c914'
+down_revision: Union[str, None] = '9c4e1f7a2b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('revoked_token',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('fk_user', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['fk_user'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_revoked_token_fk_user'), 'revoked_token', ['fk_user'], unique=False)
+    op.create_index(op.f('ix_revoked_token_expires_at'), 'revoked_token', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_revoked_token_expires_at'), table_name='revoked_token')
+    op.drop_index(op.f('ix_revoked_token_fk_user'), table_name='revoked_token')
+    op.drop_table('revoked_token')
@@ -0,0 +1,42 @@
+"""tabela reserva_vaga criada
+
+Revision ID: e5a9c3d7f1b2
+Revises: b8e2f4a6c1d9
+Create Date: 2026-10-18 21:05:12.480336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3d7f1b2'
+down_revision: Union[str, None] = 'b8e2f4a6c1d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('reserva_vaga',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('fk_user', sa.Integer(), nullable=False),
+    sa.Column('fk_carona', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['fk_carona'], ['carona.id'], ),
+    sa.ForeignKeyConstraint(['fk_user'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('fk_user', 'fk_carona')
+    )
+    op.create_index(op.f('ix_reserva_vaga_id'), 'reserva_vaga', ['id'], unique=False)
+    op.create_index(op.f('ix_reserva_vaga_fk_carona'), 'reserva_vaga', ['fk_carona'], unique=False)
+    op.create_index(op.f('ix_reserva_vaga_expires_at'), 'reserva_vaga', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reserva_vaga_expires_at'), table_name='reserva_vaga')
+    op.drop_index(op.f('ix_reserva_vaga_fk_carona'), table_name='reserva_vaga')
+    op.drop_index(op.f('ix_reserva_vaga_id'), table_name='reserva_vaga')
+    op.drop_table('reserva_vaga')
@@ -0,0 +1,73 @@
+"""coordenadas e geohash de partida e destino em carona e pedido_carona
+
+Revision ID: e7b20c6d93f4
+Revises: c41f7d8a2e90
+Create Date: 2026-10-18 11:26:52.871390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.endereco_utils import get_colunas_derivadas_do_local
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b20c6d93f4'
+down_revision: Union[str, None] = 'c41f7d8a2e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS = ['carona', 'pedido_carona']
+COLUNAS = {
+    'latitude_partida': sa.Float,
+    'longitude_partida': sa.Float,
+    'geohash_partida': sa.String,
+    'latitude_destino': sa.Float,
+    'longitude_destino': sa.Float,
+    'geohash_destino': sa.String,
+}
+
+
+def preencher_coordenadas(nome_tabela: str) -> None:
+    # Geocodifica as linhas existentes com a mesma tabela de centroides de CEP usada pela aplicação
+    tabela = sa.table(
+        nome_tabela,
+        sa.column('id', sa.Integer),
+        sa.column('local_partida', sa.String),
+        sa.column('local_destino', sa.String),
+        *[sa.column(coluna, tipo) for coluna, tipo in COLUNAS.items()]
+    )
+    conn = op.get_bind()
+    linhas = conn.execute(sa.select(tabela.c.id, tabela.c.local_partida, tabela.c.local_destino)).all()
+    valores = []
+    for id, partida, destino in linhas:
+        colunas = get_colunas_derivadas_do_local(key='local_partida', local=partida)
+        colunas.update(get_colunas_derivadas_do_local(key='local_destino', local=destino))
+        valores.append({'_id': id} | {f'_{coluna}': colunas[coluna] for coluna in COLUNAS})
+    if not valores:
+        return
+    conn.execute(
+        tabela.update()
+        .where(tabela.c.id == sa.bindparam('_id'))
+        .values(**{coluna: sa.bindparam(f'_{coluna}') for coluna in COLUNAS}),
+        valores
+    )
+
+
+def upgrade() -> None:
+    for tabela in TABELAS:
+        for coluna, tipo in COLUNAS.items():
+            op.add_column(tabela, sa.Column(coluna, tipo(), nullable=True))
+        preencher_coordenadas(tabela)
+        for coluna in ['geohash_partida', 'geohash_destino']:
+            op.create_index(f'ix_{tabela}_{coluna}', tabela, [coluna], unique=False, postgresql_ops={coluna: 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    for tabela in TABELAS:
+        op.drop_index(f'ix_{tabela}_geohash_destino', table_name=tabela)
+        op.drop_index(f'ix_{tabela}_geohash_partida', table_name=tabela)
+        for coluna in reversed(list(COLUNAS)):
+            op.drop_column(tabela, coluna)
@@ -0,0 +1,70 @@
+"""partes estruturadas (rua, bairro, cidade, uf, cep) dos enderecos de carona e pedido_carona
+
+Revision ID: f2d84b17ac35
+Revises: e7b20c6d93f4
+Create Date: 2026-10-18 12:41:08.310947
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.endereco_utils import get_colunas_derivadas_do_local
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d84b17ac35'
+down_revision: Union[str, None] = 'e7b20c6d93f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS = ['carona', 'pedido_carona']
+COLUNAS = [f'{parte}_{lado}' for lado in ['partida', 'destino'] for parte in ['rua', 'bairro', 'cidade', 'uf', 'cep']]
+
+
+def preencher_partes_dos_enderecos(nome_tabela: str) -> None:
+    # Separa os endereços existentes com o mesmo parser usado pela aplicação
+    tabela = sa.table(
+        nome_tabela,
+        sa.column('id', sa.Integer),
+        sa.column('local_partida', sa.String),
+        sa.column('local_destino', sa.String),
+        *[sa.column(coluna, sa.String) for coluna in COLUNAS]
+    )
+    conn = op.get_bind()
+    linhas = conn.execute(sa.select(tabela.c.id, tabela.c.local_partida, tabela.c.local_destino)).all()
+    valores = []
+    for id, partida, destino in linhas:
+        colunas = get_colunas_derivadas_do_local(key='local_partida', local=partida)
+        colunas.update(get_colunas_derivadas_do_local(key='local_destino', local=destino))
+        valores.append({'_id': id} | {f'_{coluna}': colunas[coluna] for coluna in COLUNAS})
+    if not valores:
+        return
+    conn.execute(
+        tabela.update()
+        .where(tabela.c.id == sa.bindparam('_id'))
+        .values(**{coluna: sa.bindparam(f'_{coluna}') for coluna in COLUNAS}),
+        valores
+    )
+
+
+def upgrade() -> None:
+    for tabela in TABELAS:
+        for coluna in COLUNAS:
+            op.add_column(tabela, sa.Column(coluna, sa.String(), nullable=True))
+        preencher_partes_dos_enderecos(tabela)
+        for lado in ['partida', 'destino']:
+            op.create_index(op.f(f'ix_{tabela}_bairro_{lado}'), tabela, [f'bairro_{lado}'], unique=False)
+            op.create_index(op.f(f'ix_{tabela}_cidade_{lado}'), tabela, [f'cidade_{lado}'], unique=False)
+            op.create_index(f'ix_{tabela}_cep_{lado}', tabela, [f'cep_{lado}'], unique=False, postgresql_ops={f'cep_{lado}': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    for tabela in TABELAS:
+        for lado in ['destino', 'partida']:
+            op.drop_index(f'ix_{tabela}_cep_{lado}', table_name=tabela)
+            op.drop_index(op.f(f'ix_{tabela}_cidade_{lado}'), table_name=tabela)
+            op.drop_index(op.f(f'ix_{tabela}_bairro_{lado}'), table_name=tabela)
+        for coluna in reversed(COLUNAS):
+            op.drop_column(tabela, coluna)
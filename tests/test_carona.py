@@ -0,0 +1,187 @@
+import base64
+import json
+import os
+import sys
+from fastapi.testclient import TestClient
+import pytest
+from dotenv import load_dotenv
+load_dotenv(dotenv_path="../credentials.env")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from database import async_engine, engine
+from faker import Faker
+
+fake = Faker()
+
+# Uma página de caronas deve custar um número fixo de queries: autenticação + query principal + uma query por
+# relacionamento carregado em lote (motorista, veículo do motorista e passageiros)
+MAX_QUERIES_POR_PAGINA = 6
+NUM_CARONAS = 5
+NUM_PASSAGEIROS = 3
+
+def generate_random_user():
+    return {
+        "email": fake.email(),
+        "first_name": fake.first_name(),
+        "last_name": fake.last_name(),
+        "cpf": fake.numerify('###########'),
+        "birthdate": fake.date_time_between(start_date='-50y', end_date='-18y').strftime('%Y-%m-%dT%H:%M:%S.%f'),
+        "iduff": fake.numerify('##########'),
+        "phone": fake.numerify('###########'),
+        "password": fake.password()
+    }
+
+@pytest.fixture
+def test_client():
+    return TestClient(app)
+
+def create_user_and_login(test_client) -> tuple[dict, dict]:
+    user_data = generate_random_user()
+    response = test_client.post("/users/create", json=user_data)
+    assert response.status_code == 200
+    response = test_client.post("/token", data={"username": user_data["email"], "password": user_data["password"]})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return test_client.get("/users/me", headers=headers).json(), headers
+
+def count_queries(func) -> tuple:
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    # com DATABASE_ASYNC_MODE as rotas de carona usam o engine assíncrono
+    engines = [engine] if async_engine is None else [engine, async_engine.sync_engine]
+    for db_engine in engines:
+        event.listen(db_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        for db_engine in engines:
+            event.remove(db_engine, "before_cursor_execute", before_cursor_execute)
+    return result, len(statements)
+
+@pytest.fixture
+def caronas_com_passageiros(test_client):
+    motorista, motorista_headers = create_user_and_login(test_client)
+    response = test_client.post("/users/me/motorista", params={"num_cnh": fake.numerify('###########')}, headers=motorista_headers)
+    assert response.status_code == 200
+    response = test_client.post(
+        "/veiculo/me",
+        params={"tipo": "CARRO", "marca": "FIAT", "modelo": "UNO", "cor": "BRANCO", "placa": fake.bothify('???#?##').upper()},
+        headers=motorista_headers
+    )
+    assert response.status_code == 200
+    veiculo_id = response.json()["fk_veiculo"]
+
+    caronas_ids = []
+    for i in range(NUM_CARONAS):
+        response = test_client.post(
+            "/carona",
+            params={
+                "veiculo_id": veiculo_id,
+                "hora_de_partida": (datetime.now() + timedelta(days=1, hours=i)).isoformat(),
+                "preco_carona": 10.0,
+                "vagas": NUM_PASSAGEIROS + 1
+            },
+            json={
+                "local_partida": "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240",
+                "local_destino": "R. Miguel de Frias, 9 - Icaraí, Niterói - RJ, 24220-900"
+            },
+            headers=motorista_headers
+        )
+        assert response.status_code == 200
+        caronas_ids.append(response.json()["id"])
+
+    for _ in range(NUM_PASSAGEIROS):
+        _, passageiro_headers = create_user_and_login(test_client)
+        for carona_id in caronas_ids:
+            response = test_client.post("/user-carona", params={"carona_id": carona_id}, headers=passageiro_headers)
+            assert response.status_code == 200
+
+    return motorista, motorista_headers
+
+def test_search_caronas_numero_fixo_de_queries(test_client, caronas_com_passageiros):
+    motorista, headers = caronas_com_passageiros
+    params = {"motorista_id": motorista["id"], "vagas_restantes_minimas": 0}
+
+    response, num_queries_pagina_1 = count_queries(
+        lambda: test_client.get("/carona", params=params | {"limite": 1}, headers=headers)
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    response, num_queries_pagina_cheia = count_queries(
+        lambda: test_client.get("/carona", params=params | {"limite": NUM_CARONAS}, headers=headers)
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == NUM_CARONAS
+    assert all(len(carona["passageiros"]) == NUM_PASSAGEIROS for carona in response.json())
+
+    assert num_queries_pagina_cheia <= MAX_QUERIES_POR_PAGINA
+    assert num_queries_pagina_cheia == num_queries_pagina_1
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! Página com {NUM_CARONAS} caronas e {NUM_PASSAGEIROS} passageiros cada custou {num_queries_pagina_cheia} queries.\n#######################################\n\n\n\n\n\n")
+
+def test_historico_motorista_numero_fixo_de_queries(test_client, caronas_com_passageiros):
+    _, headers = caronas_com_passageiros
+    params = {"data_maxima": (datetime.now() + timedelta(days=30)).isoformat(), "limite": NUM_CARONAS}
+
+    response, num_queries = count_queries(
+        lambda: test_client.get("/carona/historico/me/motorista", params=params, headers=headers)
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == NUM_CARONAS
+    assert num_queries <= MAX_QUERIES_POR_PAGINA
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! Histórico do motorista com {NUM_CARONAS} caronas custou {num_queries} queries.\n#######################################\n\n\n\n\n\n")
+
+def test_search_caronas_paginacao_por_cursor(test_client, caronas_com_passageiros):
+    motorista, headers = caronas_com_passageiros
+    # todas as caronas do fixture têm o mesmo valor: a ordenação por valor só é estável pelo desempate por id
+    params = {"motorista_id": motorista["id"], "vagas_restantes_minimas": 0, "order_by": "valor"}
+
+    for is_crescente in (True, False):
+        response = test_client.get("/carona", params=params | {"is_crescente": is_crescente, "limite": NUM_CARONAS + 1}, headers=headers)
+        assert response.status_code == 200
+        esperado = [carona["id"] for carona in response.json()]
+        assert len(esperado) == NUM_CARONAS
+        assert "X-Next-Cursor" not in response.headers
+
+        paginas, cursor = [], None
+        while True:
+            response = test_client.get(
+                "/carona",
+                params=params | {"is_crescente": is_crescente, "limite": 2} | ({"cursor": cursor} if cursor else {}),
+                headers=headers
+            )
+            assert response.status_code == 200
+            paginas.append([carona["id"] for carona in response.json()])
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        # sem repetições nem buracos, na mesma ordem da consulta sem paginação
+        assert [carona_id for pagina in paginas for carona_id in pagina] == esperado
+        assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+
+    response = test_client.get("/carona", params=params | {"limite": 2}, headers=headers)
+    cursor = response.headers["X-Next-Cursor"]
+    payload = json.loads(base64.urlsafe_b64decode(cursor))
+
+    def adulterar(**alteracoes) -> str:
+        return base64.urlsafe_b64encode(json.dumps(payload | alteracoes).encode()).decode()
+
+    cursores_invalidos = [
+        "nao-e-um-cursor",
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        adulterar(v=[str(payload["v"][0]), payload["v"][1]]),  # valor como texto
+        adulterar(v=[payload["v"][0], "1 OR 1=1"]),  # id como texto
+        adulterar(v=[True, payload["v"][1]]),
+        adulterar(v=payload["v"][:1]),  # faltando o desempate
+        adulterar(v=payload["v"] + [1]),
+    ]
+    for cursor_invalido in cursores_invalidos:
+        response = test_client.get("/carona", params=params | {"limite": 2, "cursor": cursor_invalido}, headers=headers)
+        assert response.status_code == 400, cursor_invalido
+
+    # cursor de outra ordenação
+    response = test_client.get("/carona", params=params | {"limite": 2, "order_by": "hora da partida", "cursor": cursor}, headers=headers)
+    assert response.status_code == 400
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 from fastapi.testclient import TestClient
 import pytest
 from dotenv import load_dotenv
@@ -7,6 +8,8 @@ load_dotenv(dotenv_path="../credentials.env")
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import app
 from datetime import datetime
+from app.core.revoked_token import refresh_revoked_tokens_filter
+from app.utils import rate_limit_utils
 from app.models.user_oop import UserBase, UserCreate, UserUpdate
 from app.models.veiculo_oop import MotoristaVeiculoModel
 from app.models.general_oop import BasicResponse
@@ -96,3 +99,101 @@ def test_read_my_user_nao_logado(test_client):
     assert response.status_code == 401
     assert response.json()["detail"] == "Not authenticated"
     print(f"\n\n\n#######################################\nTeste realizado com sucesso! Não foi possível ler o usuário. Pelo motivo de:\n\n {response.json()}\n#######################################\n\n\n\n\n\n")
+
+def create_user_and_get_tokens(test_client) -> tuple[dict, dict]:
+    novo_usuario = generate_random_user()
+    assert test_client.post("/users/create", json=novo_usuario).status_code == 200
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": novo_usuario["password"]})
+    assert response.status_code == 200
+    return novo_usuario, response.json()
+
+def test_refresh_token_reapresentado_revoga_a_familia(test_client):
+    novo_usuario, tokens = create_user_and_get_tokens(test_client)
+    refresh_token_original = tokens["refresh_token"]
+
+    # cada rotação devolve um refresh token novo e revoga o usado
+    response = test_client.post("/token/refresh", json={"refresh_token": refresh_token_original})
+    assert response.status_code == 200
+    refresh_token_rotacionado = response.json()["refresh_token"]
+    assert refresh_token_rotacionado != refresh_token_original
+    response = test_client.post("/token/refresh", json={"refresh_token": refresh_token_rotacionado})
+    assert response.status_code == 200
+    refresh_token_atual = response.json()["refresh_token"]
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert test_client.get("/users/me", headers=headers).status_code == 200
+
+    # outro login do mesmo usuário é outra família
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": novo_usuario["password"]})
+    assert response.status_code == 200
+    refresh_token_outro_login = response.json()["refresh_token"]
+
+    # reapresentar um token já rotacionado falha e revoga a família inteira, inclusive o token mais recente
+    response = test_client.post("/token/refresh", json={"refresh_token": refresh_token_original})
+    assert response.status_code == 401
+    assert test_client.post("/token/refresh", json={"refresh_token": refresh_token_atual}).status_code == 401
+    assert test_client.post("/token/refresh", json={"refresh_token": refresh_token_rotacionado}).status_code == 401
+
+    assert test_client.post("/token/refresh", json={"refresh_token": refresh_token_outro_login}).status_code == 200
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! Refresh token reapresentado revogou a família.\n#######################################\n\n\n\n\n\n")
+
+def test_logout_revoga_o_access_token(test_client):
+    novo_usuario, tokens = create_user_and_get_tokens(test_client)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": novo_usuario["password"]})
+    outros_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert test_client.get("/users/me", headers=headers).status_code == 200
+    assert test_client.get("/carona", headers=headers).status_code == 200
+
+    response = test_client.post("/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers)
+    assert response.status_code == 200
+
+    # rejeitado já na requisição seguinte, tanto nas rotas que leem o usuário quanto nas que só usam os claims do token
+    assert test_client.get("/users/me", headers=headers).status_code == 401
+    assert test_client.get("/carona", headers=headers).status_code == 401
+    assert test_client.post("/logout", headers=headers).status_code == 401
+    assert test_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # e continua rejeitado depois da reconstrução periódica do filtro de revogação
+    refresh_revoked_tokens_filter()
+    assert test_client.get("/users/me", headers=headers).status_code == 401
+
+    # o token de outro login não é afetado
+    assert test_client.get("/users/me", headers=outros_headers).status_code == 200
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! Access token rejeitado depois do logout.\n#######################################\n\n\n\n\n\n")
+
+def test_limite_de_tentativas_de_senha(test_client, monkeypatch):
+    limiter = rate_limit_utils.senha_por_usuario_limiter
+    if not isinstance(limiter, rate_limit_utils.TokenBucketLimiter) or limiter.capacidade <= 0:
+        pytest.skip("Limitador de senha por usuário desligado ou fora da memória do processo.")
+    novo_usuario, _ = create_user_and_get_tokens(test_client)
+
+    # relógio parado: nenhuma ficha é reposta até o teste avançá-lo
+    class Relogio:
+        agora = time.monotonic()
+        def monotonic(self):
+            return self.agora
+    relogio = Relogio()
+    monkeypatch.setattr(rate_limit_utils, "time", relogio)
+
+    # o login acima já consumiu uma ficha; o balde começa cheio de novo para este relógio
+    limiter._baldes.pop(novo_usuario["email"].strip().lower(), None)
+    tentativas = int(limiter.capacidade)
+    for _ in range(tentativas):
+        response = test_client.post("/token", data={"username": novo_usuario["email"], "password": "senha_incorreta"})
+        assert response.status_code == 401
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": "senha_incorreta"})
+    assert response.status_code == 429
+    retry_after = int(response.headers["Retry-After"])
+    assert retry_after >= 1
+
+    # bloqueado também com a senha correta e com o e-mail em outra caixa, sem chegar ao bcrypt
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": novo_usuario["password"]})
+    assert response.status_code == 429
+    response = test_client.post("/token", data={"username": novo_usuario["email"].upper(), "password": novo_usuario["password"]})
+    assert response.status_code == 429
+
+    # passado o Retry-After, há ficha de novo
+    relogio.agora += retry_after
+    response = test_client.post("/token", data={"username": novo_usuario["email"], "password": novo_usuario["password"]})
+    assert response.status_code == 200
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! {tentativas + 1}ª tentativa de senha bloqueada por {retry_after}s.\n#######################################\n\n\n\n\n\n")
+
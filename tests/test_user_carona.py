@@ -0,0 +1,291 @@
+import asyncio
+import os
+import sys
+import time
+import httpx
+from fastapi.testclient import TestClient
+import pytest
+from dotenv import load_dotenv
+load_dotenv(dotenv_path="../credentials.env")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from datetime import datetime, timedelta
+from database import SessionLocal
+from app.core.authentication import create_access_token, get_access_token_claims
+from app.core.carona import update_carona_in_db
+from app.core.pedido_carona import add_pedido_carona_matches_to_db
+from app.core.reserva_vaga import hold_vaga_in_db, release_expired_reservas_vaga_in_db
+from app.database.carona_orm import Carona
+from app.database.pedido_carona_orm import PedidoCarona
+from app.database.reserva_vaga_orm import ReservaVaga
+from app.database.user_carona_orm import UserCarona
+from app.database.user_orm import User
+from app.models.carona_oop import CaronaUpdate
+from faker import Faker
+from fastapi import HTTPException
+from sqlalchemy import event, insert
+
+fake = Faker()
+
+# Inscrições simultâneas: NUM_PASSAGEIROS usuários tentam entrar, ao mesmo tempo, em cada uma das NUM_CARONAS caronas
+# de VAGAS_POR_CARONA vagas. Só VAGAS_POR_CARONA inscrições por carona podem ter sucesso.
+NUM_CARONAS = 3
+VAGAS_POR_CARONA = 4
+NUM_PASSAGEIROS = 100
+REQUISICOES_EM_PARALELO = 10  # abaixo do pool de conexões padrão (5 + 10 de overflow)
+
+def generate_random_user():
+    return {
+        "email": fake.email(),
+        "first_name": fake.first_name(),
+        "last_name": fake.last_name(),
+        "cpf": fake.numerify('###########'),
+        "birthdate": fake.date_time_between(start_date='-50y', end_date='-18y').strftime('%Y-%m-%dT%H:%M:%S.%f'),
+        "iduff": fake.numerify('##########'),
+        "phone": fake.numerify('###########'),
+        "password": fake.password()
+    }
+
+@pytest.fixture
+def test_client():
+    return TestClient(app)
+
+def create_user_and_login(test_client) -> tuple[dict, dict]:
+    user_data = generate_random_user()
+    response = test_client.post("/users/create", json=user_data)
+    assert response.status_code == 200
+    response = test_client.post("/token", data={"username": user_data["email"], "password": user_data["password"]})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return test_client.get("/users/me", headers=headers).json(), headers
+
+def create_passageiros(quantidade: int) -> list[dict]:
+    # direto no banco e com tokens emitidos localmente: criar centenas de usuários por /users/create e /token esbarraria
+    # no bcrypt e no limite de tentativas de senha por IP
+    sufixo = time.time_ns()
+    with SessionLocal() as db:
+        users = [
+            User(
+                email=f"passageiro.{sufixo}.{i}@id.uff.br",
+                first_name="Passageiro",
+                last_name=str(i),
+                cpf=f"c{sufixo}{i}",
+                iduff=f"i{sufixo}{i}",
+                phone=f"p{sufixo}{i}",
+                hashed_password="-",
+                birthdate=datetime(2000, 1, 1)
+            )
+            for i in range(quantidade)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [
+            {"Authorization": f"Bearer {create_access_token(data=get_access_token_claims(user), expires_delta=timedelta(hours=1))}"}
+            for user in users
+        ]
+
+@pytest.fixture
+def motorista_headers(test_client) -> dict:
+    _, headers = create_user_and_login(test_client)
+    response = test_client.post("/users/me/motorista", params={"num_cnh": fake.numerify('###########')}, headers=headers)
+    assert response.status_code == 200
+    return headers
+
+@pytest.fixture
+def caronas(test_client, motorista_headers) -> list[int]:
+    response = test_client.post(
+        "/veiculo/me",
+        params={"tipo": "CARRO", "marca": "FIAT", "modelo": "UNO", "cor": "BRANCO", "placa": fake.bothify('???#?##').upper()},
+        headers=motorista_headers
+    )
+    assert response.status_code == 200
+    veiculo_id = response.json()["fk_veiculo"]
+
+    caronas_ids = []
+    for i in range(NUM_CARONAS):
+        response = test_client.post(
+            "/carona",
+            params={
+                "veiculo_id": veiculo_id,
+                "hora_de_partida": (datetime.now() + timedelta(days=1, hours=i)).isoformat(),
+                "preco_carona": 10.0,
+                "vagas": VAGAS_POR_CARONA
+            },
+            json={
+                "local_partida": "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240",
+                "local_destino": "R. Miguel de Frias, 9 - Icaraí, Niterói - RJ, 24220-900"
+            },
+            headers=motorista_headers
+        )
+        assert response.status_code == 200
+        caronas_ids.append(response.json()["id"])
+    return caronas_ids
+
+def test_inscricoes_simultaneas_nao_superlotam_carona(test_client, caronas):
+    passageiros = create_passageiros(NUM_PASSAGEIROS)
+    tentativas = [(carona_id, headers) for headers in passageiros for carona_id in caronas]
+
+    # todas as requisições no mesmo event loop, como no uvicorn: as rotas síncronas vão para o threadpool e as
+    # assíncronas (DATABASE_ASYNC_MODE) compartilham o pool do engine assíncrono
+    async def inscrever_todos() -> list[int]:
+        em_paralelo = asyncio.Semaphore(REQUISICOES_EM_PARALELO)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            async def inscrever(carona_id: int, headers: dict) -> int:
+                async with em_paralelo:
+                    return (await http.post("/user-carona", params={"carona_id": carona_id}, headers=headers)).status_code
+            return await asyncio.gather(*(inscrever(carona_id, headers) for carona_id, headers in tentativas))
+
+    inicio = time.perf_counter()
+    status_codes = asyncio.run(inscrever_todos())
+    duracao = time.perf_counter() - inicio
+
+    assert sorted(set(status_codes)) == [200, 400]
+    assert status_codes.count(200) == NUM_CARONAS * VAGAS_POR_CARONA
+    with SessionLocal() as db:
+        for carona_id in caronas:
+            assert db.get(Carona, carona_id).vagas_preenchidas == VAGAS_POR_CARONA
+            assert db.query(UserCarona).filter(UserCarona.fk_carona == carona_id).count() == VAGAS_POR_CARONA
+    print(f"\n\n\n#######################################\nTeste realizado com sucesso! {len(tentativas)} inscrições simultâneas em {NUM_CARONAS} caronas de {VAGAS_POR_CARONA} vagas ({len(tentativas) / duracao:.0f} inscrições/s), nenhuma carona superlotada.\n#######################################\n\n\n\n\n\n")
+
+def test_reserva_de_vaga(test_client, caronas):
+    carona_id = caronas[0]
+    passageiros = create_passageiros(VAGAS_POR_CARONA + 1)
+
+    def vagas_preenchidas() -> int:
+        with SessionLocal() as db:
+            return db.get(Carona, carona_id).vagas_preenchidas
+
+    reservas = []
+    for headers in passageiros[:VAGAS_POR_CARONA]:
+        response = test_client.post("/user-carona/hold", params={"carona_id": carona_id, "segundos": 60}, headers=headers)
+        assert response.status_code == 200
+        reservas.append(response.json()["id"])
+    assert vagas_preenchidas() == VAGAS_POR_CARONA
+    response = test_client.post("/user-carona/hold", params={"carona_id": carona_id}, headers=passageiros[-1])
+    assert response.status_code == 400
+
+    # repetir a reserva só renova o prazo
+    response = test_client.post("/user-carona/hold", params={"carona_id": carona_id, "segundos": 120}, headers=passageiros[0])
+    assert response.status_code == 200
+    assert response.json()["id"] == reservas[0]
+    assert vagas_preenchidas() == VAGAS_POR_CARONA
+
+    # a confirmação troca a reserva pela inscrição, sem ocupar outra vaga
+    response = test_client.post(f"/user-carona/hold/{reservas[0]}/confirm", headers=passageiros[0])
+    assert response.status_code == 200
+    assert response.json()["fk_carona"] == carona_id
+    assert vagas_preenchidas() == VAGAS_POR_CARONA
+    assert test_client.post(f"/user-carona/hold/{reservas[1]}/confirm", headers=passageiros[0]).status_code == 404
+
+    assert test_client.delete(f"/user-carona/hold/{reservas[1]}", headers=passageiros[1]).status_code == 200
+    assert vagas_preenchidas() == VAGAS_POR_CARONA - 1
+
+    # reserva expirada não é confirmada, e o sweeper devolve a vaga
+    with SessionLocal() as db:
+        db.get(ReservaVaga, reservas[2]).expires_at = datetime.now() - timedelta(seconds=1)
+        db.commit()
+    assert test_client.post(f"/user-carona/hold/{reservas[2]}/confirm", headers=passageiros[2]).status_code == 400
+    with SessionLocal() as db:
+        assert release_expired_reservas_vaga_in_db(db=db) >= 1
+        assert db.get(ReservaVaga, reservas[2]) is None
+    assert vagas_preenchidas() == VAGAS_POR_CARONA - 2
+
+    response = test_client.post("/user-carona/hold", params={"carona_id": carona_id}, headers=passageiros[-1])
+    assert response.status_code == 200
+
+def test_remover_carona_com_reservas_de_vaga(test_client, motorista_headers, caronas):
+    carona_id = caronas[0]
+    reservas = []
+    for headers in create_passageiros(2):
+        response = test_client.post("/user-carona/hold", params={"carona_id": carona_id}, headers=headers)
+        assert response.status_code == 200
+        reservas.append(response.json()["id"])
+    # uma das reservas já expirada, mas ainda não liberada pelo sweeper
+    with SessionLocal() as db:
+        db.get(ReservaVaga, reservas[0]).expires_at = datetime.now() - timedelta(seconds=1)
+        db.commit()
+
+    response = test_client.delete(f"/carona/{carona_id}", params={"enforce": True}, headers=motorista_headers)
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        assert db.get(Carona, carona_id) is None
+        assert db.query(ReservaVaga).filter(ReservaVaga.fk_carona == carona_id).count() == 0
+
+def test_inscricao_consome_reserva_de_vaga(test_client, caronas):
+    carona_id = caronas[0]
+    passageiros = create_passageiros(VAGAS_POR_CARONA)
+    reservas = []
+    for headers in passageiros:
+        response = test_client.post("/user-carona/hold", params={"carona_id": carona_id}, headers=headers)
+        assert response.status_code == 200
+        reservas.append(response.json()["id"])
+
+    # com a carona lotada pelas reservas, quem tem reserva ainda se inscreve, sem ocupar outra vaga
+    response = test_client.post("/user-carona", params={"carona_id": carona_id}, headers=passageiros[0])
+    assert response.status_code == 200
+    assert test_client.post(f"/user-carona/hold/{reservas[0]}/confirm", headers=passageiros[0]).status_code == 404
+
+    # idem para o atendimento automático de um pedido de carona
+    user_id = test_client.get("/users/me", headers=passageiros[1]).json()["id"]
+    with SessionLocal() as db:
+        pedido = PedidoCarona(
+            fk_user=user_id,
+            hora_partida_minima=datetime.now(),
+            hora_partida_maxima=datetime.now() + timedelta(days=2),
+            valor=10.0,
+            local_partida="R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240",
+            local_destino="R. Miguel de Frias, 9 - Icaraí, Niterói - RJ, 24220-900"
+        )
+        db.add(pedido)
+        db.commit()
+        assert add_pedido_carona_matches_to_db(atendimentos=[(pedido.id, user_id, carona_id)], db=db) == 1
+
+    with SessionLocal() as db:
+        assert db.get(Carona, carona_id).vagas_preenchidas == VAGAS_POR_CARONA
+        assert db.query(UserCarona).filter(UserCarona.fk_carona == carona_id).count() == 2
+        assert db.get(ReservaVaga, reservas[0]) is None
+        assert db.get(ReservaVaga, reservas[1]) is None
+
+def test_reserva_concorrente_do_mesmo_usuario(test_client, caronas):
+    carona_id = caronas[0]
+    user_id = test_client.get("/users/me", headers=create_passageiros(1)[0]).json()["id"]
+
+    def reserva_concorrente(session, flush_context, instances):
+        # simula a violação da UniqueConstraint (fk_user, fk_carona) por uma reserva criada ao mesmo tempo
+        session.connection().execute(
+            insert(ReservaVaga.__table__).values(fk_user=user_id, fk_carona=carona_id, expires_at=datetime.now(), created_at=datetime.now())
+        )
+
+    with SessionLocal() as db:
+        event.listen(db, "before_flush", reserva_concorrente, once=True)
+        reserva = hold_vaga_in_db(user_id=user_id, db_carona=db.get(Carona, carona_id), segundos=60, db=db)
+        assert reserva.expires_at > datetime.now()
+        assert db.get(Carona, carona_id).vagas_preenchidas == 1
+        assert db.query(ReservaVaga).filter(ReservaVaga.fk_carona == carona_id).count() == 1
+
+def test_diminuir_vagas_abaixo_das_preenchidas(test_client, motorista_headers, caronas):
+    carona_id = caronas[0]
+    passageiros = create_passageiros(2)
+    partida_destino = {
+        "local_partida": "R. Passo da Pátria, 152-470 - São Domingos, Niterói - RJ, 24210-240",
+        "local_destino": "R. Miguel de Frias, 9 - Icaraí, Niterói - RJ, 24220-900"
+    }
+
+    with SessionLocal() as db:
+        # carona lida antes da inscrição: a checagem de vagas não pode depender dessa linha desatualizada
+        carona_desatualizada = db.get(Carona, carona_id)
+        assert carona_desatualizada.vagas_preenchidas == 0
+        assert test_client.post("/user-carona/", params={"carona_id": carona_id}, headers=passageiros[0]).status_code == 200
+        with pytest.raises(HTTPException) as excinfo:
+            update_carona_in_db(db_carona=carona_desatualizada, carona_new_info=CaronaUpdate(vagas=0), db=db)
+        assert excinfo.value.status_code == 400
+
+    assert test_client.post("/user-carona/", params={"carona_id": carona_id}, headers=passageiros[1]).status_code == 200
+    response = test_client.put(f"/carona/{carona_id}", params={"vagas": 1}, json=partida_destino, headers=motorista_headers)
+    assert response.status_code == 400
+    response = test_client.put(f"/carona/{carona_id}", params={"vagas": 2, "preco_carona": 12.0}, json=partida_destino, headers=motorista_headers)
+    assert response.status_code == 200
+
+    with SessionLocal() as db:
+        carona = db.get(Carona, carona_id)
+        assert (carona.vagas, carona.vagas_preenchidas, carona.valor) == (2, 2, 12.0)